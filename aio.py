@@ -0,0 +1,261 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
+from functools import partial
+from typing import Callable, Dict, List, Tuple, TypeVar
+
+import archive
+import booking
+import metrics
+import notify
+import reminders
+from config import REMINDER_SYNC_INTERVAL, SHARED_STORAGE, STORAGE_IO_WORKERS
+from handlers import users
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Обмежений пул: усі звернення до сховища (stat, читання, fsync, SQLite)
+# виконуються тут, а event loop лише чекає результат.
+_executor = ThreadPoolExecutor(
+    max_workers=STORAGE_IO_WORKERS, thread_name_prefix="storage-io"
+)
+
+
+async def run_io(func: Callable[..., T], *args, **kwargs) -> T:
+    """Виконує блокуючу функцію сховища в пулі потоків."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(func, *args, **kwargs))
+
+
+def shutdown() -> None:
+    """Дочікується незавершених записів і зупиняє пул."""
+    _executor.shutdown(wait=True)
+
+
+# ─────────────────────── бронювання ───────────────────────
+async def load_data() -> dict:
+    return await run_io(booking.load_data)
+
+
+async def save_data(data: dict) -> None:
+    await run_io(booking.save_data, data)
+    await fill_reminders(reset=True)
+
+
+async def version() -> int:
+    return await run_io(booking.version)
+
+
+async def get_days(dates: List[str]) -> Dict[str, Dict[str, List[int]]]:
+    return await run_io(booking.get_days, dates)
+
+
+async def get_day(date_str: str) -> Dict[str, List[int]]:
+    return (await get_days([date_str]))[date_str]
+
+
+async def free_times(date_str: str) -> List[str]:
+    return await run_io(booking.free_times, date_str)
+
+
+async def free_seats(date_str: str) -> Dict[str, int]:
+    return await run_io(booking.free_seats, date_str)
+
+
+async def free_slots(start: date, days: int) -> Dict[str, List[str]]:
+    return await run_io(booking.free_slots, start, days)
+
+
+async def booked_dates() -> List[str]:
+    return await run_io(booking.booked_dates)
+
+
+async def booked_counts(start: str | None = None, end: str | None = None) -> List[Tuple[str, int]]:
+    return await run_io(booking.booked_counts, start, end)
+
+
+async def user_bookings(user_id: int, until: date | None = None) -> List[Tuple[str, str]]:
+    return await run_io(booking.user_bookings, user_id, until)
+
+
+async def user_rules(user_id: int) -> List[booking.Rule]:
+    return await run_io(booking.user_rules, user_id)
+
+
+async def add_rules(user_id: int, date_str: str, times: List[str], count: int | None):
+    results = await run_io(booking.add_rules, user_id, date_str, times, count)
+    await _remind(_rule_pairs(rule for _, rule, _ in results if rule))
+    return results
+
+
+async def cancel_rules(requester_id: int, **kwargs) -> List[booking.Rule]:
+    rules = await run_io(booking.cancel_rules, requester_id, **kwargs)
+    await _remind(_rule_pairs(rules))
+    return rules
+
+
+async def users_with_bookings() -> List[int]:
+    return await run_io(booking.users_with_bookings)
+
+
+async def users_page(offset: int, limit: int) -> Tuple[List[int], int]:
+    return await run_io(booking.users_page, offset, limit)
+
+
+async def with_bookings(user_ids: List[int]) -> List[int]:
+    return await run_io(booking.with_bookings, user_ids)
+
+
+async def purge_past() -> int:
+    removed = await run_io(booking.purge_past_dates)
+    metrics.PURGED_SLOTS.inc(removed)
+    return removed
+
+
+async def book_many(pairs: List[Tuple[str, str]], user_id: int):
+    booked, failed = await run_io(booking.book_many, pairs, user_id)
+    await _remind(booked)
+    return booked, failed
+
+
+async def cancel_many(
+    pairs: List[Tuple[str, str]],
+    requester_id: int,
+    is_admin: bool = False,
+    all_seats: bool = False,
+) -> Dict[Tuple[str, str], List[int]]:
+    results = await run_io(booking.cancel_many, pairs, requester_id, is_admin, all_seats)
+    await _remind([pair for pair, taken in results.items() if taken])
+    return results
+
+
+# ─────────────────────── нагадування ───────────────────────
+async def _remind(pairs: List[Tuple[str, str]]) -> None:
+    """Оновлює купу нагадувань для слотів, зайнятість яких змінилась."""
+    if pairs and reminders.enabled():
+        days = await get_days(sorted({d for d, _ in pairs}))
+        reminders.update(pairs, days)
+
+
+def _rule_pairs(rules) -> List[Tuple[str, str]]:
+    """Слоти правил у межах, які купа нагадувань тримає наперед."""
+    today = date.today()
+    lo, hi = today.toordinal(), reminders.horizon(today).toordinal()
+    return [
+        (date.fromordinal(o).isoformat(), rule.time)
+        for rule in rules
+        for o in rule.occurrences(lo, hi)
+    ]
+
+
+_seen_reloads = 0  # `booking.reloads()`, з яким купу востаннє заповнено
+
+
+async def fill_reminders(reset: bool = False) -> None:
+    """Ставить у купу всі майбутні броні: на старті, щоночі (нові дні правил)."""
+    global _seen_reloads
+    if reminders.enabled():
+        _seen_reloads = await run_io(booking.reloads)
+        reminders.fill(await get_days(await booked_dates()), reset)
+
+
+async def start_reminders(job_queue) -> None:
+    reminders.attach(job_queue, reminders_job)
+    await fill_reminders()
+    if SHARED_STORAGE and reminders.enabled():
+        job_queue.run_repeating(
+            sync_reminders_job, interval=REMINDER_SYNC_INTERVAL, first=REMINDER_SYNC_INTERVAL
+        )
+
+
+async def sync_reminders_job(context) -> None:
+    """
+    З SHARED_STORAGE: події `_remind` бачать лише зміни цього процесу, тож
+    періодично звіряємось зі сховищем і, якщо інша репліка щось змінила,
+    перебудовуємо купу з нуля (нагадування, що вже минули, не повторяться).
+    """
+    if await run_io(booking.reloads) != _seen_reloads:
+        await fill_reminders(reset=True)
+
+
+async def reminders_job(context) -> None:
+    """Надсилає нагадування, що настали, і ставить задачу на наступне."""
+    try:
+        due = reminders.pop_due()
+        if not due:
+            return
+        days = await get_days(sorted({d for d, _, _ in due}))
+        report = await notify.broadcast(
+            context.bot,
+            (
+                (uid, reminders.text(d, t, lead))
+                for d, t, lead in due
+                for uid in days[d].get(t, ())
+            ),
+        )
+        metrics.REMINDERS_SENT.inc(report.delivered)
+    finally:
+        reminders.rearm()
+
+
+# ───────────────────────── архів ──────────────────────────
+async def archive_totals() -> List[Tuple[str, int, int]]:
+    return await run_io(archive.monthly_totals)
+
+
+async def archive_header(month: str) -> dict | None:
+    return await run_io(archive.header, month)
+
+
+async def archive_user(user_id: int, month: str) -> List[Tuple[str, str]]:
+    return await run_io(archive.user_history, user_id, month)
+
+
+# ─────────────────────── користувачі ──────────────────────
+async def add_user_if_not_exists(user_id: int, first_name: str, username: str | None):
+    await run_io(users.add_user_if_not_exists, user_id, first_name, username)
+
+
+async def search_users(prefix: str) -> List[int]:
+    return await run_io(users.search_users, prefix)
+
+
+async def flush_users() -> bool:
+    return await run_io(users.flush_users)
+
+
+# ─────────────────── життєвий цикл бота ───────────────────
+async def warm_up() -> None:
+    """Завантажує сховища в пам'ять до першого апдейту."""
+    await run_io(booking.booked_dates)
+    await run_io(users.load_users)
+    await purge_past()  # за час простою дні могли минути
+
+
+def next_midnight() -> datetime:
+    """Найближча локальна північ (з запасом у кілька секунд, з урахуванням DST)."""
+    tomorrow = date.today() + timedelta(days=1)
+    return datetime.combine(tomorrow, time(0, 0, 5)).astimezone()
+
+
+async def purge_job(context) -> None:
+    """Щоночі прибирає минулі дати й планує себе на наступну північ."""
+    try:
+        removed = await purge_past()
+        if removed:
+            log.info("Прибрано минулих бронювань: %d", removed)
+        await fill_reminders()
+    finally:
+        context.job_queue.run_once(purge_job, when=next_midnight())
+
+
+async def flush_users_job(context) -> None:
+    await flush_users()
+
+
+async def on_shutdown(app) -> None:
+    await flush_users()
+    shutdown()
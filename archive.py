@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import threading
+from typing import Dict, List, Tuple
+
+from config import ARCHIVE_DIR
+from metrics import STORAGE_BYTES, STORAGE_OPS
+from storage import seat_ids
+
+# ─────────────────────────── формат ───────────────────────────
+# Архів минулих бронювань — по сегменту на місяць: ARCHIVE_DIR/YYYY-MM.jsonl.gz.
+# Усередині gzip — JSON-рядки:
+#   1-й рядок — заголовок-індекс:
+#     {"v": 1, "month": "2025-03", "days": 21, "slots": 140,
+#      "users": {"<uid>": к-сть}, "hours": {"09:00": к-сть, ...}}
+#   далі — по рядку на день: {"d": "2025-03-01", "s": {"09:00": [uid, ...], ...}}
+# Заголовок читається без розпакування решти файлу, тож місячні підсумки
+# та перевірка «чи був тут користувач» не торкаються самих днів.
+# Сегмент ніколи не змінюється на місці: дописування днів у поточний місяць
+# — це новий файл, що атомарно замінює старий; минулі місяці вже не змінюються.
+FORMAT_VERSION = 1
+_SUFFIX = ".jsonl.gz"
+
+_lock = threading.Lock()
+# заголовки незмінних файлів: місяць → ((mtime_ns, size), заголовок)
+_headers: Dict[str, Tuple[tuple, dict]] = {}
+
+
+def enabled() -> bool:
+    return bool(ARCHIVE_DIR)
+
+
+def _path(month: str) -> str:
+    return os.path.join(ARCHIVE_DIR, month + _SUFFIX)
+
+
+# ────────────────────────── читання ──────────────────────────
+def months() -> List[str]:
+    """Місяці (*YYYY-MM*), за які є сегменти, за зростанням."""
+    try:
+        names = os.listdir(ARCHIVE_DIR)
+    except (FileNotFoundError, TypeError):
+        return []
+    return sorted(n[: -len(_SUFFIX)] for n in names if n.endswith(_SUFFIX))
+
+
+def header(month: str) -> dict | None:
+    """Заголовок сегмента (з кешу, поки файл не замінено) або *None*."""
+    path = _path(month)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _headers.get(month)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        head = json.loads(f.readline())
+    STORAGE_OPS.inc(op="archive_header")
+    _headers[month] = (stamp, head)
+    return head
+
+
+def month_days(month: str) -> Dict[str, Dict[str, List[int]]]:
+    """Усі дні сегмента *{дата: {час: [user_id, ...]}}* (порожньо, якщо сегмента немає)."""
+    path = _path(month)
+    days: Dict[str, Dict[str, List[int]]] = {}
+    try:
+        f = gzip.open(path, "rt", encoding="utf-8")
+    except FileNotFoundError:
+        return days
+    with f:
+        f.readline()  # заголовок
+        for line in f:
+            rec = json.loads(line)
+            days[rec["d"]] = {t: seat_ids(u) for t, u in rec["s"].items()}
+    STORAGE_OPS.inc(op="archive_read")
+    STORAGE_BYTES.inc(os.path.getsize(path), op="archive_read")
+    return days
+
+
+def monthly_totals(start: str | None = None, end: str | None = None) -> List[Tuple[str, int, int]]:
+    """*[(місяць, броней, користувачів)]* у межах [start; end] — лише із заголовків."""
+    out = []
+    for month in months():
+        if (start and month < start) or (end and month > end):
+            continue
+        head = header(month)
+        if head:
+            out.append((month, head["slots"], len(head["users"])))
+    return out
+
+
+def user_history(user_id: int, month: str) -> List[Tuple[str, str]]:
+    """*[(дата, час)]* користувача за місяць; сегмент без нього не розпаковується."""
+    head = header(month)
+    if not head or str(user_id) not in head["users"]:
+        return []
+    return sorted(
+        (d, t)
+        for d, slots in month_days(month).items()
+        for t, seats in slots.items()
+        if user_id in seats
+    )
+
+
+# ─────────────────────────── запис ───────────────────────────
+def _header_for(month: str, days: Dict[str, Dict[str, List[int]]]) -> dict:
+    users: Dict[str, int] = {}
+    hours: Dict[str, int] = {}
+    for slots in days.values():
+        for t, seats in slots.items():
+            for uid in seats:
+                users[str(uid)] = users.get(str(uid), 0) + 1
+            hours[t] = hours.get(t, 0) + len(seats)
+    return {
+        "v": FORMAT_VERSION,
+        "month": month,
+        "days": len(days),
+        "slots": sum(users.values()),
+        "users": users,
+        "hours": dict(sorted(hours.items())),
+    }
+
+
+def _write_segment(month: str, days: Dict[str, Dict[str, List[int]]]) -> None:
+    """Атомарно записує сегмент: тимчасовий файл + fsync + rename."""
+    path = _path(month)
+    lines = [json.dumps(_header_for(month, days), ensure_ascii=False)]
+    lines += [
+        json.dumps({"d": d, "s": dict(sorted(days[d].items()))}, separators=(",", ":"))
+        for d in sorted(days)
+    ]
+    payload = gzip.compress(("\n".join(lines) + "\n").encode("utf-8"), mtime=0)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    STORAGE_OPS.inc(op="archive_write")
+    STORAGE_BYTES.inc(len(payload), op="archive_write")
+
+
+def store_days(days: Dict[str, Dict[str, List[int]]]) -> None:
+    """
+    Переносить дні *{дата: {час: [user_id, ...]}}* в архів. Кожен зачеплений
+    місяць переписується один раз; повтор тих самих днів (напр. після збою
+    між архівацією та видаленням зі сховища) нічого не дублює.
+    """
+    if not enabled() or not days:
+        return
+    by_month: Dict[str, Dict[str, Dict[str, List[int]]]] = {}
+    for d, slots in days.items():
+        if slots:
+            by_month.setdefault(d[:7], {})[d] = {t: seat_ids(s) for t, s in slots.items()}
+
+    with _lock:
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        for month, new_days in sorted(by_month.items()):
+            merged = month_days(month)
+            merged.update(new_days)
+            _write_segment(month, merged)
+        try:
+            fd = os.open(ARCHIVE_DIR, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass  # не всі ФС дозволяють fsync каталогу
+        finally:
+            os.close(fd)
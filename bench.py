@@ -0,0 +1,340 @@
+"""
+Синтетичне навантаження на справжні обробники та сховище.
+
+    python bench.py [--users 500] [--days 60] [--density 0.5] [--ops 200]
+                    [--concurrency 1] [--seed 1] [--out bench_results.json]
+                    [--compare попередній.json]
+
+Сховище наповнюється у тимчасовому каталозі (`--workdir`), бекенд і журнал
+беруться зі звичайних змінних (STORAGE_BACKEND, DATA_JOURNAL, …). Обробники
+викликаються через `callbacks.CallbackRouter` з фейковими Update/CallbackQuery
+і ботом, що нічого не надсилає.
+
+Для кожного сценарію: пропускна здатність, p50/p95/p99 затримки та байти,
+прочитані/записані процесом на одну операцію (`/proc/self/io`, лише Linux).
+Результати пишуться в JSON; `--compare` показує зміну відносно іншого запуску.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+# ───────────────────────── фейки PTB ─────────────────────────
+class _Message:
+    async def reply_text(self, text, reply_markup=None, **kwargs):
+        return self
+
+
+class _Query:
+    def __init__(self, data, user):
+        self.data = data
+        self.from_user = user
+        self.message = _Message()
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+    async def edit_message_text(self, text=None, reply_markup=None, **kwargs):
+        pass
+
+    async def edit_message_reply_markup(self, reply_markup=None, **kwargs):
+        pass
+
+
+class _Bot:
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent += 1
+
+
+def _update(uid: int, data: str | None = None):
+    user = types.SimpleNamespace(id=uid, first_name=f"User{uid}", username=f"user{uid}")
+    upd = types.SimpleNamespace(
+        effective_user=user,
+        effective_chat=types.SimpleNamespace(id=uid),
+        message=None,
+        callback_query=None,
+    )
+    if data is None:
+        upd.message = _Message()
+    else:
+        upd.callback_query = _Query(data, user)
+    return upd
+
+
+def _context(bot, user_data: dict | None = None):
+    return types.SimpleNamespace(user_data=user_data if user_data is not None else {}, bot=bot, args=[])
+
+
+# ───────────────────────── вимірювання ─────────────────────────
+def _io() -> tuple[int, int] | None:
+    """Байти, прочитані/записані процесом (усі потоки, у т.ч. пул сховища)."""
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return int(fields["rchar"]), int(fields["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    i = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[i]
+
+
+async def _measure(name: str, runs: list, concurrency: int) -> dict:
+    """`runs` — підготовлені корутин-фабрики; міряємо лише їх виконання."""
+    sem = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one(run):
+        async with sem:
+            start = time.perf_counter()
+            await run()
+            latencies.append(time.perf_counter() - start)
+
+    io_before = _io()
+    start = time.perf_counter()
+    await asyncio.gather(*(one(run) for run in runs))
+    elapsed = time.perf_counter() - start
+    io_after = _io()
+
+    latencies.sort()
+    n = len(runs) or 1
+    result = {
+        "ops": len(runs),
+        "throughput": len(runs) / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+    }
+    if io_before and io_after:
+        result["read_bytes_per_op"] = (io_after[0] - io_before[0]) / n
+        result["written_bytes_per_op"] = (io_after[1] - io_before[1]) / n
+    print(
+        f"{name:<16} {result['ops']:>6} {result['throughput']:>10.1f} "
+        f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+        f"{result.get('read_bytes_per_op', 0):>10.0f} {result.get('written_bytes_per_op', 0):>10.0f}"
+    )
+    return result
+
+
+# ───────────────────────── наповнення ─────────────────────────
+def _seed(args, rnd: random.Random) -> tuple[dict, dict]:
+    import schedule
+
+    uids = [1000 + i for i in range(args.users)]
+    users = {str(uid): {"first_name": f"User{uid}", "username": f"user{uid}"} for uid in uids}
+    today = date.today()
+    data: dict[str, dict[str, list[int]]] = {}
+    for offset in range(args.days):
+        day = today + timedelta(days=offset)
+        plan = schedule.plan(day)
+        slots = {
+            t: rnd.sample(uids, min(plan.seats[t], len(uids)))
+            for t in plan.times
+            if rnd.random() < args.density
+        }
+        if slots:
+            data[day.isoformat()] = slots
+    return data, users
+
+
+# ───────────────────────── сценарії ─────────────────────────
+async def _run(args) -> dict:
+    # модулі бота відкривають сховище під час імпорту — тож лише тут,
+    # коли робочий каталог уже тимчасовий і наповнений
+    import aio
+    import booking
+    import callbacks as cb
+    import render_cache
+    import schedule
+    from bot import build_router
+    from config import ADMIN_CHAT_ID
+    from handlers.admin import all_bookings_admin
+    from handlers.booking import show_user_bookings, start_booking
+
+    rnd = random.Random(args.seed + 1)
+    router = build_router()
+    bot = _Bot()
+    results: dict[str, dict] = {}
+    today = date.today()
+    dates = [(today + timedelta(days=i)).isoformat() for i in range(args.days)]
+    uids = [1000 + i for i in range(args.users)]
+
+    def tap(uid, data, user_data=None):
+        return lambda: router.dispatch(_update(uid, data), _context(bot, user_data))
+
+    def command(handler, uid):
+        return lambda: handler(_update(uid), _context(bot))
+
+    def with_bookings(k: int) -> list[tuple[int, list]]:
+        owners = [(uid, booking.user_bookings(uid)) for uid in rnd.sample(uids, len(uids))]
+        return [(uid, pairs) for uid, pairs in owners if pairs][:k]
+
+    print(f"{'scenario':<16} {'ops':>6} {'ops/s':>10} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'read B/op':>10} {'write B/op':>10}")
+
+    results["cold_load"] = await _measure("cold_load", [aio.warm_up], 1)
+
+    n, c = args.ops, args.concurrency
+    results["book_dates"] = await _measure(
+        "book_dates", [command(start_booking, rnd.choice(uids)) for _ in range(n)], c
+    )
+    results["pick_date"] = await _measure(
+        "pick_date",
+        [tap(rnd.choice(uids), cb.encode(cb.BOOK_DATE, rnd.choice(dates))) for _ in range(n)],
+        c,
+    )
+    runs = []
+    for _ in range(n):
+        d = rnd.choice(dates)
+        t = rnd.choice(schedule.plan(date.fromisoformat(d)).times or ("09:00",))
+        runs.append(tap(rnd.choice(uids), cb.encode(cb.BOOK_SLOT, d, t), {"booking_date": d}))
+    results["toggle_slot"] = await _measure("toggle_slot", runs, c)
+
+    results["my_bookings"] = await _measure(
+        "my_bookings", [command(show_user_bookings, rnd.choice(uids)) for _ in range(n)], c
+    )
+    results["admin_all"] = await _measure(
+        "admin_all", [command(all_bookings_admin, ADMIN_CHAT_ID) for _ in range(n)], c
+    )
+
+    # по одному вільному слоту на операцію, щоб броні не конфліктували
+    free = [(d, t) for d in dates for t in booking.free_times(d)]
+    rnd.shuffle(free)
+    runs = [
+        tap(rnd.choice(uids), cb.encode(cb.BOOK_CONFIRM), {"booking_date": d, "booking_selected": {t}})
+        for d, t in free[:n]
+    ]
+    results["book_confirm"] = await _measure("book_confirm", runs, c)
+
+    runs = [
+        tap(uid, cb.encode(cb.CANCEL_DATE, pairs[0][0]))
+        for uid, pairs in with_bookings(n)
+    ]
+    results["cancel_date"] = await _measure("cancel_date", runs, c)
+
+    owners = with_bookings(n)
+    runs = [
+        tap(uid, cb.encode(cb.CANCEL_CONFIRM), {"cancel_date": d, "cancel_selected": {t}})
+        for uid, ((d, t), *_) in owners
+    ]
+    results["cancel_confirm"] = await _measure("cancel_confirm", runs, c)
+
+    runs = [tap(uid, cb.encode(cb.CA_SELF)) for uid, _ in with_bookings(n)]
+    results["cancel_all_self"] = await _measure("cancel_all_self", runs, c)
+
+    await aio.flush_users()
+    hits, misses = render_cache.stats()
+    print(f"render cache: {hits} hits / {misses} misses, notifications: {bot.sent}")
+    return results
+
+
+# ───────────────────────── порівняння ─────────────────────────
+def _compare(current: dict, path: str) -> None:
+    with open(path, encoding="utf-8") as f:
+        previous = json.load(f)["results"]
+    print(f"\nПорівняння з {path} (нове / старе):")
+    for name, cur in current.items():
+        old = previous.get(name)
+        if not old:
+            continue
+        ratios = []
+        for key in ("throughput", "p50_ms", "p99_ms"):
+            if old.get(key):
+                ratios.append(f"{key} ×{cur[key] / old[key]:.2f}")
+        print(f"  {name:<16} " + ", ".join(ratios))
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Навантажувальний бенчмарк бота")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--density", type=float, default=0.5, help="частка зайнятих слотів")
+    parser.add_argument("--ops", type=int, default=200, help="операцій на сценарій")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workdir", help="каталог для сховища (за замовчуванням — тимчасовий)")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", help="попередній JSON-результат")
+    args = parser.parse_args()
+
+    out = os.path.abspath(args.out)
+    compare = os.path.abspath(args.compare) if args.compare else None
+
+    # ліміти розсилок вимірювали б сон, а не код — для бенчмарку вимикаємо
+    os.environ.setdefault("BOT_TOKEN", "bench")
+    os.environ.setdefault("ADMIN_CHAT_ID", "1")
+    os.environ.setdefault("NOTIFY_RATE", "1000000")
+    os.environ.setdefault("NOTIFY_PER_CHAT_INTERVAL", "0")
+    sys.path.insert(0, ROOT)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="tgbot-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+
+    from booking import DATA_FILE
+    from handlers.users import USERS_FILE
+    from storage import open_booking_store, open_user_store
+
+    # сховища з модулів вище ще не читались — наповнюємо їх файли напряму
+    data, users = _seed(args, random.Random(args.seed))
+    open_booking_store(DATA_FILE).replace(data)
+    open_user_store(USERS_FILE).save(users, set(users))
+    total = sum(len(slots) for slots in data.values())
+    print(f"Сховище: {workdir}, {len(users)} користувачів, {total} бронювань на {args.days} днів\n")
+
+    results = asyncio.run(_run(args))
+
+    import aio
+    from config import DATA_JOURNAL, STORAGE_BACKEND
+
+    aio.shutdown()
+    report = {
+        "meta": {
+            "revision": _git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "backend": STORAGE_BACKEND,
+            "journal": DATA_JOURNAL,
+            "params": {
+                k: getattr(args, k)
+                for k in ("users", "days", "density", "ops", "concurrency", "seed")
+            },
+        },
+        "results": results,
+    }
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультати: {out}")
+    if compare:
+        _compare(results, compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,89 +1,987 @@
 from __future__ import annotations
 
-import json
-import os
-from collections import OrderedDict
-from datetime import datetime, date
+import threading
+from bisect import bisect_left, bisect_right, insort
+from contextlib import ExitStack, contextmanager
+from datetime import date, timedelta
+from typing import Callable, Hashable
+
+import archive
+import schedule
+from config import RULE_HORIZON_DAYS
+from recurrence import Rule, RuleIndex
+from metrics import STORAGE_OPS
+from schedule import SLOT_BITS
+from storage import (
+    BookingStore,
+    RuleStore,
+    normalize,
+    open_booking_store,
+    open_rule_store,
+)
 
 DATA_FILE = "data.json"
+RULES_FILE = "rules.json"
 
 
 # ────────────────────────── helpers ──────────────────────────
-def _read_json(path: str) -> dict:
+def _ordinal(date_str: str) -> int | None:
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
+        return date.fromisoformat(date_str).toordinal()
+    except ValueError:
+        return None
 
 
-def _write_json(path: str, data: dict) -> None:
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+def _iso(ordinal: int) -> str:
+    return date.fromordinal(ordinal).isoformat()
 
 
-def _purge_past_dates(data: dict) -> dict:
+# ─────────────────────── repository ──────────────────────────
+class BookingRepository:
     """
-    Видаляє дні, що вже минули (порівнюється з поточною датою).
-    Повертає очищений словник.
+    Тримає бронювання в пам'яті процесу поверх постійного сховища
+    (`storage.BookingStore`: JSON-файл із журналом або SQLite).
+
+    • Сховище читається один раз і перечитується лише тоді, коли його
+      маркер стану змінився «під нами» (правка руками, інший процес).
+    • Кожна зміна одразу фіксується в сховищі (write-through).
+    • Слот — це список зайнятих місць; скільки їх може бути і чи слот
+      взагалі відкритий, каже скомпільований розклад (`schedule.plan`).
+    • Регулярні броні зберігаються одним правилом (`recurrence.Rule`) і
+      розгортаються лише для дат, які зараз потрібні: місце в слоті —
+      це разові броні плюс правила саме цього *(день тижня, час)*.
+
+    Безпечний для одночасних викликів: перевірка й зміна слота
+    виконуються атомарно (`book_if_free`, `cancel_if_owned`) під
+    блокуванням дати, а стан у пам'яті змінюється під коротким `_guard`.
+    Між процесами (SHARED_STORAGE) те саме забезпечує блокування сховища:
+    див. `_exclusive`.
     """
-    today = date.today()
-    for d in list(data.keys()):
+
+    def __init__(self, store: BookingStore, rule_store: RuleStore):
+        self._store = store
+        self._rule_store = rule_store
+        self._rules = RuleIndex()
+        self._dirty_rules: set[int] = set()  # змінені правила, ще не записані
+        self._data: dict[str, dict[str, list[int]]] = {}
+        self._stamp: Hashable | None = None
+        self._loaded = False
+        # скільки змін уже в пам'яті, але ще не записані в сховище (`_writing`)
+        self._writers = 0
+        self._reloads = 0  # скільки разів дані перечитано через зміни інших процесів
+        self._guard = threading.RLock()
+        self._date_locks: dict[str, threading.Lock] = {}
+        # вторинний індекс: user_id → відсортований список (дата, час)
+        self._by_user: dict[int, list[tuple[str, str]]] = {}
+        # заповнені слоти за днями: ordinal дати → бітова маска по `schedule.TIMES`
+        self._masks: dict[int, int] = {}
+        # відсортовані дати, на які є хоча б одна бронь (для діапазонів і сторінок)
+        self._dates: list[str] = []
+        # відсортовані id користувачів, у яких є броні чи правила (для посторінкового вибору)
+        self._user_ids: list[int] = []
+        # зростає з кожною зміною даних у пам'яті — ключ для кешів рендерингу
+        self._version = 0
+
+    # ---------- блокування ----------
+    def _date_lock(self, date_str: str) -> threading.Lock:
+        with self._guard:
+            lock = self._date_locks.get(date_str)
+            if lock is None:
+                lock = self._date_locks[date_str] = threading.Lock()
+            return lock
+
+    @contextmanager
+    def _date_locks_for(self, pairs: list[tuple[str, str]]):
+        """Блокує всі дати з `pairs` (у відсортованому порядку — без дедлоків)."""
+        with ExitStack() as stack:
+            for date_str in sorted({d for d, _ in pairs}):
+                stack.enter_context(self._date_lock(date_str))
+            yield
+
+    # ---------- синхронізація з диском ----------
+    @contextmanager
+    def _exclusive(self):
+        """
+        Обгортка кожної зміни: з SHARED_STORAGE тримає блокування сховища
+        між процесами і перечитує дані, якщо інший процес устиг їх змінити, —
+        тож перевірка слота й запис бачать той самий стан, що й на диску.
+        """
+        with self._store.lock():
+            self._refresh()
+            yield
+
+    @contextmanager
+    def _writing(self):
+        """
+        Зміна, що застосовується до пам'яті під `_guard`, а пишеться в сховище
+        вже без нього. Поки такі записи не завершені, маркер сховища може не
+        збігатися з `_stamp` через *наші ж* записи — `_refresh` тоді не
+        перечитує дані (інакше ще не записана зміна зникла б із пам'яті, а
+        слот виглядав би вільним). Якщо запис упав — пам'ять уже розійшлась
+        зі сховищем, тож наступне читання перечитає його.
+        """
+        with self._guard:
+            self._writers += 1
         try:
-            d_date = datetime.strptime(d, "%Y-%m-%d").date()
-            if d_date < today:
-                data.pop(d)
-        except ValueError:
-            # ключ не у форматі YYYY-MM-DD — лишаємо, раптом щось інше
-            pass
-    return data
+            yield
+        except BaseException:
+            with self._guard:
+                self._stamp = None
+            raise
+        finally:
+            with self._guard:
+                self._writers -= 1
+
+    def _stamps(self) -> Hashable:
+        return self._store.stamp(), self._rule_store.stamp()
+
+    def _refresh(self) -> None:
+        # швидкий шлях без блокувань: маркер сховища не змінився
+        if self._loaded and self._stamps() == self._stamp:
+            return
+        # порядок блокувань завжди: сховище (між процесами) → `_guard`
+        with self._store.lock(), self._guard:
+            stamp = self._stamps()
+            if self._loaded and (stamp == self._stamp or self._writers):
+                return  # без змін або маркер зсунули наші незавершені записи
+            if self._loaded:
+                STORAGE_OPS.inc(op="reload")  # дані змінив інший процес
+                self._reloads += 1
+            self._rules = RuleIndex(
+                [Rule.from_record(int(k), v) for k, v in self._rule_store.load().items()],
+                self._rule_store.last_id(),
+            )
+            self._dirty_rules.clear()
+            self._set_data(self._store.load())
+            self._stamp = stamp
+            self._loaded = True
+
+    # ---------- індекс користувачів ----------
+    def _set_data(self, data: dict) -> None:
+        """Приймає новий набір даних і перебудовує індекси (під `_guard`)."""
+        self._data = normalize(data)
+        self._by_user = {}
+        self._masks = {}
+        self._dates = sorted(self._data)
+        self._version += 1
+        for d in self._dates:
+            for t, seats in sorted(self._data[d].items()):
+                for uid in seats:
+                    self._by_user.setdefault(uid, []).append((d, t))
+                self._mask_update(d, t)
+        for items in self._by_user.values():
+            items.sort()
+        self._user_ids = sorted(self._by_user.keys() | self._rules.by_user.keys())
+
+    def _mask_update(self, date_str: str, time: str) -> None:
+        """Біт слота в масці заповнених — за лічильником місць і розкладом."""
+        seats = len(self._data.get(date_str, {}).get(time, ()))
+        if seats >= max(schedule.seats(date_str, time), 1):
+            self._mask_set(date_str, time)
+        else:
+            self._mask_clear(date_str, time)
+
+    def _mask_set(self, date_str: str, time: str) -> None:
+        bit = SLOT_BITS.get(time)
+        ordinal = _ordinal(date_str)
+        if bit and ordinal is not None:
+            self._masks[ordinal] = self._masks.get(ordinal, 0) | bit
+
+    def _mask_clear(self, date_str: str, time: str) -> None:
+        bit = SLOT_BITS.get(time)
+        ordinal = _ordinal(date_str)
+        if bit and ordinal in self._masks:
+            mask = self._masks[ordinal] & ~bit
+            if mask:
+                self._masks[ordinal] = mask
+            else:
+                del self._masks[ordinal]
+
+    def _index_add(self, user_id: int, date_str: str, time: str) -> None:
+        self._version += 1
+        if user_id not in self._by_user and user_id not in self._rules.by_user:
+            insort(self._user_ids, user_id)
+        insort(self._by_user.setdefault(user_id, []), (date_str, time))
+        self._mask_update(date_str, time)
+        i = bisect_left(self._dates, date_str)
+        if i == len(self._dates) or self._dates[i] != date_str:
+            self._dates.insert(i, date_str)
+
+    def _index_remove(self, user_id: int, date_str: str, time: str) -> None:
+        self._version += 1
+        self._mask_update(date_str, time)
+        if date_str not in self._data:  # день спорожнів — прибираємо з індексу дат
+            i = bisect_left(self._dates, date_str)
+            if i < len(self._dates) and self._dates[i] == date_str:
+                del self._dates[i]
+        items = self._by_user.get(user_id)
+        if not items:
+            return
+        i = bisect_left(items, (date_str, time))
+        if i < len(items) and items[i] == (date_str, time):
+            del items[i]
+        if not items:
+            del self._by_user[user_id]
+            self._forget_user(user_id)
+
+    def _forget_user(self, user_id: int) -> None:
+        """Прибирає id з `_user_ids`, якщо в нього не лишилось ні броней, ні правил."""
+        if user_id in self._by_user or user_id in self._rules.by_user:
+            return
+        j = bisect_left(self._user_ids, user_id)
+        if j < len(self._user_ids) and self._user_ids[j] == user_id:
+            del self._user_ids[j]
+
+    # ---------- правила повторення ----------
+    def _holders(self, date_str: str, time: str) -> list[int]:
+        """Хто займає місця в слоті: разові броні + правила цього слота."""
+        seats = self._data.get(date_str, {}).get(time, [])
+        ordinal = _ordinal(date_str)
+        if ordinal is None or not self._rules:
+            return list(seats)
+        return seats + self._rules.holders(ordinal, time)
+
+    def _full_mask(self, ordinal: int) -> int:
+        """
+        Біти заповнених слотів дня. Разові броні вже зведені в `_masks`;
+        правила перевіряються лише для часів, на які вони в цей день тижня є.
+        """
+        full = self._masks.get(ordinal, 0)
+        if not self._rules:
+            return full
+        plan = schedule.plan_for_ordinal(ordinal)
+        rest = self._rules.weekday_masks[(ordinal + 6) % 7] & plan.mask & ~full
+        if rest:
+            day = self._data.get(_iso(ordinal), {})
+            for t in schedule.times_of(rest):
+                taken = len(day.get(t, ())) + len(self._rules.holders(ordinal, t))
+                if taken >= plan.seats[t]:
+                    full |= SLOT_BITS[t]
+        return full
+
+    def _put_rule(self, rule: Rule) -> None:
+        """Додає чи оновлює правило в пам'яті (викликати під `_guard`)."""
+        if rule.id in self._rules.by_id:
+            self._rules.replace(rule)
+        else:
+            if rule.user_id not in self._by_user and rule.user_id not in self._rules.by_user:
+                insort(self._user_ids, rule.user_id)
+            self._rules.add(rule)
+        self._dirty_rules.add(rule.id)
+        self._version += 1
+
+    def _drop_rule(self, rule_id: int) -> Rule | None:
+        rule = self._rules.remove(rule_id)
+        if rule is not None:
+            self._forget_user(rule.user_id)
+            self._dirty_rules.add(rule_id)
+            self._version += 1
+        return rule
+
+    def _save_rules(self) -> None:
+        """Записує змінені правила (один запис на весь набір змін)."""
+        with self._guard:
+            if not self._dirty_rules:
+                return
+            records = {str(r.id): r.record() for r in self._rules.by_id.values()}
+            self._rule_store.save(
+                records, {str(i) for i in self._dirty_rules}, self._rules.last_id
+            )
+            self._dirty_rules.clear()
+            self._stamp = self._stamps()
+
+    def _copy(self) -> dict[str, dict[str, list[int]]]:
+        with self._guard:
+            return {
+                d: {t: list(seats) for t, seats in slots.items()}
+                for d, slots in self._data.items()
+            }
+
+    def _commit(self, records: list[dict]) -> None:
+        """
+        Фіксує в сховищі щойно застосовані до `_data` зміни. Викликати без
+        `_guard`: сховище може взяти знімок (`_copy`) під власним блокуванням.
+        """
+        if not records:
+            return
+        self._store.apply(records, self._copy)
+        if self._store.compaction_due():
+            self.compact()
+        with self._guard:
+            self._stamp = self._stamps()
+
+    def compact(self) -> None:
+        """Компактизація сховища (для JSON — новий знімок і порожній журнал)."""
+        with self._store.lock(), self._writing():
+            self._store.compact(self._copy)
+            with self._guard:
+                self._stamp = self._stamps()
+
+    def purge_before(self, day: date, keep: Callable[[dict], None] | None = None) -> int:
+        """
+        Прибирає всі дати до `day`: зріз відсортованого індексу дат
+        (рядки YYYY-MM-DD порівнюються як дати) і один запис у сховище.
+        Правила повторення «підтягуються» до `day` (минулі заняття стають
+        історією), вичерпані — видаляються.
+        Перед видаленням дні передаються в `keep` (архів): впаде він —
+        у сховищі нічого не зміниться. Повертає кількість знятих броней.
+
+        `keep` повільний (переписує місячні сегменти архіву), тож він працює
+        без блокувань: дні копіюються, архівуються, а потім під блокуванням
+        збираються знову — і видаляються, лише якщо не змінились (інакше
+        архівуються ще раз; повтор тих самих днів архів не дублює).
+        """
+        cutoff = day.isoformat()
+        cut_ordinal = day.toordinal()
+        archived = None
+        while True:
+            with self._exclusive(), self._writing():
+                with self._guard:
+                    past, days, stale = self._expired(cutoff, cut_ordinal)
+                    if not days and not stale:
+                        return 0
+                    ready = keep is None or not days or days == archived
+                    if ready:
+                        self._drop_expired(past, stale, cut_ordinal)
+                if ready:
+                    # запис у сховище — вже без `_guard` (міжпроцесне блокування тримаємо)
+                    if past:
+                        self._commit([{"op": "purge", "before": cutoff}])
+                    self._save_rules()
+                    return sum(len(s) for slots in days.values() for s in slots.values())
+            keep(days)
+            archived = days
+
+    def _expired(
+        self, cutoff: str, cut_ordinal: int
+    ) -> tuple[list[str], dict[str, dict[str, list[int]]], list[Rule]]:
+        """
+        Під `_guard`: *(минулі дати, копії їхніх днів разом із заняттями за
+        правилами, правила, що почались до `cut_ordinal`)*.
+        """
+        cut = bisect_left(self._dates, cutoff)
+        past = self._dates[:cut]
+        days = {d: {t: list(s) for t, s in self._data[d].items()} for d in past}
+        stale = [r for r in self._rules.by_id.values() if r.first < cut_ordinal]
+        for rule in stale:
+            for o in rule.occurrences(rule.first, cut_ordinal):
+                days.setdefault(_iso(o), {}).setdefault(rule.time, []).append(rule.user_id)
+        return past, days, stale
+
+    def _drop_expired(self, past: list[str], stale: list[Rule], cut_ordinal: int) -> None:
+        """Під `_guard`: видаляє `past` з пам'яті й підтягує правила `stale`."""
+        del self._dates[: len(past)]  # індекс дат — одним зрізом, а не по дню
+        for d in past:
+            for t, seats in self._data.pop(d).items():
+                for uid in seats:
+                    self._index_remove(uid, d, t)
+        for rule in stale:
+            first = rule.first + (cut_ordinal - rule.first + 6) // 7 * 7
+            if rule.last is not None and first > rule.last:
+                self._drop_rule(rule.id)
+            else:
+                skip = frozenset(o for o in rule.skip if o >= first)
+                self._put_rule(rule._replace(first=first, skip=skip))
+
+    # ---------- читання ----------
+    def data(self) -> dict[str, dict[str, list[int]]]:
+        """
+        Актуальний словник бронювань *{дата: {час: [user_id, ...]}}*.
+        Повертається живий об'єкт — змінювати його можна лише разом
+        із подальшим `replace()`.
+        """
+        self._refresh()
+        return self._data
+
+    def get_day(self, date_str: str) -> dict[str, list[int]]:
+        return self.data().get(date_str, {})
+
+    def is_free(self, date_str: str, time: str) -> bool:
+        """Слот відкритий за розкладом і в ньому є вільне місце — O(1)."""
+        self.data()
+        with self._guard:
+            return len(self._holders(date_str, time)) < schedule.seats(date_str, time)
+
+    def version(self) -> int:
+        """Лічильник змін: однаковий — значить, дані з того часу не змінювались."""
+        self.data()
+        return self._version
+
+    def peek_version(self) -> int:
+        """`version()` без звірки зі сховищем — просте читання атрибута."""
+        return self._version
+
+    def reloads(self) -> int:
+        """Скільки разів дані перечитано, бо їх змінив інший процес."""
+        self.data()
+        return self._reloads
+
+    # ---------- доступність (розклад + бітові маски) ----------
+    def free_mask(self, day: date) -> int:
+        """Біти відкритих слотів дня, де ще є місця (по `schedule.TIMES`)."""
+        self.data()
+        o = day.toordinal()
+        with self._guard:
+            return schedule.plan_for_ordinal(o).mask & ~self._full_mask(o)
+
+    def free_days(self, start: date, days: int) -> list[tuple[date, int]]:
+        """*(день, маска вільних)* для днів з `[start, start + days)`, де щось вільне."""
+        self.data()
+        first = start.toordinal()
+        out = []
+        with self._guard:
+            for o in range(first, first + days):
+                free = schedule.plan_for_ordinal(o).mask & ~self._full_mask(o)
+                if free:
+                    out.append((date.fromordinal(o), free))
+        return out
+
+    def first_free_day(self, start: date, horizon: int) -> date | None:
+        self.data()
+        first = start.toordinal()
+        with self._guard:
+            for o in range(first, first + horizon):
+                if schedule.plan_for_ordinal(o).mask & ~self._full_mask(o):
+                    return date.fromordinal(o)
+        return None
+
+    def free_seats(self, day: date) -> dict[str, int]:
+        """*{час: вільних місць}* для слотів дня, де ще є місця (за зростанням часу)."""
+        self.data()
+        plan = schedule.plan(day)
+        date_str = day.isoformat()
+        with self._guard:
+            taken = {t: len(self._holders(date_str, t)) for t in plan.times}
+        return {t: plan.seats[t] - taken[t] for t in plan.times if taken[t] < plan.seats[t]}
+
+    def _day(self, date_str: str) -> dict[str, list[int]]:
+        """Копія зайнятих місць дня разом із бронями за правилами (під `_guard`)."""
+        slots = {t: list(seats) for t, seats in self._data.get(date_str, {}).items()}
+        ordinal = _ordinal(date_str)
+        if ordinal is not None and self._rules:
+            for t, uids in self._rules.day(ordinal).items():
+                slots.setdefault(t, []).extend(uids)
+        return slots
+
+    def days(self, dates: list[str]) -> dict[str, dict[str, list[int]]]:
+        """Копії зайнятих слотів для кожної з `dates` (порожні — теж), з правилами."""
+        self.data()
+        with self._guard:
+            return {d: self._day(d) for d in dates}
+
+    def _rule_counts(self, start: str | None, end: str | None) -> dict[str, int]:
+        """
+        Броні за правилами по датах із `[start, end]`. Безстрокові правила
+        розгортаються не далі ніж на RULE_HORIZON_DAYS від сьогодні.
+        """
+        if not self._rules:
+            return {}
+        lo = _ordinal(start) if start else 0
+        hi = (
+            _ordinal(end) + 1
+            if end
+            else (date.today() + timedelta(days=RULE_HORIZON_DAYS)).toordinal()
+        )
+        return {_iso(o): n for o, n in self._rules.counts(lo, hi).items()}
+
+    def booked_dates(self) -> list[str]:
+        self.data()
+        with self._guard:
+            if not self._rules:
+                return list(self._dates)
+            return sorted(set(self._dates).union(self._rule_counts(None, None)))
+
+    def booked_counts(self, start: str | None, end: str | None) -> list[tuple[str, int]]:
+        """*(дата, кількість броней)* для дат із `[start, end]` — без копіювання слотів."""
+        self.data()
+        with self._guard:
+            lo = bisect_left(self._dates, start) if start else 0
+            hi = bisect_right(self._dates, end) if end else len(self._dates)
+            counts = {
+                d: sum(map(len, self._data[d].values())) for d in self._dates[lo:hi]
+            }
+            for d, n in self._rule_counts(start, end).items():
+                counts[d] = counts.get(d, 0) + n
+        return sorted(counts.items())
+
+    def snapshot(self) -> dict[str, dict[str, list[int]]]:
+        """Повна копія даних, яку можна вільно читати з іншого потоку."""
+        self.data()
+        return self._copy()
+
+    def user_bookings(self, user_id: int, until: date | None = None) -> list[tuple[str, str]]:
+        """
+        Разові броні користувача, відсортовані за (дата, час) — O(його бронювань).
+        З `until` — ще й заняття за його правилами від сьогодні до `until`.
+        """
+        self.data()
+        with self._guard:
+            pairs = list(self._by_user.get(user_id, ()))
+            if until is None or user_id not in self._rules.by_user:
+                return pairs
+            lo, hi = date.today().toordinal(), until.toordinal() + 1
+            for rule in self._rules.by_user[user_id]:
+                pairs.extend((_iso(o), rule.time) for o in rule.occurrences(lo, hi))
+        return sorted(set(pairs))
+
+    def user_rules(self, user_id: int) -> list[Rule]:
+        """Правила повторення користувача (за днем тижня й часом)."""
+        self.data()
+        with self._guard:
+            rules = list(self._rules.by_user.get(user_id, ()))
+        return sorted(rules, key=lambda r: (r.weekday, r.time, r.first))
+
+    def users_with_bookings(self) -> list[int]:
+        self.data()
+        with self._guard:
+            return list(self._user_ids)
+
+    def users_page(self, offset: int, limit: int) -> tuple[list[int], int]:
+        """Зріз відсортованого індексу користувачів із бронями та їх загальна кількість."""
+        self.data()
+        with self._guard:
+            return self._user_ids[offset:offset + limit], len(self._user_ids)
+
+    def with_bookings(self, user_ids: list[int]) -> list[int]:
+        """Ті з `user_ids`, у кого є броні (за зростанням id)."""
+        self.data()
+        with self._guard:
+            return sorted(
+                uid
+                for uid in set(user_ids)
+                if uid in self._by_user or uid in self._rules.by_user
+            )
+
+    # ---------- зміни ----------
+    def replace(self, data: dict) -> None:
+        """Повністю замінює набір бронювань (одразу як новий знімок)."""
+        with self._exclusive(), self._writing():
+            with self._guard:
+                self._set_data(data)
+                snapshot = self._copy()
+            self._store.replace(snapshot)
+            with self._guard:
+                self._stamp = self._stamps()
+
+    def _seat(self, date_str: str, time: str, user_id: int) -> bool:
+        """
+        Займає місце в слоті (викликати під `_guard`), якщо слот відкритий,
+        у ньому є вільне місце і користувач ще не записаний туди.
+        """
+        holders = self._holders(date_str, time)
+        if user_id in holders or len(holders) >= schedule.seats(date_str, time):
+            return False
+        self._data.setdefault(date_str, {}).setdefault(time, []).append(user_id)
+        self._index_add(user_id, date_str, time)
+        return True
+
+    def book_if_free(self, date_str: str, time: str, user_id: int) -> bool:
+        """Атомарно: займає місце в слоті, лише якщо воно є."""
+        # блокування дати тримаємо до запису в журнал, щоб записи про
+        # той самий слот потрапили туди в тому ж порядку, що й у пам'ять
+        with self._date_lock(date_str), self._exclusive(), self._writing():
+            with self._guard:
+                if not self._seat(date_str, time, user_id):
+                    return False
+            self._commit([{"op": "book", "d": date_str, "t": time, "u": user_id}])
+        return True
+
+    def book_many(
+        self,
+        pairs: list[tuple[str, str]],
+        user_id: int,
+    ) -> tuple[list[tuple[str, str]], list[tuple[str, str]]]:
+        """
+        Бронює набір слотів за один прохід і один запис на диск.
+        Повертає *(заброньовані, зайняті)* у порядку `pairs`.
+        """
+        booked: list[tuple[str, str]] = []
+        failed: list[tuple[str, str]] = []
+        with self._date_locks_for(pairs), self._exclusive(), self._writing():
+            with self._guard:
+                for date_str, time in pairs:
+                    if self._seat(date_str, time, user_id):
+                        booked.append((date_str, time))
+                    else:
+                        failed.append((date_str, time))
+            self._commit(
+                [{"op": "book", "d": d, "t": t, "u": user_id} for d, t in booked]
+            )
+        return booked, failed
+
+    def _take(
+        self,
+        date_str: str,
+        time: str,
+        requester_id: int,
+        is_admin: bool,
+        all_seats: bool = False,
+    ) -> tuple[list[int], list[int]]:
+        """
+        Звільняє місця в пам'яті (викликати під `_guard`): власне місце
+        `requester_id`, а якщо його там немає і це адмін — увесь слот.
+        `all_seats` (лише адмін) — увесь слот, навіть якщо адмін у ньому теж.
+        Заняття за правилом не видаляється, а стає винятком правила.
+        Повертає *(id зі знятими разовими бронями, id зі знятими заняттями)*.
+        """
+        day = self._data.get(date_str, {})
+        seats = day.get(time, [])
+        ordinal = _ordinal(date_str)
+        rules = self._rules.active(ordinal, time) if ordinal is not None else []
+        own = [r for r in rules if r.user_id == requester_id]
+        if is_admin and all_seats:
+            taken, skipped = list(seats), rules
+        elif requester_id in seats:
+            taken, skipped = [requester_id], []
+        elif own:
+            taken, skipped = [], own
+        elif is_admin:
+            taken, skipped = list(seats), rules
+        else:
+            return [], []  # немає що знімати або недостатньо прав
+
+        for uid in taken:
+            seats.remove(uid)
+        if taken and not seats:
+            del day[time]
+        if taken and not day:
+            del self._data[date_str]
+        for uid in taken:
+            self._index_remove(uid, date_str, time)
+        for rule in skipped:
+            self._put_rule(rule._replace(skip=rule.skip | {ordinal}))
+        return taken, [r.user_id for r in skipped]
+
+    def cancel_if_owned(
+        self,
+        date_str: str,
+        time: str,
+        requester_id: int,
+        *,
+        is_admin: bool = False,
+    ) -> list[int]:
+        """
+        Атомарно: звільняє місце `requester_id` у слоті (адмін — будь-які).
+        Повертає id тих, чиї броні знято (порожньо — нічого не знято).
+        """
+        with self._date_lock(date_str), self._exclusive(), self._writing():
+            with self._guard:
+                taken, skipped = self._take(date_str, time, requester_id, is_admin)
+            self._commit(
+                [{"op": "cancel", "d": date_str, "t": time, "u": uid} for uid in taken]
+            )
+            self._save_rules()
+        return taken + skipped
+
+    def cancel_many(
+        self,
+        pairs: list[tuple[str, str]],
+        requester_id: int,
+        *,
+        is_admin: bool = False,
+        all_seats: bool = False,
+    ) -> dict[tuple[str, str], list[int]]:
+        """
+        Скасовує набір слотів за один прохід і один запис на диск.
+        `all_seats` (адмін) — звільняє слоти повністю, а не лише своє місце.
+        Повертає *{(дата, час): [id тих, чиї броні знято]}*.
+        """
+        results: dict[tuple[str, str], tuple[list[int], list[int]]] = {}
+        with self._date_locks_for(pairs), self._exclusive(), self._writing():
+            with self._guard:
+                for date_str, time in pairs:
+                    if (date_str, time) not in results:
+                        results[(date_str, time)] = self._take(
+                            date_str, time, requester_id, is_admin, all_seats
+                        )
+            self._commit(
+                [
+                    {"op": "cancel", "d": d, "t": t, "u": uid}
+                    for (d, t), (taken, _) in results.items()
+                    for uid in taken
+                ]
+            )
+            self._save_rules()
+        return {pair: taken + skipped for pair, (taken, skipped) in results.items()}
+
+    # ---------- правила повторення: зміни ----------
+    def add_rules(
+        self,
+        user_id: int,
+        date_str: str,
+        times: list[str],
+        count: int | None,
+    ) -> list[tuple[str, Rule | None, list[str]]]:
+        """
+        Створює по правилу на кожен час: щотижня від `date_str`, `count`
+        разів (*None* — безстроково). Усі правила — один запис у сховище.
+
+        Повертає *(час, правило або None, дати-конфлікти)*. Дати, де слот уже
+        зайнятий разовими бронями, стають винятками правила; правило не
+        створюється, якщо слот закритий, у користувача вже є таке правило
+        або правила, що перетинаються, займають усі місця.
+        """
+        first = date.fromisoformat(date_str).toordinal()
+        last = None if count is None else first + 7 * (count - 1)
+        out = []
+        with self._exclusive(), self._guard:
+            for time in times:
+                out.append((time, *self._new_rule(user_id, time, first, last)))
+            self._save_rules()
+        return out
+
+    def _new_rule(
+        self, user_id: int, time: str, first: int, last: int | None
+    ) -> tuple[Rule | None, list[str]]:
+        rule = Rule(self._rules.next_id(), user_id, time, first, last)
+        overlapping = [
+            r for r in self._rules.by_slot.get((rule.weekday, time), ()) if r.overlaps(rule)
+        ]
+        if any(r.user_id == user_id for r in overlapping):
+            return None, []
+
+        # Місця перевіряються на кожне заняття. Після `steady` розклад лише
+        # щотижневий, разових броней немає, а інші правила вже почались (чи
+        # скінчились) і без пропусків — кожен наступний тиждень такий самий,
+        # тож досить дійти до першого заняття з `[steady, steady + 7)`.
+        steady = max(
+            first,
+            schedule.dated_until() + 1,
+            _ordinal(self._dates[-1]) + 1 if self._dates else 0,
+            *(r.first for r in overlapping),
+            *(r.last + 1 for r in overlapping if r.last is not None),
+            *(max(r.skip) + 1 for r in overlapping if r.skip),
+        )
+        end = steady + 7 if last is None else min(last + 1, steady + 7)
+        skip, conflicts = set(), []
+        usable = None  # останнє заняття, на яке місце є (або вже є разова бронь)
+        blocked = False  # чи зайняте/закрите останнє перевірене заняття
+        for o in range(first, end, 7):
+            capacity = schedule.plan_for_ordinal(o).seats.get(time, 0)
+            blocked = not capacity  # закритий день правило й так пропускає
+            if blocked:
+                continue
+            d = _iso(o)
+            seats = self._data.get(d, {}).get(time, ())
+            if user_id in seats:
+                skip.add(o)  # уже записаний разово — друге місце не потрібне
+                usable = o
+            elif len(seats) + sum(r.occurs(o) for r in overlapping) >= capacity:
+                skip.add(o)
+                conflicts.append(d)
+                blocked = True
+            else:
+                usable = o
+        if usable is None:
+            return None, []
+        if blocked and (last is None or last >= end):
+            # далі всі тижні такі ж, як останній перевірений, — правило
+            # закінчується на останньому занятті, де є місце
+            last = usable
+            conflicts = [d for d in conflicts if d <= _iso(last)]
+        skip = frozenset(o for o in skip if last is None or o <= last)
+        rule = rule._replace(last=last, skip=skip)
+        self._put_rule(rule)
+        return rule, conflicts
+
+    def cancel_rules(
+        self,
+        requester_id: int,
+        *,
+        rule_id: int | None = None,
+        user_id: int | None = None,
+        is_admin: bool = False,
+    ) -> list[Rule]:
+        """
+        Видаляє правило `rule_id`, або всі правила `user_id`, або (адмін, без
+        аргументів) усі правила взагалі. Чужі правила — лише адмін.
+        """
+        with self._exclusive(), self._guard:
+            if rule_id is not None:
+                rule = self._rules.by_id.get(rule_id)
+                targets = [rule] if rule else []
+            elif user_id is not None:
+                targets = list(self._rules.by_user.get(user_id, ()))
+            else:
+                targets = list(self._rules.by_id.values())
+            targets = [r for r in targets if is_admin or r.user_id == requester_id]
+            for rule in targets:
+                self._drop_rule(rule.id)
+            self._save_rules()
+        return targets
+
+
+_repo = BookingRepository(open_booking_store(DATA_FILE), open_rule_store(RULES_FILE))
 
 
 # ───────────────────── public API (data) ─────────────────────
 def load_data() -> dict:
     """
-    Читає `data.json`, прибирає минулі дати
-    й одразу зберігає файл, якщо щось змінилось.
+    Повертає копію бронювань з пам'яті (сховище перечитується лише після
+    змін на диску). Минулі дати прибирає `purge_past_dates` за розкладом.
+    Для одного дня чи користувача дешевше `get_days` / `user_bookings`.
     """
-    data = _read_json(DATA_FILE)
-    cleaned = _purge_past_dates(data)
-    if cleaned != data:
-        _write_json(DATA_FILE, cleaned)
-    return cleaned
+    return _repo.snapshot()
 
 
 def save_data(data: dict) -> None:
-    """Зберігає дані, відсортовані за датою та часом."""
-    ordered: dict[str, dict[str, int]] = OrderedDict()
-    for d in sorted(data.keys()):
-        ordered[d] = OrderedDict(
-            sorted(
-                data[d].items(),
-                key=lambda kv: datetime.strptime(kv[0], "%H:%M"),
-            )
-        )
-    _write_json(DATA_FILE, ordered)
+    """
+    Повністю замінює збережені дані (для JSON — новий знімок,
+    відсортований за датою та часом). Для точкових змін дешевше
+    `book_slot` / `cancel_slot`.
+    """
+    _repo.replace(data)
+
+
+def version() -> int:
+    """Версія даних; змінюється з кожним бронюванням/скасуванням/перечитуванням."""
+    return _repo.version()
+
+
+def peek_version() -> int:
+    """
+    Версія даних у пам'яті без звірки зі сховищем: без I/O та блокувань,
+    тож її можна читати прямо з event loop. Зміни з інших процесів
+    (SHARED_STORAGE) вона побачить лише після наступного читання.
+    """
+    return _repo.peek_version()
+
+
+def reloads() -> int:
+    """
+    Лічильник перечитувань через зміни інших процесів (SHARED_STORAGE);
+    звіряється зі сховищем. Змінився — пам'ять могла отримати броні, про
+    які цей процес подій не бачив.
+    """
+    return _repo.reloads()
+
+
+def get_days(dates: list[str]) -> dict[str, dict[str, list[int]]]:
+    """*{дата: {час: [user_id, ...]}}* лише для потрібних дат."""
+    return _repo.days(dates)
+
+
+def booked_dates() -> list[str]:
+    """Відсортовані дати, на які є хоча б одна бронь."""
+    return _repo.booked_dates()
+
+
+def booked_counts(start: str | None = None, end: str | None = None) -> list[tuple[str, int]]:
+    """Кількість броней по датах (за зростанням), опційно в межах `[start, end]`."""
+    return _repo.booked_counts(start, end)
+
+
+def free_times(date_str: str) -> list[str]:
+    """Слоти дня *YYYY-MM-DD*, де є вільні місця (за зростанням часу)."""
+    return schedule.times_of(_repo.free_mask(date.fromisoformat(date_str)))
+
+
+def free_seats(date_str: str) -> dict[str, int]:
+    """*{час: вільних місць}* дня *YYYY-MM-DD* — лише для слотів із місцями."""
+    return _repo.free_seats(date.fromisoformat(date_str))
+
+
+def free_slots(start: date, days: int) -> dict[str, list[str]]:
+    """Вільні слоти на `days` днів від `start`; дні без вільних слотів пропущено."""
+    return {
+        d.isoformat(): schedule.times_of(mask) for d, mask in _repo.free_days(start, days)
+    }
+
+
+def first_free_day(start: date, horizon: int = 365) -> str | None:
+    """Перший день від `start` (не далі `horizon` днів), де є вільний слот."""
+    day = _repo.first_free_day(start, horizon)
+    return day.isoformat() if day else None
 
 
 # ──────────────────── booking core functions ─────────────────
 def is_slot_available(date_str: str, time: str) -> bool:
-    """Перевіряє, чи вільний слот *HH:MM* на дату *YYYY-MM-DD*."""
-    data = load_data()
-    return time not in data.get(date_str, {})
+    """Перевіряє, чи є вільне місце в слоті *HH:MM* на дату *YYYY-MM-DD*."""
+    return _repo.is_free(date_str, time)
 
 
 def book_slot(date_str: str, time: str, user_id: int) -> bool:
     """
-    Бронює слот. Повертає *True*, якщо вдалося, *False* — якщо зайнятий.
-    У файлі зберігаємо лише `user_id` (INT).
+    Займає місце в слоті. Повертає *True*, якщо вдалося, *False* — якщо
+    слот закритий за розкладом, місць немає або користувач уже записаний.
+    Перевірка й запис атомарні, тож двоє не заберуть останнє місце.
     """
-    data = load_data()
-    if not is_slot_available(date_str, time):
-        return False
+    return _repo.book_if_free(date_str, time, user_id)
 
-    data.setdefault(date_str, {})[time] = user_id
-    save_data(data)
-    return True
+
+def book_many(
+    pairs: list[tuple[str, str]],
+    user_id: int,
+) -> tuple[list[tuple[str, str]], list[tuple[str, str]]]:
+    """
+    Бронює одразу кілька пар *(дата, час)*: усі перевірки й зміни —
+    в одному проході, на диск — один запис.
+    Повертає *(booked, failed)*: що заброньовано і на що місць не знайшлося.
+    """
+    return _repo.book_many(pairs, user_id)
+
+
+def user_bookings(user_id: int, until: date | None = None) -> list[tuple[str, str]]:
+    """
+    Разові броні користувача як відсортований список *(дата, час)*;
+    з `until` — разом із заняттями за його правилами до цієї дати.
+    """
+    return _repo.user_bookings(user_id, until)
+
+
+def user_rules(user_id: int) -> list[Rule]:
+    """Регулярні броні (правила повторення) користувача."""
+    return _repo.user_rules(user_id)
+
+
+def add_rules(
+    user_id: int,
+    date_str: str,
+    times: list[str],
+    count: int | None = None,
+) -> list[tuple[str, Rule | None, list[str]]]:
+    """
+    Щотижневі броні від `date_str` на кожен із `times`: `count` тижнів або
+    безстроково (*None*). Зберігається одне правило на час, а не дати.
+    Повертає *(час, правило або None, дати-конфлікти)*.
+    """
+    return _repo.add_rules(user_id, date_str, times, count)
+
+
+def cancel_rules(
+    requester_id: int,
+    *,
+    rule_id: int | None = None,
+    user_id: int | None = None,
+    is_admin: bool = False,
+) -> list[Rule]:
+    """Видаляє правило / усі правила користувача / усі правила (адмін)."""
+    return _repo.cancel_rules(
+        requester_id, rule_id=rule_id, user_id=user_id, is_admin=is_admin
+    )
+
+
+def users_with_bookings() -> list[int]:
+    """Відсортовані id користувачів, які мають хоча б одну бронь."""
+    return _repo.users_with_bookings()
+
+
+def purge_past_dates(today: date | None = None) -> int:
+    """
+    Переносить броні на дати до `today` (за замовчуванням — сьогодні)
+    в архів (`archive.py`) і видаляє їх зі сховища.
+    """
+    return _repo.purge_before(today or date.today(), archive.store_days)
+
+
+def users_page(offset: int, limit: int) -> tuple[list[int], int]:
+    """Сторінка користувачів із бронями (за id) і скільки їх усього."""
+    return _repo.users_page(offset, limit)
+
+
+def with_bookings(user_ids: list[int]) -> list[int]:
+    """Відфільтровує `user_ids`, залишаючи лише тих, у кого є броні."""
+    return _repo.with_bookings(user_ids)
 
 
 def cancel_slot(
@@ -92,27 +990,31 @@ def cancel_slot(
     requester_id: int,
     *,
     is_admin: bool = False,
-) -> int | None:
+) -> list[int]:
     """
-    Скасовує бронювання й повертає **id користувача, чиє бронювання було видалено**,
-    або *None*, якщо скасувати не вдалося.
+    Скасовує бронювання й повертає **id користувачів, чиї броні знято**
+    (порожній список, якщо скасувати не вдалося).
 
-    • Звичайний користувач може скасувати лише власні бронювання.  
-    • Адміністратор (is_admin=True) — будь-які.
+    • Звичайний користувач звільняє лише власне місце.
+    • Адміністратор (is_admin=True) — своє, а якщо його там немає, то
+      весь слот (у груповому — усі місця).
     """
-    data = load_data()
-    user_entry = data.get(date_str, {}).get(time)
-    if user_entry is None:
-        return None
-
-    booked_uid = user_entry["id"] if isinstance(user_entry, dict) else int(user_entry)
-    if not (is_admin or booked_uid == requester_id):
-        return None  # недостатньо прав
+    return _repo.cancel_if_owned(date_str, time, requester_id, is_admin=is_admin)
 
-    # видаляємо слот
-    del data[date_str][time]
-    if not data[date_str]:
-        del data[date_str]
 
-    save_data(data)
-    return booked_uid
+def cancel_many(
+    date_time_pairs: list[tuple[str, str]],
+    requester_id: int,
+    is_admin: bool = False,
+    all_seats: bool = False,
+) -> dict[tuple[str, str], list[int]]:
+    """
+    Скасовує одразу кілька пар *(дата, час)* з тими ж правами, що й
+    `cancel_slot`, але одним проходом і одним записом на диск.
+    `all_seats=True` (лише з `is_admin`) — слоти звільняються повністю,
+    навіть якщо адмін сам у них записаний.
+    Повертає *{(дата, час): [id користувачів]}* для кожного слота.
+    """
+    return _repo.cancel_many(
+        date_time_pairs, requester_id, is_admin=is_admin, all_seats=all_seats
+    )
@@ -1,89 +1,210 @@
+from telegram import Update
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
     CallbackQueryHandler,
+    TypeHandler,
 )
 
-from config import BOT_TOKEN
+import aio
+import callbacks as cb
+import metrics
+import sessions
+from config import (
+    BOT_TOKEN,
+    CONCURRENT_UPDATES,
+    LOOP_LAG_INTERVAL,
+    METRICS_HOST,
+    METRICS_PORT,
+    UPDATE_MODE,
+    USERS_FLUSH_INTERVAL,
+    WEBHOOK_LISTEN,
+    WEBHOOK_MAX_CONNECTIONS,
+    WEBHOOK_PATH,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET,
+    WEBHOOK_URL,
+)
 from handlers.base import start, help_command, set_bot_commands
 from handlers.booking import (
     start_booking,
-    handle_slot_selection,
     show_user_bookings,
+    pick_date,
+    toggle_slot,
+    confirm_booking,
+    confirm_month,
+    confirm_weekly,
+    abort_booking,
+)
+from handlers.cancel import (
+    pick_cancel_date,
+    toggle_cancel_slot,
+    confirm_cancel,
+    abort_cancel,
 )
-from handlers.cancel import handle_cancel_selection
 from handlers.cancel_all import (
     start_cancel_menu,
-    handle_cancel_all,
+    pick_dates,
+    pick_user,
+    cancel_user,
+    cancel_all_self,
+    cancel_all_system,
+    pick_rules,
+    cancel_rule,
+    abort_cancel_menu,
 )
 from handlers.admin import (
     all_bookings_admin,
     user_bookings_list,
     show_all_user_bookings,
+    admin_bookings_page,
+    history_command,
+    stats_command,
 )
-from handlers.menu_router import handle_main_menu
+from handlers.user_picker import picker_page
+from handlers.users import track_known_user
 
 
-def main() -> None:
-    app = (
-        ApplicationBuilder()
-        .token(BOT_TOKEN)
-        .post_init(set_bot_commands)
-        .build()
-    )
+async def post_init(app) -> None:
+    await aio.warm_up()  # сховища — у пам'ять ще до першого апдейту
+    await aio.start_reminders(app.job_queue)
+    await metrics.start(METRICS_HOST, METRICS_PORT, LOOP_LAG_INTERVAL)
+    await set_bot_commands(app)
 
-    # ──────────── Команди ────────────
-    app.add_handler(CommandHandler("start", start))
-    app.add_handler(CommandHandler("help", help_command))
-    app.add_handler(CommandHandler("book", start_booking))
-    app.add_handler(CommandHandler("cancel", start_cancel_menu))
-    app.add_handler(CommandHandler("mybookings", show_user_bookings))
-    app.add_handler(CommandHandler("adminbookings", all_bookings_admin))
-    app.add_handler(CommandHandler("user_bookings", user_bookings_list))
 
-    # ──────────── Callback-кнопки ────────────
+async def post_shutdown(app) -> None:
+    await metrics.stop()
+    await aio.on_shutdown(app)
+
+
+def build_router() -> cb.CallbackRouter:
+    router = cb.CallbackRouter()
+
     # Головне меню
-    app.add_handler(CallbackQueryHandler(handle_main_menu, pattern=r"^menu_"))
+    router.add(cb.MENU_BOOK, start_booking)
+    router.add(cb.MENU_MY, show_user_bookings)
+    router.add(cb.MENU_CANCEL, start_cancel_menu)
+    router.add(cb.MENU_ADMIN, all_bookings_admin, admin_only=True)
+    router.add(cb.MENU_HOME, start)
 
     # Бронювання (дата / час / підтвердження / відміна)
-    app.add_handler(
-        CallbackQueryHandler(
-            handle_slot_selection,
-            pattern=r"^(date_|slot_|confirm_booking|confirm_month|cancel_book)",
-        )
-    )
+    router.add(cb.BOOK_DATE, pick_date)
+    router.add(cb.BOOK_SLOT, toggle_slot)
+    router.add(cb.BOOK_CONFIRM, confirm_booking)
+    router.add(cb.BOOK_MONTH, confirm_month)
+    router.add(cb.BOOK_WEEKLY, confirm_weekly)
+    router.add(cb.BOOK_ABORT, abort_booking)
 
     # Покрокове скасування конкретних слотів
-    app.add_handler(
-        CallbackQueryHandler(
-            handle_cancel_selection,
-            pattern=r"^(cdate_|cslot_|confirm_cancel|cancel_cancel)",
-        )
-    )
+    router.add(cb.CANCEL_DATE, pick_cancel_date)
+    router.add(cb.CANCEL_SLOT, toggle_cancel_slot)
+    router.add(cb.CANCEL_CONFIRM, confirm_cancel)
+    router.add(cb.CANCEL_ABORT, abort_cancel)
 
     # Меню масових скасувань
-    app.add_handler(
-        CallbackQueryHandler(
-            handle_cancel_all,
-            #  🔥 виправлений патерн: дозволяє ID після cau_,
-            #  та прибрано $, щоб ловити можливі суфікси-підтвердження
-            pattern=(
-                r"^(cancel_pick_dates"
-                r"|confirm_cancel_all_self"
-                r"|pick_cancel_user"
-                r"|cau_\d+"
-                r"|confirm_cancel_all_all"
-                r"|back_cancel_all"
-                r"|cancel_cancel_all)"
-            ),
-        )
-    )
+    router.add(cb.CA_PICK_DATES, pick_dates)
+    router.add(cb.CA_SELF, cancel_all_self)
+    router.add(cb.CA_PICK_USER, pick_user, admin_only=True)
+    router.add(cb.CA_USER, cancel_user, admin_only=True)
+    router.add(cb.CA_ALL, cancel_all_system, admin_only=True)
+    router.add(cb.CA_RULES, pick_rules)
+    router.add(cb.RULE_CANCEL, cancel_rule)
+    router.add(cb.CA_BACK, start_cancel_menu)
+    router.add(cb.CA_ABORT, abort_cancel_menu)
 
     # Перегляд бронювань конкретного користувача (адмін)
-    app.add_handler(CallbackQueryHandler(show_all_user_bookings, pattern=r"^ub_\d+$"))
+    router.add(cb.USER_BOOKINGS, show_all_user_bookings, admin_only=True)
+    router.add(cb.ADMIN_PAGE, admin_bookings_page, admin_only=True)
+    router.add(cb.USER_PICKER, picker_page, admin_only=True)
+    return router
+
 
-    print("✅ Бот запущено. Чекаю команди…")
-    app.run_polling()
+def build_app(token: str | None = None, request=None):
+    """
+    Застосунок з усіма обробниками та задачами. `request` — власний транспорт
+    Bot API (див. `webhook_replay.OfflineRequest`); за замовчуванням — HTTPS.
+    """
+    builder = ApplicationBuilder().token(token or BOT_TOKEN)
+    if request is not None:
+        builder = builder.request(request)
+    app = (
+        builder
+        # сховище атомарно перевіряє й бронює слоти, тож апдейти
+        # різних користувачів можна обробляти паралельно
+        .concurrent_updates(CONCURRENT_UPDATES or False)
+        # незавершений вибір переживає перезапуск (див. sessions.py)
+        .persistence(sessions.open_persistence())
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+
+    # ──────────── Профілі користувачів ────────────
+    # група -1: спрацьовує перед усіма обробниками й не заважає їм
+    app.add_handler(TypeHandler(Update, track_known_user), group=-1)
+    app.job_queue.run_repeating(
+        aio.flush_users_job, interval=USERS_FLUSH_INTERVAL, first=USERS_FLUSH_INTERVAL
+    )
+    # стан діалогів: застарілий — геть, змінений — на диск
+    app.job_queue.run_repeating(
+        sessions.sessions_job, interval=USERS_FLUSH_INTERVAL, first=USERS_FLUSH_INTERVAL
+    )
+    # минулі дати прибираються раз на добу (і при старті — у warm_up),
+    # а не при кожному читанні
+    app.job_queue.run_once(aio.purge_job, when=aio.next_midnight())
+
+    # ──────────── Команди ────────────
+    commands = {
+        "start": start,
+        "help": help_command,
+        "book": start_booking,
+        "cancel": start_cancel_menu,
+        "mybookings": show_user_bookings,
+        "adminbookings": all_bookings_admin,
+        "user_bookings": user_bookings_list,
+        "history": history_command,
+        "stats": stats_command,
+    }
+    for name, handler in commands.items():
+        app.add_handler(CommandHandler(name, metrics.timed(handler, f"/{name}")))
+
+    # ──────────── Callback-кнопки ────────────
+    # один обробник: payload розбирається раз, далі — пошук у таблиці
+    app.add_handler(CallbackQueryHandler(build_router().dispatch))
+    return app
+
+
+def main() -> None:
+    app = build_app()
+    print(f"✅ Бот запущено ({UPDATE_MODE}). Чекаю команди…")
+    run(app)
+
+
+def run(app) -> None:
+    """
+    Запускає отримання апдейтів у режимі UPDATE_MODE.
+
+    В обох режимах SIGINT/SIGTERM зупиняють бота «м'яко»: спершу перестаємо
+    приймати нові апдейти, далі дообробляються вже отримані (у т.ч. ті, що
+    виконуються паралельно), і лише потім `post_shutdown` скидає профілі.
+    """
+    if UPDATE_MODE == "polling":
+        app.run_polling()
+        return
+    if UPDATE_MODE != "webhook":
+        raise ValueError(f"Unknown UPDATE_MODE: {UPDATE_MODE!r}")
+
+    if not WEBHOOK_URL or not WEBHOOK_SECRET:
+        raise ValueError("UPDATE_MODE=webhook requires WEBHOOK_URL and WEBHOOK_SECRET")
+    path = WEBHOOK_PATH.strip("/")
+    app.run_webhook(
+        listen=WEBHOOK_LISTEN,
+        port=WEBHOOK_PORT,
+        url_path=path,
+        webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{path}",
+        secret_token=WEBHOOK_SECRET,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,218 @@
+import base64
+import binascii
+import logging
+from datetime import date
+from typing import Awaitable, Callable, Dict, Tuple
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+import metrics
+from config import ADMIN_CHAT_ID
+
+log = logging.getLogger(__name__)
+
+# ─────────────────────────── формат ───────────────────────────
+# callback_data = <версія><код дії>[.<арг>…], напр. «2bs.fukt.k0»:
+#   дата  → порядковий номер дня (date.toordinal) у base36;
+#   слот  → хвилини від півночі у base36 (не залежить від розкладу);
+#   uid   → base36.
+# Версію піднімаємо, коли змінюється формат, — тоді кнопки зі старих
+# повідомлень відхиляються, а не трактуються хибно.
+VERSION = "2"
+SEP = "."
+MAX_BYTES = 64  # ліміт Telegram на callback_data
+
+# ─── коди дій ────────────────────────────────────────────────
+MENU_BOOK      = "mb"
+MENU_MY        = "mm"
+MENU_CANCEL    = "mc"
+MENU_ADMIN     = "ma"
+MENU_HOME      = "mh"
+
+BOOK_DATE      = "bd"   # (дата)
+BOOK_SLOT      = "bs"   # (дата, слот)
+BOOK_CONFIRM   = "bc"
+BOOK_MONTH     = "bm"
+BOOK_WEEKLY    = "bw"
+BOOK_ABORT     = "bx"
+
+CANCEL_DATE    = "cd"   # (дата)
+CANCEL_SLOT    = "cs"   # (дата, слот)
+CANCEL_CONFIRM = "cc"
+CANCEL_ABORT   = "cx"
+
+CA_PICK_DATES  = "ad"
+CA_SELF        = "as"
+CA_PICK_USER   = "ap"
+CA_USER        = "au"   # (uid)
+CA_ALL         = "aa"
+CA_BACK        = "ab"
+CA_ABORT       = "ax"
+CA_RULES       = "ar"
+RULE_CANCEL    = "rc"   # (id правила)
+
+USER_BOOKINGS  = "ub"   # (uid)
+ADMIN_PAGE     = "ag"   # (сторінка, з дати | None, по дату | None)
+USER_PICKER    = "up"   # (режим, сторінка, пошуковий запит)
+
+
+class BadCallback(ValueError):
+    """callback_data не розібрано: чужий/застарілий формат або невірні аргументи."""
+
+
+# ──────────────────────── типи аргументів ─────────────────────
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _b36(n: int) -> str:
+    if n < 0:
+        return "-" + _b36(-n)
+    out = ""
+    while True:
+        n, r = divmod(n, 36)
+        out = _DIGITS[r] + out
+        if not n:
+            return out
+
+
+def _enc_date(date_str: str) -> str:
+    return _b36(date.fromisoformat(date_str).toordinal())
+
+
+def _dec_date(raw: str) -> str:
+    return date.fromordinal(int(raw, 36)).isoformat()
+
+
+def _enc_slot(time: str) -> str:
+    h, m = time.split(":")
+    return _b36(int(h) * 60 + int(m))
+
+
+def _dec_slot(raw: str) -> str:
+    minutes = int(raw, 36)
+    if not 0 <= minutes < 24 * 60:
+        raise ValueError(f"slot {minutes} out of range")
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _enc_int(n: int) -> str:
+    return _b36(int(n))
+
+
+def _dec_int(raw: str) -> int:
+    return int(raw, 36)
+
+
+def _enc_opt_date(date_str: str | None) -> str:
+    return _enc_date(date_str) if date_str else ""
+
+
+def _dec_opt_date(raw: str) -> str | None:
+    return _dec_date(raw) if raw else None
+
+
+def _enc_text(text: str) -> str:
+    # urlsafe base64 не містить SEP, тож довільний текст не ламає розбір
+    return base64.urlsafe_b64encode(text.encode()).decode().rstrip("=")
+
+
+def _dec_text(raw: str) -> str:
+    try:
+        return base64.urlsafe_b64decode(raw + "=" * (-len(raw) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(str(e)) from None
+
+
+_DATE = (_enc_date, _dec_date)
+_OPT_DATE = (_enc_opt_date, _dec_opt_date)
+_SLOT = (_enc_slot, _dec_slot)
+_UID = (_enc_int, _dec_int)
+_INT = (_enc_int, _dec_int)
+_TEXT = (_enc_text, _dec_text)
+
+# код дії → типи її аргументів
+_ARGS: Dict[str, tuple] = {
+    MENU_BOOK: (), MENU_MY: (), MENU_CANCEL: (), MENU_ADMIN: (), MENU_HOME: (),
+    BOOK_DATE: (_DATE,),
+    BOOK_SLOT: (_DATE, _SLOT),
+    BOOK_CONFIRM: (), BOOK_MONTH: (), BOOK_WEEKLY: (), BOOK_ABORT: (),
+    CANCEL_DATE: (_DATE,),
+    CANCEL_SLOT: (_DATE, _SLOT),
+    CANCEL_CONFIRM: (), CANCEL_ABORT: (),
+    CA_PICK_DATES: (), CA_SELF: (), CA_PICK_USER: (),
+    CA_USER: (_UID,),
+    CA_ALL: (), CA_BACK: (), CA_ABORT: (), CA_RULES: (),
+    RULE_CANCEL: (_INT,),
+    USER_BOOKINGS: (_UID,),
+    ADMIN_PAGE: (_INT, _OPT_DATE, _OPT_DATE),
+    USER_PICKER: (_INT, _INT, _TEXT),
+}
+
+
+# ───────────────────────── кодек ──────────────────────────────
+def encode(action: str, *args) -> str:
+    """Пакує дію та її аргументи в callback_data."""
+    kinds = _ARGS[action]
+    if len(args) != len(kinds):
+        raise TypeError(f"{action!r} expects {len(kinds)} args, got {len(args)}")
+    data = SEP.join([VERSION + action, *(enc(a) for (enc, _), a in zip(kinds, args))])
+    if len(data.encode()) > MAX_BYTES:
+        raise ValueError(f"callback_data too long: {data!r}")
+    return data
+
+
+def decode(data: str | None) -> Tuple[str, tuple]:
+    """
+    Розбирає callback_data на *(код дії, аргументи)*.
+    Будь-яка невідповідність формату — `BadCallback`.
+    """
+    if not data or not data.startswith(VERSION):
+        raise BadCallback(f"unknown version: {data!r}")
+    head, *raw = data[len(VERSION):].split(SEP)
+    kinds = _ARGS.get(head)
+    if kinds is None or len(raw) != len(kinds):
+        raise BadCallback(f"bad action: {data!r}")
+    try:
+        args = tuple(dec(r) for (_, dec), r in zip(kinds, raw))
+    except (ValueError, OverflowError) as e:
+        raise BadCallback(f"bad args in {data!r}: {e}") from None
+    return head, args
+
+
+# ──────────────────────── диспетчер ───────────────────────────
+Handler = Callable[..., Awaitable[None]]
+
+
+class CallbackRouter:
+    """
+    Єдина точка входу для всіх callback-кнопок: payload розбирається
+    один раз, обробник шукається в таблиці за кодом дії й отримує
+    вже розпаковані аргументи: `handler(update, context, *args)`.
+    """
+
+    def __init__(self):
+        self._routes: Dict[str, Tuple[Handler, bool]] = {}
+
+    def add(self, action: str, handler: Handler, *, admin_only: bool = False) -> None:
+        if action not in _ARGS:
+            raise KeyError(f"unknown callback action {action!r}")
+        self._routes[action] = (metrics.timed(handler), admin_only)
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        try:
+            action, args = decode(query.data)
+            handler, admin_only = self._routes[action]
+        except (BadCallback, KeyError) as e:
+            log.info("Відхилено callback від %s: %s", query.from_user.id, e)
+            metrics.CALLBACKS_REJECTED.inc()
+            await query.answer("Ця кнопка застаріла. Відкрийте меню ще раз: /start")
+            return
+
+        if admin_only and query.from_user.id != ADMIN_CHAT_ID:
+            await query.answer()
+            return
+
+        await query.answer()
+        await handler(update, context, *args)
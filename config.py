@@ -4,4 +4,88 @@ from dotenv import load_dotenv
 load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
-ADMIN_CHAT_ID = int(os.getenv("ADMIN_CHAT_ID"))
\ No newline at end of file
+ADMIN_CHAT_ID = int(os.getenv("ADMIN_CHAT_ID"))
+
+# ──────────── сховище бронювань ────────────
+# json — data.json / users.json, sqlite — одна БД SQLITE_PATH (див. migrate.py)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "bot.sqlite3")
+# 1 — зміни дописуються в журнал data.json.journal, 0 — повний перезапис data.json
+DATA_JOURNAL = os.getenv("DATA_JOURNAL", "1") == "1"
+# після скількох записів у журналі робити компактизацію (новий знімок data.json)
+JOURNAL_COMPACT_EVERY = int(os.getenv("JOURNAL_COMPACT_EVERY", "500"))
+# 1 — з тими самими файлами/БД працюють кілька процесів (репліки вебхука,
+# адмінські скрипти): зміни йдуть під файловим блокуванням *.lock (flock),
+# а кожен процес перечитує дані, щойно їх змінив інший
+SHARED_STORAGE = os.getenv("SHARED_STORAGE", "0") == "1"
+
+# розклад: слоти по днях тижня, місця, вихідні та винятки (див. schedule.py);
+# якщо файлу немає — щодня AVAILABLE_TIMES по одному місцю
+SCHEDULE_FILE = os.getenv("SCHEDULE_FILE", "schedule.json")
+
+# на скільки днів уперед розгортати безстрокові регулярні броні в загальних
+# списках (/adminbookings, вибір дати для скасування)
+RULE_HORIZON_DAYS = int(os.getenv("RULE_HORIZON_DAYS", "28"))
+
+# каталог архіву минулих бронювань (сегмент на місяць, gzip); порожньо — минулі
+# дати просто видаляються
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+
+# скільки апдейтів обробляти одночасно (0 — послідовно)
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "64"))
+
+# як часто (сек) скидати змінені профілі користувачів у users.json
+# і стан незавершених діалогів (sessions.jsonl / таблиця sessions)
+USERS_FLUSH_INTERVAL = int(os.getenv("USERS_FLUSH_INTERVAL", "30"))
+
+# через скільки секунд без активності незавершений вибір (дата/слоти)
+# скидається — і з пам'яті, і зі сховища; до того він переживає перезапуск
+SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))
+
+# потоки для дискових операцій сховища (щоб не блокувати event loop)
+STORAGE_IO_WORKERS = int(os.getenv("STORAGE_IO_WORKERS", "4"))
+
+# ──────────── розсилки ────────────
+NOTIFY_RATE = float(os.getenv("NOTIFY_RATE", "25"))                    # повідомлень/с на бота
+NOTIFY_PER_CHAT_INTERVAL = float(os.getenv("NOTIFY_PER_CHAT_INTERVAL", "1"))  # сек між повідомленнями в один чат
+NOTIFY_CONCURRENCY = int(os.getenv("NOTIFY_CONCURRENCY", "10"))
+NOTIFY_MAX_RETRIES = int(os.getenv("NOTIFY_MAX_RETRIES", "3"))
+
+# скільки броней показувати на одній сторінці /adminbookings
+ADMIN_PAGE_SLOTS = int(os.getenv("ADMIN_PAGE_SLOTS", "25"))
+
+# скільки користувачів на одній сторінці вибору (адмін)
+USER_PICKER_PAGE = int(os.getenv("USER_PICKER_PAGE", "8"))
+
+# скільки готових клавіатур/текстів тримати в кеші рендерингу
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "512"))
+
+# нагадування про заняття: за скільки хвилин до початку, через кому
+# (напр. "1440,60"); порожньо — вимкнено. Надсилає кожен процес бота,
+# тож із кількома репліками (SHARED_STORAGE) вмикайте лише в одній
+REMINDER_LEADS = tuple(
+    int(m) for m in os.getenv("REMINDER_LEADS", "1440,60").split(",") if m.strip()
+)
+# з SHARED_STORAGE: як часто (сек) звіряти купу нагадувань зі сховищем —
+# бронь, зроблена іншою реплікою, потрапить у купу не пізніше ніж за стільки
+REMINDER_SYNC_INTERVAL = int(os.getenv("REMINDER_SYNC_INTERVAL", "60"))
+
+# ──────────── отримання апдейтів ────────────
+# polling — бот сам опитує getUpdates; webhook — Telegram надсилає апдейти
+# POST-запитами на WEBHOOK_URL/WEBHOOK_PATH (вбудований HTTP-сервер)
+UPDATE_MODE = os.getenv("UPDATE_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")          # публічна адреса, напр. https://bot.example.com
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+# Telegram додає його в заголовок X-Telegram-Bot-Api-Secret-Token; запити без нього відхиляються
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# скільки одночасних HTTPS-з'єднань Telegram може відкрити (1–100)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+
+# ──────────── метрики ────────────
+# Prometheus-текст на http://METRICS_HOST:METRICS_PORT/metrics (0 — вимкнено)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+# як часто (сек) міряти затримку event loop (0 — не міряти)
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
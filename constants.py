@@ -1,3 +1,7 @@
+# слоти за замовчуванням, якщо немає SCHEDULE_FILE (див. schedule.py)
 AVAILABLE_TIMES = [
     f"{h:02d}:00" for h in range(9, 19) 
 ]
+
+# найдовший текст повідомлення, який приймає Telegram
+TEXT_LIMIT = 4096
@@ -8,108 +8,324 @@ from telegram import (
 )
 from telegram.ext import ContextTypes
 
-from booking import load_data
-from config import ADMIN_CHAT_ID
-from utils import format_date_label
+import aio
+import callbacks as cb
+import metrics
+import schedule
+from render_cache import render, stats as render_stats
+from config import ADMIN_CHAT_ID, ADMIN_PAGE_SLOTS
+from constants import TEXT_LIMIT
+from utils import date_label, month_label, parse_date_arg, parse_month_arg, rule_label
 
-from .users import load_users, get_user_display
+from .user_picker import MODE_VIEW, clip_query, picker
+from .users import get_user_display, users_version
 
 
 # ───────────────────────── /adminbookings ─────────────────────────
+_USAGE = (
+    "Використання: /adminbookings [з] [по]\n"
+    "Дати — 2025-08-06, 06.08.2025 або 06.08."
+)
+
+
 async def all_bookings_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
-    Виводить усі активні бронювання у зручному, згрупованому вигляді:
+    Виводить активні бронювання посторінково (◀ / ▶), згруповані за датою:
 
     📅 1 серпня 2025
       09:00 — John (@john)
       11:00 — Kate
 
-    📅 2 серпня 2025
-      10:00 — Alex
+    Необов'язкові аргументи `/adminbookings [з] [по]` обмежують діапазон дат.
     """
+    target = update.message or update.callback_query.message
     if update.effective_user.id != ADMIN_CHAT_ID:
-        await update.message.reply_text("⛔️ У вас немає прав для цієї команди.")
+        await target.reply_text("⛔️ У вас немає прав для цієї команди.")
         return
 
-    data = load_data()
-    if not data:
-        await update.message.reply_text("Немає активних бронювань.")
+    try:
+        bounds = [parse_date_arg(a) for a in (context.args or [])[:2]]
+    except ValueError:
+        await target.reply_text(_USAGE)
         return
+    start, end = (bounds + [None, None])[:2]
+
+    text, markup = await _admin_page(0, start, end)
+    await target.reply_text(text, reply_markup=markup)
+
+
+async def admin_bookings_page(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    page: int,
+    start: str | None,
+    end: str | None,
+):
+    """Перехід між сторінками /adminbookings."""
+    text, markup = await _admin_page(page, start, end)
+    await update.callback_query.edit_message_text(text, reply_markup=markup)
+
+
+def _paginate(counts: list[tuple[str, int]], limit: int) -> list[list[tuple[str, int, int]]]:
+    """
+    Ділить броні на сторінки до `limit` штук. Сторінка — список
+    *(дата, з, по)*: зріз броней дня в порядку часу. День не розривається,
+    якщо вміщається на сторінку; більший (групові слоти) — ріжеться по `limit`.
+    """
+    pages: list[list[tuple[str, int, int]]] = []
+    size = 0
+    for date_str, n in counts:
+        if not pages or (size and size + n > limit):
+            pages.append([])
+            size = 0
+        lo = 0
+        while n - lo > limit:
+            pages[-1].append((date_str, lo, lo + limit))
+            pages.append([])
+            lo += limit
+        pages[-1].append((date_str, lo, n))
+        size += n - lo
+    return pages
+
+
+def _clip(lines: list[str], limit: int = TEXT_LIMIT) -> str:
+    """Склеює рядки, не перевищуючи ліміт Telegram на довжину повідомлення."""
+    text = "\n".join(lines).rstrip()
+    if len(text) <= limit:
+        return text
+    tail = "\n… (скорочено)"
+    return text[: limit - len(tail)].rsplit("\n", 1)[0] + tail
+
+
+async def _admin_page(page: int, start: str | None, end: str | None):
+    key = (page, start, end, users_version())
+    return await render("admin_page", key, lambda: _build_admin_page(page, start, end))
+
 
-    # групуємо слоти за датою
-    grouped: dict[str, list[tuple[str, str]]] = defaultdict(list)
-    for date_str, slots in data.items():
-        for time, val in slots.items():
-            uid = val["id"] if isinstance(val, dict) else int(val)
-            grouped[date_str].append((time, get_user_display(uid)))
-
-    # формуємо текст
-    parts: list[str] = []
-    for date_str in sorted(grouped.keys()):
-        date_label = format_date_label(datetime.strptime(date_str, "%Y-%m-%d"))
-        parts.append(f"📅 {date_label}")
-        for time, user_disp in sorted(
-            grouped[date_str], key=lambda x: datetime.strptime(x[0], "%H:%M")
+async def _build_admin_page(page: int, start: str | None, end: str | None):
+    # межі сторінок рахуються лише з кількостей броней по днях;
+    # слоти та імена тягнемо тільки для видимої сторінки
+    counts = await aio.booked_counts(start, end)
+    pages = _paginate(counts, ADMIN_PAGE_SLOTS)
+    span = ""
+    if start or end:
+        span = f" ({date_label(start) if start else '…'} – {date_label(end) if end else '…'})"
+    if not pages:
+        return f"Немає активних бронювань{span}.", None
+
+    page = max(0, min(page, len(pages) - 1))  # кнопка могла застаріти
+    days = await aio.get_days(sorted({d for d, _, _ in pages[page]}))
+    total = sum(n for _, n in counts)
+
+    parts = [f"🗂 Бронювання{span}: {total}, стор. {page + 1}/{len(pages)}", ""]
+    for date_str, lo, hi in pages[page]:
+        parts.append(f"📅 {date_label(date_str)}" + (" (продовження)" if lo else ""))
+        offset = 0  # скільки броней дня вже пройшли
+        for time, seats in sorted(
+            days[date_str].items(), key=lambda x: datetime.strptime(x[0], "%H:%M")
         ):
-            parts.append(f"  {time} — {user_disp}")
+            shown = seats[max(lo - offset, 0): max(hi - offset, 0)]
+            offset += len(seats)
+            if not shown:
+                continue
+            names = ", ".join(get_user_display(uid) for uid in shown)
+            capacity = schedule.seats(date_str, time)
+            if capacity > 1:
+                names += f" ({len(seats)}/{capacity})"
+            parts.append(f"  {time} — {names}")
         parts.append("")  # порожній рядок між датами
 
-    target = update.message or update.callback_query.message
-    await target.reply_text("\n".join(parts).rstrip())
-
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("◀", callback_data=cb.encode(cb.ADMIN_PAGE, page - 1, start, end)))
+    if page < len(pages) - 1:
+        nav.append(InlineKeyboardButton("▶", callback_data=cb.encode(cb.ADMIN_PAGE, page + 1, start, end)))
+    return _clip(parts), InlineKeyboardMarkup([nav]) if nav else None
 
 
 # ───────────── /user_bookings  (quick picker) ────────────────
 async def user_bookings_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Показує список користувачів, у яких є бронювання."""
+    """
+    Посторінковий список користувачів, у яких є бронювання.
+    `/user_bookings <запит>` — пошук за початком імені або username.
+    """
     if update.effective_user.id != ADMIN_CHAT_ID:
         return
 
-    users = load_users()
-    keyboard = [
-        [
-            InlineKeyboardButton(
-                get_user_display(int(uid)),
-                callback_data=f"ub_{uid}",
-            )
-        ]
-        for uid in sorted(users.keys(), key=int)
-    ]
-
-    await update.message.reply_text(
-        "Оберіть користувача:",
-        reply_markup=InlineKeyboardMarkup(keyboard) if keyboard else None,
-    )
+    query = clip_query(" ".join(context.args or []))
+    text, markup = await picker(MODE_VIEW, 0, query)
+    await update.message.reply_text(text, reply_markup=markup)
 
 
 # ────── показ броней вибраного користувача (для адміна) ──────
-async def show_all_user_bookings(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def show_all_user_bookings(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, uid: int
+):
     """Відображає бронювання конкретного користувача у стилі /mybookings."""
     query = update.callback_query
     if not query or update.effective_user.id != ADMIN_CHAT_ID:
         return
 
-    await query.answer()
-    uid = int(query.data.split("_")[1])
-    data = load_data()
+    async def build():
+        grouped: dict[str, list[str]] = defaultdict(list)
+        for date, time in await aio.user_bookings(uid):
+            grouped[date].append(time)
 
-    grouped: dict[str, list[str]] = defaultdict(list)
-    for date, slots in data.items():
-        for time, val in slots.items():
-            booked_uid = val["id"] if isinstance(val, dict) else int(val)
-            if booked_uid == uid:
-                grouped[date].append(time)
-
-    if grouped:
         lines = [
-            f"📅 {format_date_label(datetime.strptime(date, '%Y-%m-%d'))}: "
+            f"📅 {date_label(date)}: "
             + ", ".join(sorted(times))
             for date, times in sorted(grouped.items())
         ]
-        text = "\n".join(lines)
-    else:
-        text = "Немає активних бронювань."
+        lines += [f"🔁 {rule_label(rule)}" for rule in await aio.user_rules(uid)]
+        if lines:
+            text = "\n".join(lines)
+        else:
+            text = "Немає активних бронювань."
+        return f"Бронювання {get_user_display(uid)}:\n{text}"
 
     await query.edit_message_text(
-        f"Бронювання {get_user_display(uid)}:\n{text}"
+        await render("user_bookings", (uid, users_version()), build)
+    )
+
+
+# ──────────────────────────── /history ────────────────────────────
+_HISTORY_USAGE = (
+    "Використання: /history [місяць] [ім'я]\n"
+    "Місяць — 2025-03 або 03.2025. Без аргументів — підсумки по місяцях."
+)
+_HISTORY_USERS = 5  # скільки знайдених за іменем користувачів показувати
+
+
+async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Архів минулих бронювань:
+      /history                 — броні й користувачі по місяцях;
+      /history 2025-03         — підсумок місяця (по годинах, найактивніші);
+      /history 2025-03 Іван    — броні знайдених користувачів за місяць.
+    Підсумки беруться із заголовків сегментів; дні розпаковуються лише
+    для сегментів, де шуканий користувач справді є.
+    """
+    if update.effective_user.id != ADMIN_CHAT_ID:
+        await update.message.reply_text("⛔️ У вас немає прав для цієї команди.")
+        return
+
+    args = context.args or []
+    if not args:
+        totals = await aio.archive_totals()
+        if not totals:
+            await update.message.reply_text("Архів порожній.")
+            return
+        lines = ["🗄 Архів бронювань по місяцях:"]
+        for month, slots, users in totals[-12:]:
+            lines.append(f"  {month_label(month)}: {slots} бронювань, {users} користувачів")
+        await update.message.reply_text("\n".join(lines))
+        return
+
+    try:
+        month = parse_month_arg(args[0])
+    except ValueError:
+        await update.message.reply_text(_HISTORY_USAGE)
+        return
+    head = await aio.archive_header(month)
+    if head is None:
+        await update.message.reply_text(f"За {month_label(month)} в архіві нічого немає.")
+        return
+
+    query = clip_query(" ".join(args[1:]))
+    if not query:
+        top = sorted(head["users"].items(), key=lambda kv: -kv[1])[:5]
+        lines = [
+            f"🗄 {month_label(month)}: {head['slots']} бронювань за {head['days']} днів, "
+            f"{len(head['users'])} користувачів",
+            "",
+            "По годинах:",
+            *(f"  {t} — {n}" for t, n in head["hours"].items()),
+            "",
+            "Найактивніші:",
+            *(f"  {get_user_display(int(uid))} — {n}" for uid, n in top),
+        ]
+        await update.message.reply_text("\n".join(lines))
+        return
+
+    uids = [uid for uid in await aio.search_users(query) if str(uid) in head["users"]]
+    if not uids:
+        await update.message.reply_text(
+            f"За {month_label(month)} немає бронювань користувачів «{query}»."
+        )
+        return
+    lines = []
+    for uid in uids[:_HISTORY_USERS]:
+        grouped: dict[str, list[str]] = defaultdict(list)
+        for date, time in await aio.archive_user(uid, month):
+            grouped[date].append(time)
+        lines.append(f"{get_user_display(uid)} — {month_label(month)}:")
+        lines.extend(
+            f"  📅 {date_label(date)}: " + ", ".join(times)
+            for date, times in sorted(grouped.items())
+        )
+        lines.append("")
+    if len(uids) > _HISTORY_USERS:
+        lines.append(f"…і ще {len(uids) - _HISTORY_USERS}. Уточніть запит.")
+    await update.message.reply_text("\n".join(lines).rstrip())
+
+
+# ───────────────────────────── /stats ─────────────────────────────
+def _kb(n: float) -> str:
+    return f"{n / 1024:.0f} КБ" if n < 1024 * 1024 else f"{n / 1024 / 1024:.1f} МБ"
+
+
+def _ms(seconds: float | None) -> str:
+    return "—" if seconds is None else f"{seconds * 1000:.0f} мс"
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Короткий підсумок метрик (повні — на METRICS_PORT у форматі Prometheus)."""
+    if update.effective_user.id != ADMIN_CHAT_ID:
+        await update.message.reply_text("⛔️ У вас немає прав для цієї команди.")
+        return
+
+    up = int(metrics.uptime())
+    lines = [f"📊 Статистика (аптайм {up // 3600} год {up % 3600 // 60} хв)"]
+
+    # обробники: кількість і найповільніші за p95
+    handled = metrics.HANDLER_SECONDS.values()
+    errors = metrics.HANDLER_ERRORS.values()
+    total = sum(sum(counts) for counts, _ in handled.values())
+    lines.append(f"\n⚙️ Апдейтів: {total}, помилок: {sum(errors.values()):g}")
+    slowest = sorted(
+        ((metrics.HANDLER_SECONDS.quantile(0.95, key), key[0], sum(counts))
+         for key, (counts, _) in handled.items()),
+        reverse=True,
+    )[:5]
+    for p95, name, count in slowest:
+        lines.append(f"  {name}: p95 {_ms(p95)} ({count})")
+
+    ops = {k[0]: v for k, v in metrics.STORAGE_OPS.values().items()}
+    size = {k[0]: v for k, v in metrics.STORAGE_BYTES.values().items()}
+    lines.append(
+        "\n💾 Сховище: "
+        f"читань {ops.get('read', 0):g} ({_kb(size.get('read', 0))}), "
+        f"перезаписів {ops.get('write', 0):g} ({_kb(size.get('write', 0))}), "
+        f"у журнал {ops.get('journal_append', 0):g} ({_kb(size.get('journal_append', 0))}), "
+        f"fsync {ops.get('fsync', 0):g}"
+    )
+    if ops.get("sqlite_commit") or ops.get("sqlite_load"):
+        lines.append(f"  SQLite: комітів {ops.get('sqlite_commit', 0):g}")
+
+    hits, misses = render_stats()
+    rate = hits / (hits + misses) * 100 if hits + misses else 0
+    lines.append(f"\n🧩 Кеш рендерингу: {rate:.0f}% влучань ({hits}/{hits + misses})")
+
+    sends = {k[0]: v for k, v in metrics.NOTIFY_SENDS.values().items()}
+    retries = sum(metrics.NOTIFY_RETRIES.values().values())
+    lines.append(
+        f"\n📨 Відправки: доставлено {sends.get('ok', 0):g}, "
+        f"відхилено {sends.get('rejected', 0):g}, помилок {sends.get('failed', 0):g}, "
+        f"повторів {retries:g}"
+    )
+
+    lines.append(
+        f"\n⏱ Затримка event loop: p50 {_ms(metrics.LOOP_LAG.quantile(0.5))}, "
+        f"p99 {_ms(metrics.LOOP_LAG.quantile(0.99))}"
     )
+    await update.message.reply_text("\n".join(lines))
@@ -8,6 +8,7 @@ from telegram import (
 )
 from telegram.ext import ContextTypes
 
+import callbacks as cb
 from config import ADMIN_CHAT_ID
 
 
@@ -17,14 +18,14 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     buttons = [
         [
-            InlineKeyboardButton("➕ Забронювати", callback_data="menu_book"),
-            InlineKeyboardButton("📋 Мої броні", callback_data="menu_my"),
+            InlineKeyboardButton("➕ Забронювати", callback_data=cb.encode(cb.MENU_BOOK)),
+            InlineKeyboardButton("📋 Мої броні", callback_data=cb.encode(cb.MENU_MY)),
         ],
-        [InlineKeyboardButton("❌ Скасувати", callback_data="menu_cancel")],
+        [InlineKeyboardButton("❌ Скасувати", callback_data=cb.encode(cb.MENU_CANCEL))],
     ]
 
     if user.id == ADMIN_CHAT_ID:
-        buttons.append([InlineKeyboardButton("🗂️ Усі броні", callback_data="menu_admin")])
+        buttons.append([InlineKeyboardButton("🗂️ Усі броні", callback_data=cb.encode(cb.MENU_ADMIN))])
 
     if update.callback_query:
         await update.callback_query.edit_message_text(
@@ -47,8 +48,10 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         " /mybookings – список моїх бронювань\n"
         " /cancel – меню скасування\n"
         "\nАдміну додаткові:\n"
-        " /adminbookings – усі броні\n"
-        " /user_bookings – броні користувача"
+        " /adminbookings [з] [по] – усі броні (посторінково)\n"
+        " /user_bookings [ім'я] – броні користувача (пошук)\n"
+        " /history [місяць] [ім'я] – архів минулих бронювань\n"
+        " /stats – статистика роботи"
     )
 
 
@@ -65,6 +68,8 @@ async def set_bot_commands(app):
         + [
             BotCommand("adminbookings", "Усі броні"),
             BotCommand("user_bookings", "Броні користувача"),
+            BotCommand("history", "Архів бронювань"),
+            BotCommand("stats", "Статистика роботи"),
         ],
         scope=BotCommandScopeChat(chat_id=ADMIN_CHAT_ID),
     )
@@ -1,112 +1,124 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes
-from datetime import datetime, timedelta
-from booking import is_slot_available, book_slot, load_data, save_data
-from constants import AVAILABLE_TIMES
-from utils import format_date_label
-from handlers.users import add_user_if_not_exists
+from datetime import datetime
+from itertools import groupby
+import aio
+import callbacks as cb
+import notify
+import schedule
+from render_cache import render
+from utils import date_label, rule_label
 from config import ADMIN_CHAT_ID
 
+MONTH_WEEKS = 4  # «на місяць» — 4 тижні поспіль
+
 
 async def start_booking(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    today = datetime.now().date()
+    text, markup = await render("book_dates", (today,), lambda: _build_date_menu(today))
+
+    # 👇 Виправлення: підтримка як message, так і callback_query
+    target = update.message or update.callback_query.message
+    await target.reply_text(text, reply_markup=markup)
+
+
+async def _build_date_menu(today) -> tuple:
     keyboard = []
-    today = datetime.now()
-    data = load_data()
-
-    for i in range(7):
-        day = today + timedelta(days=i)
-        date_str = day.strftime('%Y-%m-%d')
-        booked_slots = data.get(date_str, {})
-
-        available = [t for t in AVAILABLE_TIMES if t not in booked_slots]
-        if available:
-            keyboard.append([
-                InlineKeyboardButton(
-                    format_date_label(day),
-                    callback_data=f"date_{date_str}"
-                )
-            ])
+    # лише дні, де є вільні слоти (перевірка — по бітових масках сховища)
+    free = await aio.free_slots(today, 7)
+
+    for date_str in free:
+        keyboard.append([
+            InlineKeyboardButton(
+                date_label(date_str),
+                callback_data=cb.encode(cb.BOOK_DATE, date_str)
+            )
+        ])
 
     if not keyboard:
         text = "Наразі немає доступних дат для бронювання."
     else:
         text = "Оберіть дату:"
+    return text, InlineKeyboardMarkup(keyboard)
 
-    # 👇 Виправлення: підтримка як message, так і callback_query
-    target = update.message or update.callback_query.message
-    await target.reply_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
 
+# ───────────── callback'и (див. callbacks.CallbackRouter) ─────────────
+async def pick_date(update: Update, context: ContextTypes.DEFAULT_TYPE, date: str):
+    context.user_data["booking_date"] = date
+    context.user_data["booking_selected"] = set()
 
-async def handle_slot_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
+    await update.callback_query.edit_message_text(
+        f"Оберіть час на {date_label(date)}:",
+        reply_markup=await _time_keyboard(date, set()),
+    )
 
-    data = load_data()
-    user_id = query.from_user.id
-    text = ""
-    kb = []
 
-    if query.data.startswith("date_"):
-        date = query.data.split("_", 1)[1]
-        context.user_data["booking_date"] = date
-        context.user_data["booking_selected"] = set()
+async def toggle_slot(update: Update, context: ContextTypes.DEFAULT_TYPE, date: str, time: str):
+    selected = context.user_data.get("booking_selected", set())
 
-        kb = _build_time_keyboard(date, set())
-        text = f"Оберіть час на {format_date_label(datetime.strptime(date, '%Y-%m-%d'))}:"
+    if time in selected:
+        selected.remove(time)
+    else:
+        selected.add(time)
 
-    elif query.data.startswith("slot_"):
-        _, date, time = query.data.split("_")
-        selected = context.user_data.get("booking_selected", set())
+    context.user_data["booking_selected"] = selected
+    await update.callback_query.edit_message_text(
+        f"Обрано: {', '.join(sorted(selected)) or 'нічого'}",
+        reply_markup=await _time_keyboard(date, selected),
+    )
 
-        if time in selected:
-            selected.remove(time)
-        else:
-            selected.add(time)
 
-        context.user_data["booking_selected"] = selected
-        kb = _build_time_keyboard(date, selected)
-        text = f"Обрано: {', '.join(sorted(selected)) or 'нічого'}"
+async def confirm_booking(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await _finalize_booking(update.callback_query, context, weeks=1)
 
-    elif query.data == "confirm_booking":
-        await _finalize_booking(query, context, monthly=False)
-        return
-    elif query.data == "confirm_month":
-        await _finalize_booking(query, context, monthly=True)
-        return
-    elif query.data == "cancel_book":
-        context.user_data.pop("booking_date", None)
-        context.user_data.pop("booking_selected", None)
-        await query.edit_message_text("Бронювання скасовано.")
-        return
 
-    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb))
+async def confirm_month(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await _finalize_booking(update.callback_query, context, weeks=MONTH_WEEKS)
 
 
-def _build_time_keyboard(date: str, selected: set) -> list:
-    data = load_data()
-    booked = data.get(date, {})
-    buttons = []
+async def confirm_weekly(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await _finalize_booking(update.callback_query, context, weeks=None)
+
+
+async def abort_booking(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    context.user_data.pop("booking_date", None)
+    context.user_data.pop("booking_selected", None)
+    await update.callback_query.edit_message_text("Бронювання скасовано.")
+
+
+async def _time_keyboard(date: str, selected: set) -> InlineKeyboardMarkup:
+    async def build():
+        free = await aio.free_seats(date)
+        return InlineKeyboardMarkup(_build_time_keyboard(date, selected, free))
 
-    for time in AVAILABLE_TIMES:
-        if time in booked:
-            continue
+    return await render("time", (date, frozenset(selected)), build)
 
-        label = f"✅ {time}" if time in selected else time
-        buttons.append(InlineKeyboardButton(label, callback_data=f"slot_{date}_{time}"))
+
+def _build_time_keyboard(date: str, selected: set, free: dict) -> list:
+    buttons = []
+
+    # лише слоти, де за розкладом є вільні місця; у групових — скільки їх лишилось
+    for time, left in free.items():
+        label = f"{time} ·{left}" if schedule.seats(date, time) > 1 else time
+        if time in selected:
+            label = f"✅ {label}"
+        buttons.append(InlineKeyboardButton(label, callback_data=cb.encode(cb.BOOK_SLOT, date, time)))
 
     rows = [buttons[i:i + 4] for i in range(0, len(buttons), 4)]
 
     if selected:
         rows.append([
-            InlineKeyboardButton("✅ Лише цей день", callback_data="confirm_booking"),
-            InlineKeyboardButton("📅 На місяць", callback_data="confirm_month")
+            InlineKeyboardButton("✅ Лише цей день", callback_data=cb.encode(cb.BOOK_CONFIRM)),
+            InlineKeyboardButton("📅 На місяць", callback_data=cb.encode(cb.BOOK_MONTH)),
         ])
+        rows.append([InlineKeyboardButton("🔁 Щотижня", callback_data=cb.encode(cb.BOOK_WEEKLY))])
 
-    rows.append([InlineKeyboardButton("↩️ Скасувати", callback_data="cancel_book")])
+    rows.append([InlineKeyboardButton("↩️ Скасувати", callback_data=cb.encode(cb.BOOK_ABORT))])
     return rows
 
 
-async def _finalize_booking(query, context, monthly: bool):
+async def _finalize_booking(query, context, weeks: int | None):
+    """`weeks` = 1 — лише обраний день; інакше щотижнева бронь на `weeks` тижнів (None — безстроково)."""
     user = query.from_user
     date_str = context.user_data.get("booking_date")
     selected = context.user_data.get("booking_selected", set())
@@ -115,73 +127,63 @@ async def _finalize_booking(query, context, monthly: bool):
         await query.edit_message_text("Нічого не вибрано для бронювання.")
         return
 
-    add_user_if_not_exists(user.id, user.first_name, user.username)
-
-    date = datetime.strptime(date_str, "%Y-%m-%d")
-    date_times = [(date_str, time) for time in selected]
-
-    if monthly:
-        for i in range(1, 4):
-            d = date + timedelta(days=i * 7)
-            ds = d.strftime('%Y-%m-%d')
-            for time in selected:
-                date_times.append((ds, time))
-
-    booked, failed = _apply_bookings(date_times, user.id)
-
-    text_lines = []
-    if booked:
-        text_lines.append("✅ Заброньовано:")
-        for d, t in booked:
-            text_lines.append(f"{d} о {t}")
-
-    if failed:
-        text_lines.append("⚠️ Не вдалося забронювати:")
-        for d, t in failed:
-            text_lines.append(f"{d} о {t}")
+    await aio.add_user_if_not_exists(user.id, user.first_name, user.username)
+
+    if weeks == 1:
+        # одна транзакція на весь набір слотів
+        booked, failed = await aio.book_many([(date_str, t) for t in selected], user.id)
+        text_lines, booked_lines = [], [f"{d} о {t}" for d, t in booked]
+        if booked:
+            text_lines.append("✅ Заброньовано:")
+            text_lines += booked_lines
+        if failed:
+            text_lines.append("⚠️ Не вдалося забронювати:")
+            text_lines += [f"{d} о {t}" for d, t in failed]
+    else:
+        # регулярна бронь — одне правило на час, а не запис на кожну дату
+        results = await aio.add_rules(user.id, date_str, sorted(selected), weeks)
+        text_lines, booked_lines = [], []
+        for time, rule, conflicts in results:
+            if rule is None:
+                text_lines.append(f"⚠️ Не вдалося забронювати щотижня о {time}")
+                continue
+            booked_lines.append(f"🔁 {rule_label(rule)}")
+            if conflicts:
+                booked_lines[-1] += "\n   крім зайнятих: " + ", ".join(map(date_label, conflicts))
+        if booked_lines:
+            text_lines[:0] = ["✅ Заброньовано:", *booked_lines]
 
     await query.edit_message_text("\n".join(text_lines) or "Нічого не заброньовано.")
     context.user_data.pop("booking_date", None)
     context.user_data.pop("booking_selected", None)
 
-    if booked:
-        try:
-            await context.bot.send_message(
-                chat_id=ADMIN_CHAT_ID,
-                text=f"🆕 Нова бронь!\n👤 {user.first_name} (@{user.username})\n" +
-                     "\n".join(f"{d} о {t}" for d, t in booked)
-            )
-        except:
-            pass
-
-
-def _apply_bookings(date_times: list, user_id: int):
-    data = load_data()
-    booked = []
-    failed = []
-
-    for date, time in date_times:
-        if is_slot_available(date, time):
-            book_slot(date, time, user_id)
-            booked.append((date, time))
-        else:
-            failed.append((date, time))
-
-    return booked, failed
+    if booked_lines:
+        await notify.send(
+            context.bot,
+            ADMIN_CHAT_ID,
+            f"🆕 Нова бронь!\n👤 {user.first_name} (@{user.username})\n" +
+            "\n".join(booked_lines),
+        )
 
 
 async def show_user_bookings(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    data = load_data()
     user_id = update.effective_user.id
+    text = await render("my", (user_id,), lambda: _build_my_bookings(user_id))
+    target = update.message or update.callback_query.message
+    await target.reply_text(text)
+
+
+async def _build_my_bookings(user_id: int) -> str:
     bookings = []
 
-    for date, slots in data.items():
-        times = [t for t, val in slots.items() if int(val) == user_id]
-        if times:
-            formatted = f"📅 {format_date_label(datetime.strptime(date, '%Y-%m-%d'))}: " + ", ".join(times)
-            bookings.append(formatted)
+    # індекс уже відсортований за (дата, час) — лише групуємо
+    for date, pairs in groupby(await aio.user_bookings(user_id), key=lambda p: p[0]):
+        times = [t for _, t in pairs]
+        formatted = f"📅 {date_label(date)}: " + ", ".join(times)
+        bookings.append(formatted)
 
-    text = "\n".join(bookings) if bookings else "У вас немає активних бронювань."
-    target = update.message or update.callback_query.message
-    await target.reply_text(text)
+    # регулярні — окремо, правилом, а не переліком дат
+    bookings += [f"🔁 {rule_label(rule)}" for rule in await aio.user_rules(user_id)]
+
+    return "\n".join(bookings) if bookings else "У вас немає активних бронювань."
 
@@ -1,12 +1,15 @@
-from datetime import datetime
-from typing import Set
+from collections import defaultdict
+from typing import Dict, List, Set
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes
 
-from booking import cancel_slot, load_data
+import aio
+import callbacks as cb
+import notify
+from render_cache import render
 from config import ADMIN_CHAT_ID
-from utils import format_date_label
+from utils import date_label, rule_horizon
 
 from .users import get_user_display
 
@@ -20,53 +23,64 @@ def _build_cancel_keyboard(
     uid: int,
     is_admin: bool,
     selected: Set[str],
+    booked: dict,
 ) -> InlineKeyboardMarkup:
-    data = load_data()
     buttons = []
 
-    for t, val in data.get(date_str, {}).items():
-        booked_uid = val["id"] if isinstance(val, dict) else int(val)
-        if not is_admin and booked_uid != uid:
+    for t, seats in sorted(booked.items()):
+        if not is_admin and uid not in seats:
             continue
 
         label = f"✅ {t}" if t in selected else t
         buttons.append(
-            InlineKeyboardButton(label, callback_data=f"cslot_{date_str}_{t}")
+            InlineKeyboardButton(label, callback_data=cb.encode(cb.CANCEL_SLOT, date_str, t))
         )
 
     keyboard = [buttons[i : i + 4] for i in range(0, len(buttons), 4)]
     if selected:
         keyboard.append(
-            [InlineKeyboardButton("❌ Підтвердити", callback_data="confirm_cancel")]
+            [InlineKeyboardButton("❌ Підтвердити", callback_data=cb.encode(cb.CANCEL_CONFIRM))]
         )
-    keyboard.append([InlineKeyboardButton("↩️ Вийти", callback_data="cancel_cancel")])
+    keyboard.append([InlineKeyboardButton("↩️ Вийти", callback_data=cb.encode(cb.CANCEL_ABORT))])
 
     return InlineKeyboardMarkup(keyboard)
 
 
+async def _cancel_keyboard(
+    date_str: str,
+    uid: int,
+    is_admin: bool,
+    selected: Set[str],
+) -> InlineKeyboardMarkup:
+    async def build():
+        booked = await aio.get_day(date_str)
+        return _build_cancel_keyboard(date_str, uid, is_admin, selected, booked)
+
+    owner = None if is_admin else uid  # адмін бачить усі слоти дня
+    return await render("cancel", (date_str, owner, frozenset(selected)), build)
+
+
 # ─────────────────────── /cancel старт ───────────────────────
 async def start_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = update.effective_user.id
     is_admin = uid == ADMIN_CHAT_ID
-    data = load_data()
     keyboard = []
 
-    for date_str, slots in data.items():
-        if not is_admin and all(
-            (int(v.get("id", v)) if isinstance(v, dict) else int(v)) != uid
-            for v in slots.values()
-        ):
-            continue
+    if is_admin:
+        dates = await aio.booked_dates()
+    else:
+        dates = sorted({d for d, _ in await aio.user_bookings(uid, rule_horizon())})
 
+    for date_str in dates:
         try:
-            date_obj = datetime.strptime(date_str, "%Y-%m-%d")
+            label = date_label(date_str)
         except ValueError:
             continue
 
         keyboard.append(
             [
                 InlineKeyboardButton(
-                    format_date_label(date_obj), callback_data=f"cdate_{date_str}"
+                    label, callback_data=cb.encode(cb.CANCEL_DATE, date_str)
                 )
             ]
         )
@@ -81,102 +95,104 @@ async def start_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 # ───────────── обробка callback'ів скасування ────────────────
-async def handle_cancel_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
+# ── крок 1: обрано дату ───────────────────────────────────────
+async def pick_cancel_date(update: Update, context: ContextTypes.DEFAULT_TYPE, date_str: str):
+    uid = update.effective_user.id
+    context.user_data[DATE_KEY] = date_str
+    context.user_data[SEL_KEY] = set()
+
+    await update.callback_query.edit_message_text(
+        "Оберіть час (можна декілька):",
+        reply_markup=await _cancel_keyboard(date_str, uid, uid == ADMIN_CHAT_ID, set()),
+    )
+
+
+# ── крок 2: перемикаємо час ───────────────────────────────────
+async def toggle_cancel_slot(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, date_str: str, t: str
+):
+    uid = update.effective_user.id
+    selected: Set[str] = context.user_data.get(SEL_KEY, set())
+
+    if t in selected:
+        selected.remove(t)
+    else:
+        selected.add(t)
+    context.user_data[SEL_KEY] = selected
+
+    await update.callback_query.edit_message_reply_markup(
+        reply_markup=await _cancel_keyboard(date_str, uid, uid == ADMIN_CHAT_ID, selected)
+    )
+
+
+# ── крок 3: підтвердження ─────────────────────────────────────
+async def confirm_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    await query.answer()
-    cb = query.data
     uid = query.from_user.id
     is_admin = uid == ADMIN_CHAT_ID
+    date_str = context.user_data.get(DATE_KEY)
+    selected: Set[str] = context.user_data.get(SEL_KEY, set())
 
-    # ── крок 1: обрано дату ───────────────────────────────────
-    if cb.startswith("cdate_"):
-        date_str = cb.split("_")[1]
-        context.user_data[DATE_KEY] = date_str
-        context.user_data[SEL_KEY] = set()
-
-        await query.edit_message_text(
-            "Оберіть час (можна декілька):",
-            reply_markup=_build_cancel_keyboard(date_str, uid, is_admin, set()),
-        )
+    if not date_str or not selected:
+        await query.edit_message_text("Нічого не вибрано для скасування.")
         return
 
-    # ── крок 2: перемикаємо час ───────────────────────────────
-    if cb.startswith("cslot_"):
-        _, date_str, t = cb.split("_")
-        selected: Set[str] = context.user_data.get(SEL_KEY, set())
-
-        if t in selected:
-            selected.remove(t)
+    results = await aio.cancel_many(
+        [(date_str, t) for t in sorted(selected)], uid, is_admin=is_admin
+    )
+    cancelled, failed = [], []
+    for (_, t), owners in results.items():
+        if owners:
+            cancelled.extend((t, owner) for owner in owners)
         else:
-            selected.add(t)
-        context.user_data[SEL_KEY] = selected
+            failed.append(t)
+
+    # повідомлення ініціатору
+    msg = []
+    if cancelled:
+        times = ", ".join(sorted({t for t, _ in cancelled}))
+        msg.append(f"❌ Скасовано: {times}")
+    if failed:
+        msg.append(f"⚠️ Не вдалося: {', '.join(sorted(failed))}")
+    await query.edit_message_text("\n".join(msg) or "Операцію скасовано.")
+
+    # адміну деталі (одним повідомленням), а якщо адмін скасовує
+    # не свої броні — ще й кожному власнику
+    if cancelled:
+        by_user: Dict[int, List[str]] = defaultdict(list)
+        for t, cancelled_uid in sorted(cancelled):
+            by_user[cancelled_uid].append(t)
+
+        messages = [
+            (
+                ADMIN_CHAT_ID,
+                "❌ Скасовано бронювання!\n"
+                + "\n".join(
+                    f"👤 {get_user_display(cancelled_uid)}\n"
+                    f"📅 {date_str}  🕒 {', '.join(times)}"
+                    for cancelled_uid, times in by_user.items()
+                ),
+            )
+        ]
+        if is_admin:
+            messages += [
+                (
+                    cancelled_uid,
+                    f"⚠️ Ваше бронювання на {date_str} о {', '.join(times)} "
+                    "було скасовано адміністратором.",
+                )
+                for cancelled_uid, times in by_user.items()
+                if cancelled_uid != uid
+            ]
+        await notify.broadcast(context.bot, messages)
 
-        await query.edit_message_reply_markup(
-            reply_markup=_build_cancel_keyboard(date_str, uid, is_admin, selected)
-        )
-        return
+    # очищаємо
+    context.user_data.pop(DATE_KEY, None)
+    context.user_data.pop(SEL_KEY, None)
 
-    # ── крок 3: підтвердження ─────────────────────────────────
-    if cb == "confirm_cancel":
-        date_str = context.user_data.get(DATE_KEY)
-        selected: Set[str] = context.user_data.get(SEL_KEY, set())
-
-        if not date_str or not selected:
-            await query.edit_message_text("Нічого не вибрано для скасування.")
-            return
-
-        cancelled, failed = [], []
-        for t in selected:
-            res = cancel_slot(date_str, t, uid, is_admin=is_admin)
-            if res is not None:
-                cancelled.append((t, res))
-            else:
-                failed.append(t)
-
-        # повідомлення ініціатору
-        msg = []
-        if cancelled:
-            times = ", ".join(sorted(t for t, _ in cancelled))
-            msg.append(f"❌ Скасовано: {times}")
-        if failed:
-            msg.append(f"⚠️ Не вдалося: {', '.join(sorted(failed))}")
-        await query.edit_message_text("\n".join(msg) or "Операцію скасовано.")
-
-        # адміну деталі
-        if cancelled:
-            for t, cancelled_uid in cancelled:
-                try:
-                    await context.bot.send_message(
-                        chat_id=ADMIN_CHAT_ID,
-                        text=(
-                            "❌ Скасовано бронювання!\n"
-                            f"👤 {get_user_display(cancelled_uid)}\n"
-                            f"📅 {date_str}  🕒 {t}"
-                        ),
-                    )
-                except Exception:
-                    pass
-
-                # якщо адмін скасовує бронь не свою — сповіщаємо користувача
-                if is_admin and cancelled_uid != uid:
-                    try:
-                        await context.bot.send_message(
-                            chat_id=cancelled_uid,
-                            text=(
-                                f"⚠️ Ваше бронювання на {date_str} о {t} "
-                                "було скасовано адміністратором."
-                            ),
-                        )
-                    except Exception:
-                        pass
-
-        # очищаємо
-        context.user_data.pop(DATE_KEY, None)
-        context.user_data.pop(SEL_KEY, None)
-        return
 
-    # ── вихід без дії ─────────────────────────────────────────
-    if cb == "cancel_cancel":
-        await query.edit_message_text("Скасування перервано.")
-        context.user_data.pop(DATE_KEY, None)
-        context.user_data.pop(SEL_KEY, None)
+# ── вихід без дії ─────────────────────────────────────────────
+async def abort_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.callback_query.edit_message_text("Скасування перервано.")
+    context.user_data.pop(DATE_KEY, None)
+    context.user_data.pop(SEL_KEY, None)
@@ -1,24 +1,28 @@
-from datetime import datetime
 from collections import defaultdict
-from typing import List, Tuple, Dict, Set
+from typing import List, Tuple, Dict
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes
 
-from booking import load_data, save_data
+import aio
+import callbacks as cb
+import notify
+from recurrence import Rule
+from render_cache import render
 from config import ADMIN_CHAT_ID
-from utils import format_date_label
+from utils import date_label, rule_horizon, rule_label
 
+from .user_picker import MODE_CANCEL, picker
 from .users import get_user_display
 
 # ─── callback-константи ──────────────────────────────────────
-PICK_DATES         = "cancel_pick_dates"
-CONFIRM_SELF       = "confirm_cancel_all_self"
-PICK_USER          = "pick_cancel_user"
-CONFIRM_ALL_SYSTEM = "confirm_cancel_all_all"
-BACK_MAIN          = "back_cancel_all"
-CANCEL_ACTION      = "cancel_cancel_all"
-SEL_USER_PREFIX    = "cau_"          # cau_<uid>
+PICK_DATES         = cb.encode(cb.CA_PICK_DATES)
+CONFIRM_SELF       = cb.encode(cb.CA_SELF)
+PICK_USER          = cb.encode(cb.CA_PICK_USER)
+CONFIRM_ALL_SYSTEM = cb.encode(cb.CA_ALL)
+BACK_MAIN          = cb.encode(cb.CA_BACK)
+CANCEL_ACTION      = cb.encode(cb.CA_ABORT)
+PICK_RULES         = cb.encode(cb.CA_RULES)
 
 
 # ───────────────────── меню /cancel ─────────────────────────
@@ -29,6 +33,7 @@ async def start_cancel_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     kb = [
         [InlineKeyboardButton("📅 Скасувати обрані дати/час", callback_data=PICK_DATES)],
+        [InlineKeyboardButton("🔁 Регулярні броні", callback_data=PICK_RULES)],
         [InlineKeyboardButton("❌ Скасувати всі мої бронювання", callback_data=CONFIRM_SELF)],
     ]
     if is_admin:
@@ -51,182 +56,196 @@ async def start_cancel_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(text, reply_markup=InlineKeyboardMarkup(kb))
 
 
-# ───────────── callback-обробник меню ───────────────────────
-async def handle_cancel_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
+# ───────────── callback'и меню (див. callbacks.CallbackRouter) ─────────────
+# ---------- перейти до вибору дат/часу -----------------------
+async def pick_dates(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    await query.answer()
-    cb = query.data
     uid = query.from_user.id
-    is_admin = uid == ADMIN_CHAT_ID
-
-    # ---------- перейти до вибору дат/часу -------------------
-    if cb == PICK_DATES:
-        kb = _build_date_buttons(uid, is_admin)
-        if not kb:
-            await query.edit_message_text("Немає бронювань, які можна скасувати.")
-            return
-        kb.append([InlineKeyboardButton("↩️ Назад", callback_data=BACK_MAIN)])
-        await query.edit_message_text(
-            "Оберіть дату для скасування:",
-            reply_markup=InlineKeyboardMarkup(kb),
-        )
+    markup = await _date_markup(uid, uid == ADMIN_CHAT_ID)
+    if markup is None:
+        await query.edit_message_text("Немає бронювань, які можна скасувати.")
         return
+    await query.edit_message_text(
+        "Оберіть дату для скасування:",
+        reply_markup=markup,
+    )
+
+
+# ---------- вибір користувача (адмін) ------------------------
+async def pick_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    text, markup = await picker(MODE_CANCEL, 0)
+    await update.callback_query.edit_message_text(text, reply_markup=markup)
 
-    # ---------- вибір користувача (адмін) --------------------
-    if cb == PICK_USER and is_admin:
-        user_btns = _users_with_bookings_buttons()
-        if not user_btns:
-            await query.edit_message_text("Немає користувачів із активними бронюваннями.")
-            return
-        user_btns.append([InlineKeyboardButton("↩️ Назад", callback_data=BACK_MAIN)])
-        await query.edit_message_text(
-            "Оберіть користувача:",
-            reply_markup=InlineKeyboardMarkup(user_btns),
-        )
-        return
 
-    # ---------- адмін → скасувати всі броні конкретного юзера
-    if cb.startswith(SEL_USER_PREFIX) and is_admin:
-        target_uid = int(cb.split("_")[1])
-        cancelled = _cancel_for_user(target_uid)
-        text = (
-            f"❌ Скасовано всі бронювання користувача {get_user_display(target_uid)}:\n"
-            + _fmt_cancelled(cancelled)
-            if cancelled
-            else f"У користувача {get_user_display(target_uid)} немає активних бронювань."
+# ---------- адмін → скасувати всі броні конкретного юзера ----
+async def cancel_user(update: Update, context: ContextTypes.DEFAULT_TYPE, target_uid: int):
+    query = update.callback_query
+    cancelled, rules = await _cancel_for_user(target_uid)
+    text = (
+        f"❌ Скасовано всі бронювання користувача {get_user_display(target_uid)}:\n"
+        + _fmt_cancelled(cancelled, rules)
+        if cancelled or rules
+        else f"У користувача {get_user_display(target_uid)} немає активних бронювань."
+    )
+    await query.edit_message_text(text)
+    if cancelled or rules:  # сповіщення користувачу
+        await notify.send(
+            context.bot,
+            target_uid,
+            "⚠️ Ваші бронювання були скасовані адміністратором:\n"
+            + _fmt_cancelled(cancelled, rules),
         )
-        await query.edit_message_text(text)
-        if cancelled:  # сповіщення користувачу
-            try:
-                await context.bot.send_message(
-                    chat_id=target_uid,
-                    text=("⚠️ Ваші бронювання були скасовані адміністратором:\n"
-                          + _fmt_cancelled(cancelled)),
-                )
-            except Exception:
-                pass
-        return
 
-    # ---------- повернення до меню ---------------------------
-    if cb == BACK_MAIN:
-        await start_cancel_menu(update, context)
-        return
 
-    # ---------- звичайний користувач → скасувати ВСЕ ---------
-    if cb == CONFIRM_SELF:
-        cancelled = _cancel_for_user(uid)
-        msg = (
-            "❌ Скасовано:\n" + _fmt_cancelled(cancelled)
-            if cancelled
-            else "У вас не було активних бронювань."
+# ---------- звичайний користувач → скасувати ВСЕ -------------
+async def cancel_all_self(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    uid = query.from_user.id
+    cancelled, rules = await _cancel_for_user(uid)
+    msg = (
+        "❌ Скасовано:\n" + _fmt_cancelled(cancelled, rules)
+        if cancelled or rules
+        else "У вас не було активних бронювань."
+    )
+    await query.edit_message_text(msg)
+    if uid != ADMIN_CHAT_ID and (cancelled or rules):  # повідомити адміна
+        await notify.send(
+            context.bot,
+            ADMIN_CHAT_ID,
+            "❌ Користувач скасував всі свої бронювання\n"
+            f"👤 {get_user_display(uid)}\n"
+            + _fmt_cancelled(cancelled, rules),
         )
-        await query.edit_message_text(msg)
-        if not is_admin and cancelled:  # повідомити адміна
-            try:
-                await context.bot.send_message(
-                    chat_id=ADMIN_CHAT_ID,
-                    text=("❌ Користувач скасував всі свої бронювання\n"
-                          f"👤 {get_user_display(uid)}\n"
-                          + _fmt_cancelled(cancelled)),
-                )
-            except Exception:
-                pass
+
+
+# ---------- адмін → скасувати ВСЕ в системі ------------------
+async def cancel_all_system(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    cancelled_map, rules_map = await _cancel_all_system()
+    total = sum(len(v) for v in cancelled_map.values()) + sum(len(v) for v in rules_map.values())
+    if not total:
+        await query.edit_message_text("Не було активних бронювань.")
         return
 
-    # ---------- адмін → скасувати ВСЕ в системі --------------
-    if cb == CONFIRM_ALL_SYSTEM and is_admin:
-        cancelled_map = _cancel_all_system()
-        total = sum(len(v) for v in cancelled_map.values())
-        await query.edit_message_text(
-            f"🔥 Всі бронювання ({total}) успішно скасовано."
-            if total
-            else "Не було активних бронювань."
+    done = f"🔥 Всі бронювання ({total}) успішно скасовано."
+    targets = sorted(cancelled_map.keys() | rules_map.keys())
+    await query.edit_message_text(f"{done}\n📨 Сповіщаю {len(targets)} користувачів…")
+    report = await notify.broadcast(  # сповіщення кожному
+        context.bot,
+        (
+            (tgt_uid, "⚠️ Усі ваші бронювання були скасовані адміністратором:\n"
+                      + _fmt_cancelled(cancelled_map.get(tgt_uid, []), rules_map.get(tgt_uid, [])))
+            for tgt_uid in targets
+        ),
+    )
+    report_text = f"📨 Сповіщено: {report.delivered}"
+    if report.failed:
+        report_text += f", не доставлено: {len(report.failed)}"
+    await query.edit_message_text(f"{done}\n{report_text}")
+
+
+# ---------- регулярні броні: список і скасування -------------
+async def pick_rules(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    text, markup = await _rules_menu(query.from_user.id)
+    await query.edit_message_text(text, reply_markup=markup)
+
+
+async def cancel_rule(update: Update, context: ContextTypes.DEFAULT_TYPE, rule_id: int):
+    query = update.callback_query
+    uid = query.from_user.id
+    rules = await aio.cancel_rules(uid, rule_id=rule_id)
+    text, markup = await _rules_menu(uid)
+    if rules:
+        text = f"❌ Скасовано: {rule_label(rules[0])}\n\n{text}"
+    await query.edit_message_text(text, reply_markup=markup)
+    if rules and uid != ADMIN_CHAT_ID:  # повідомити адміна
+        await notify.send(
+            context.bot,
+            ADMIN_CHAT_ID,
+            "❌ Скасовано регулярну бронь\n"
+            f"👤 {get_user_display(uid)}\n"
+            f"🔁 {rule_label(rules[0])}",
         )
-        for tgt_uid, pairs in cancelled_map.items():  # сповіщення кожному
-            try:
-                await context.bot.send_message(
-                    chat_id=tgt_uid,
-                    text=("⚠️ Усі ваші бронювання були скасовані адміністратором:\n"
-                          + _fmt_cancelled(pairs)),
-                )
-            except Exception:
-                pass
-        return
 
-    # ---------- відміна дії ----------------------------------
-    if cb == CANCEL_ACTION:
-        await query.edit_message_text("Дію скасовано.")
-        return
+
+# ---------- відміна дії --------------------------------------
+async def abort_cancel_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.callback_query.edit_message_text("Дію скасовано.")
 
 
 # ───────────────────── helpers ─────────────────────
-def _build_date_buttons(uid: int, is_admin: bool) -> List[List[InlineKeyboardButton]]:
-    data = load_data()
+async def _build_date_buttons(uid: int, is_admin: bool) -> List[List[InlineKeyboardButton]]:
+    if is_admin:
+        dates = await aio.booked_dates()
+    else:
+        dates = sorted({d for d, _ in await aio.user_bookings(uid, rule_horizon())})
     keyboard = []
-    for date_str, slots in data.items():
-        if not is_admin and all(
-            (int(v.get("id", v)) if isinstance(v, dict) else int(v)) != uid
-            for v in slots.values()
-        ):
-            continue
+    for date_str in dates:
         try:
-            date_obj = datetime.strptime(date_str, "%Y-%m-%d")
+            label = date_label(date_str)
         except ValueError:
             continue
         keyboard.append(
-            [InlineKeyboardButton(format_date_label(date_obj), callback_data=f"cdate_{date_str}")]
+            [InlineKeyboardButton(label, callback_data=cb.encode(cb.CANCEL_DATE, date_str))]
         )
     return keyboard
 
 
-def _cancel_for_user(uid: int) -> List[Tuple[str, str]]:
-    data = load_data()
-    cancelled = []
-    for date, slots in list(data.items()):
-        for time, val in list(slots.items()):
-            booked_uid = val["id"] if isinstance(val, dict) else int(val)
-            if booked_uid == uid:
-                del data[date][time]
-                cancelled.append((date, time))
-        if not data.get(date):
-            data.pop(date, None)
-    if cancelled:
-        save_data(data)
-    return cancelled
-
-
-def _cancel_all_system() -> Dict[int, List[Tuple[str, str]]]:
-    data = load_data()
+async def _date_markup(uid: int, is_admin: bool) -> InlineKeyboardMarkup | None:
+    async def build():
+        kb = await _build_date_buttons(uid, is_admin)
+        if not kb:
+            return None
+        kb.append([InlineKeyboardButton("↩️ Назад", callback_data=BACK_MAIN)])
+        return InlineKeyboardMarkup(kb)
+
+    return await render("cancel_dates", (None if is_admin else uid,), build)
+
+
+async def _rules_menu(uid: int) -> Tuple[str, InlineKeyboardMarkup]:
+    async def build():
+        rules = await aio.user_rules(uid)
+        kb = [
+            [InlineKeyboardButton(f"❌ {rule_label(r)}", callback_data=cb.encode(cb.RULE_CANCEL, r.id))]
+            for r in rules
+        ]
+        kb.append([InlineKeyboardButton("↩️ Назад", callback_data=BACK_MAIN)])
+        text = "Оберіть регулярну бронь для скасування:" if rules else "У вас немає регулярних броней."
+        return text, InlineKeyboardMarkup(kb)
+
+    return await render("cancel_rules", (uid,), build)
+
+
+async def _cancel_for_user(uid: int) -> Tuple[List[Tuple[str, str]], List[Rule]]:
+    # скасовуємо «як власник», тож чужі броні не зачепить навіть адмін
+    results = await aio.cancel_many(await aio.user_bookings(uid), uid)
+    rules = await aio.cancel_rules(uid, user_id=uid)
+    return [pair for pair, owners in results.items() if owners], rules
+
+
+async def _cancel_all_system() -> Tuple[Dict[int, List[Tuple[str, str]]], Dict[int, List[Rule]]]:
+    data = await aio.load_data()
+    pairs = [(date, time) for date, slots in data.items() for time in slots]
+    # увесь слот, навіть якщо адмін сам у ньому записаний
+    results = await aio.cancel_many(pairs, ADMIN_CHAT_ID, is_admin=True, all_seats=True)
     cancelled_map: Dict[int, List[Tuple[str, str]]] = defaultdict(list)
-    for date, slots in data.items():
-        for time, val in slots.items():
-            uid = val["id"] if isinstance(val, dict) else int(val)
-            cancelled_map[uid].append((date, time))
-    if cancelled_map:
-        save_data({})
-    return cancelled_map
-
-
-def _fmt_cancelled(pairs: List[Tuple[str, str]]) -> str:
-    if not pairs:
-        return ""
+    for pair, owners in results.items():
+        for uid in owners:
+            cancelled_map[uid].append(pair)
+    rules_map: Dict[int, List[Rule]] = defaultdict(list)
+    for rule in await aio.cancel_rules(ADMIN_CHAT_ID, is_admin=True):
+        rules_map[rule.user_id].append(rule)
+    return cancelled_map, rules_map
+
+
+def _fmt_cancelled(pairs: List[Tuple[str, str]], rules: List[Rule] = ()) -> str:
     grouped: Dict[str, List[str]] = defaultdict(list)
     for d, t in pairs:
         grouped[d].append(t)
-    return "\n".join(
-        f"📅 {format_date_label(datetime.strptime(d, '%Y-%m-%d'))}: {', '.join(sorted(ts))}"
+    lines = [
+        f"📅 {date_label(d)}: {', '.join(sorted(ts))}"
         for d, ts in sorted(grouped.items())
-    )
-
-
-def _users_with_bookings_buttons() -> List[List[InlineKeyboardButton]]:
-    data = load_data()
-    uids: Set[int] = {
-        int(v["id"] if isinstance(v, dict) else v)
-        for slots in data.values()
-        for v in slots.values()
-    }
-    return [
-        [InlineKeyboardButton(get_user_display(uid), callback_data=f"{SEL_USER_PREFIX}{uid}")]
-        for uid in sorted(uids)
     ]
+    lines += [f"🔁 {rule_label(r)}" for r in rules]
+    return "\n".join(lines)
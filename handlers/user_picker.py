@@ -0,0 +1,95 @@
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.ext import ContextTypes
+
+import aio
+import callbacks as cb
+from config import USER_PICKER_PAGE
+from render_cache import render
+
+from .users import get_user_display, users_version
+
+# що робить кнопка з користувачем
+MODE_VIEW = 0     # показати його броні (/user_bookings)
+MODE_CANCEL = 1   # скасувати всі його броні (меню /cancel)
+_TARGETS = {MODE_VIEW: cb.USER_BOOKINGS, MODE_CANCEL: cb.CA_USER}
+
+# запит їде в callback_data (base64), а там лише 64 байти
+_MAX_QUERY_BYTES = 30
+
+
+def clip_query(text: str) -> str:
+    return text.strip().encode()[:_MAX_QUERY_BYTES].decode(errors="ignore")
+
+
+# ───────────────────────── побудова ─────────────────────────
+async def picker(mode: int, page: int, query: str = ""):
+    """*(текст, клавіатура)* сторінки вибору користувача."""
+    key = (mode, page, query, users_version())
+    return await render("user_picker", key, lambda: _build(mode, page, query))
+
+
+async def _build(mode: int, page: int, query: str):
+    size = USER_PICKER_PAGE
+    if query:
+        # пошук іде по відсортованому індексу імен, відбір — по індексу броней
+        matched = await aio.with_bookings(await aio.search_users(query))
+        total = len(matched)
+        page = max(0, min(page, (total - 1) // size))
+        uids = matched[page * size:(page + 1) * size]
+    else:
+        uids, total = await aio.users_page(page * size, size)
+        if not uids and total:  # кнопка застаріла — показуємо останню сторінку
+            page = (total - 1) // size
+            uids, total = await aio.users_page(page * size, size)
+
+    back = [InlineKeyboardButton("↩️ Назад", callback_data=cb.encode(cb.CA_BACK))]
+    if not total:
+        text = (
+            f"Нікого з бронюваннями не знайдено за «{query}»."
+            if query
+            else "Немає користувачів із активними бронюваннями."
+        )
+        return text, InlineKeyboardMarkup([back]) if mode == MODE_CANCEL else None
+
+    pages = (total - 1) // size + 1
+    text = "Оберіть користувача"
+    if query:
+        text += f" («{query}»)"
+    text += f" — {total}, стор. {page + 1}/{pages}:"
+    if not query and mode == MODE_VIEW:
+        text += "\nПошук: /user_bookings <ім'я або username>"
+
+    # імена — лише для тих, хто на сторінці
+    target = _TARGETS[mode]
+    rows = [
+        [InlineKeyboardButton(get_user_display(uid), callback_data=cb.encode(target, uid))]
+        for uid in uids
+    ]
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(
+            "◀", callback_data=cb.encode(cb.USER_PICKER, mode, page - 1, query)
+        ))
+    if page < pages - 1:
+        nav.append(InlineKeyboardButton(
+            "▶", callback_data=cb.encode(cb.USER_PICKER, mode, page + 1, query)
+        ))
+    if nav:
+        rows.append(nav)
+    if mode == MODE_CANCEL:
+        rows.append(back)
+    return text, InlineKeyboardMarkup(rows)
+
+
+# ───────────── callback (див. callbacks.CallbackRouter) ─────────────
+async def picker_page(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    mode: int,
+    page: int,
+    query: str,
+):
+    if mode not in _TARGETS:
+        return
+    text, markup = await picker(mode, page, query)
+    await update.callback_query.edit_message_text(text, reply_markup=markup)
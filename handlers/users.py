@@ -1,54 +1,213 @@
-import json
-import os
-from typing import Dict
+import threading
+from bisect import bisect_left
+from typing import Dict, List
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from storage import UserStore, open_user_store
 
 USERS_FILE = "users.json"
 
 
 # ────────────────────────── helpers ──────────────────────────
-def _read_json() -> Dict[str, dict]:
-    if not os.path.exists(USERS_FILE):
-        return {}
-    with open(USERS_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+def _format_display(user_id: int, user: dict | None) -> str:
+    if not user:
+        return f"ID: {user_id}"
+
+    first_name = user.get("first_name", "") or ""
+    username = user.get("username", "")
+    if username:
+        return f"{first_name} (@{username})".strip()
+    return first_name or f"ID: {user_id}"
+
+
+def _search_keys(user: dict) -> set[str]:
+    """Слова імені та username у нижньому регістрі — по них іде пошук за префіксом."""
+    words = (user.get("first_name") or "").casefold().split()
+    username = (user.get("username") or "").casefold().lstrip("@")
+    return {*words, username} - {""}
+
+
+# ─────────────────────── registry ────────────────────────────
+class UserRegistry:
+    """
+    Профілі користувачів у пам'яті процесу.
+
+    • Сховище (`users.json` або SQLite) читається один раз,
+      рядки для показу кешуються.
+    • Зміни лише позначають профілі «брудними»; у сховище вони пишуться
+      пакетно — періодичною задачею та під час зупинки бота (`flush`).
+    • Там же підхоплюються профілі, які записали інші процеси
+      (маркер сховища змінився) — тоді кеші показу скидаються.
+    """
+
+    def __init__(self, store: UserStore):
+        self._store = store
+        self._users: Dict[str, dict] | None = None
+        self._stamp = None
+        self._display: Dict[int, str] = {}
+        self._dirty: set[str] = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # один `flush` за раз; диск — без `_lock`
+        self.version = 0  # зростає, коли змінюється будь-який профіль
+        # відсортовані (ключ, user_id) для пошуку; перебудовуються ліниво
+        self._search: List[tuple[str, int]] = []
+        self._search_version = -1
+
+    def _ensure_loaded(self) -> Dict[str, dict]:
+        if self._users is None:
+            self._stamp = self._store.stamp()  # до читання: зміна між ними не загубиться
+            self._users = self._store.load()
+        return self._users
+
+    def all(self) -> Dict[str, dict]:
+        with self._lock:
+            return dict(self._ensure_loaded())
+
+    def upsert(self, user_id: int, first_name: str, username: str | None) -> None:
+        """Додає користувача або оновлює ім'я/username, якщо вони змінились."""
+        profile = {"first_name": first_name, "username": username}
+        with self._lock:
+            users = self._ensure_loaded()
+            uid = str(user_id)
+            if users.get(uid) == profile:
+                return
+            users[uid] = profile
+            self._display.pop(user_id, None)
+            self._dirty.add(uid)
+            self.version += 1
 
+    def refresh_if_known(self, user_id: int, first_name: str, username: str | None) -> None:
+        """Як `upsert`, але лише для вже відомих користувачів."""
+        with self._lock:
+            if str(user_id) not in self._ensure_loaded():
+                return
+        self.upsert(user_id, first_name, username)
 
-def _write_json(data: dict) -> None:
-    with open(USERS_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    def display(self, user_id: int) -> str:
+        cached = self._display.get(user_id)
+        if cached is not None:
+            return cached
+        with self._lock:
+            text = _format_display(user_id, self._ensure_loaded().get(str(user_id)))
+            self._display[user_id] = text
+        return text
+
+    def search(self, prefix: str) -> List[int]:
+        """id користувачів, чиє ім'я (будь-яке слово) або username починається з `prefix`."""
+        prefix = prefix.casefold().lstrip("@")
+        if not prefix:
+            return []
+        with self._lock:
+            users = self._ensure_loaded()
+            if self._search_version != self.version:
+                self._search = sorted(
+                    (key, int(uid)) for uid, user in users.items() for key in _search_keys(user)
+                )
+                self._search_version = self.version
+            index = self._search
+        found = set()
+        i = bisect_left(index, (prefix,))
+        while i < len(index) and index[i][0].startswith(prefix):
+            found.add(index[i][1])
+            i += 1
+        return sorted(found)
+
+    def replace(self, data: dict) -> None:
+        with self._lock:
+            old = self._ensure_loaded()
+            self._users = dict(data)
+            self._display.clear()
+            self._dirty |= set(old) | set(self._users)
+            self.version += 1
+
+    def flush(self) -> bool:
+        """
+        Записує зміни у сховище і перечитує його, якщо профілі змінював
+        інший процес. Повертає *True*, якщо було що писати.
+
+        `_lock` тримається лише на час копіювання та злиття: `display()` і
+        `refresh_if_known()` викликаються прямо з event loop, тож запис на
+        диск (і flock зі SHARED_STORAGE) не має їх зупиняти. Профілі, змінені
+        під час запису, лишаються «брудними» до наступного `flush`.
+        """
+        with self._flush_lock, self._store.lock():
+            with self._lock:
+                if self._users is None:
+                    return False
+                users, dirty = dict(self._users), self._dirty
+                self._dirty = set()
+            try:
+                foreign = self._store.stamp() != self._stamp
+                if dirty:
+                    self._store.save(users, dirty)
+                loaded = self._store.load() if foreign else None
+                stamp = self._store.stamp()
+            except BaseException:
+                with self._lock:
+                    self._dirty |= dirty
+                raise
+            with self._lock:
+                if loaded is not None:
+                    for uid in self._dirty:  # свіжіші за прочитане — наші
+                        if uid in self._users:
+                            loaded[uid] = self._users[uid]
+                        else:
+                            loaded.pop(uid, None)
+                    self._users = loaded
+                    self._display.clear()
+                    self.version += 1
+                self._stamp = stamp
+        return bool(dirty)
+
+
+_registry = UserRegistry(open_user_store(USERS_FILE))
 
 
 # ─────────────────────── public interface ────────────────────
 def load_users() -> Dict[str, dict]:
-    return _read_json()
+    return _registry.all()
 
 
 def save_users(data: dict) -> None:
-    _write_json(data)
+    _registry.replace(data)
+    _registry.flush()
 
 
 def add_user_if_not_exists(user_id: int, first_name: str, username: str | None):
-    users = load_users()
-    uid = str(user_id)
+    """Реєструє користувача (або оновлює його ім'я); запис на диск — відкладений."""
+    _registry.upsert(user_id, first_name, username)
+
+
+def flush_users() -> bool:
+    return _registry.flush()
+
+
+def search_users(prefix: str) -> List[int]:
+    """Пошук за префіксом імені або username (без урахування регістру)."""
+    return _registry.search(prefix)
 
-    if uid not in users:
-        users[uid] = {"first_name": first_name, "username": username}
-        save_users(users)
+
+def users_version() -> int:
+    """Змінюється разом з будь-яким профілем — для кешів, що показують імена."""
+    return _registry.version
 
 
 def get_user_display(user_id: int) -> str:
     """
     Повертає зручний рядок для відображення користувача:
-    • «Ім’я (@username)»  
-    • або «Ім’я»  
+    • «Ім’я (@username)»
+    • або «Ім’я»
     • або «ID: 123»
     """
-    user = load_users().get(str(user_id))
-    if not user:
-        return f"ID: {user_id}"
+    return _registry.display(user_id)
+
+
+# ──────────────────── інтеграція з ботом ─────────────────────
+async def track_known_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Оновлює кешований профіль, якщо відомий користувач змінив ім'я/username."""
+    user = update.effective_user
+    if user:
+        _registry.refresh_if_known(user.id, user.first_name, user.username)
 
-    first_name = user.get("first_name", "")
-    username = user.get("username", "")
-    if username:
-        return f"{first_name} (@{username})".strip()
-    return first_name or f"ID: {user_id}"
@@ -0,0 +1,260 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+log = logging.getLogger(__name__)
+
+_START = time.time()
+
+
+# ────────────────────────── метрики ──────────────────────────
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()  # сховище оновлює метрики з пулу потоків
+        _REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _fmt_labels(self, key: tuple, extra: str = "") -> str:
+        parts = [f'{n}="{v}"' for n, v in zip(self.labelnames, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self) -> Dict[tuple, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        for key, value in sorted(self.values().items()):
+            yield f"{self.name}{self._fmt_labels(key)} {value:g}"
+
+
+class CounterFunc(_Metric):
+    """Лічильник, значення якого веде хтось інший (напр. кеш рендерингу)."""
+
+    type = "counter"
+
+    def __init__(self, name, help, fn: Callable[[], float]):
+        super().__init__(name, help)
+        self.fn = fn
+
+    def samples(self):
+        yield f"{self.name} {self.fn():g}"
+
+
+class Histogram(_Metric):
+    type = "histogram"
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # ключ → [лічильники по кошиках (+Inf останній), сума]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][i] += 1
+            entry[1] += value
+
+    def values(self) -> Dict[tuple, tuple]:
+        with self._lock:
+            return {k: (list(counts), total) for k, (counts, total) in self._values.items()}
+
+    def quantile(self, q: float, key: tuple = ()) -> float | None:
+        """Оцінка квантиля за кошиками (як `histogram_quantile` у Prometheus)."""
+        entry = self.values().get(key)
+        if entry is None:
+            return None
+        counts = entry[0]
+        total = sum(counts)
+        if not total:
+            return None
+        rank, seen = q * total, 0
+        for i, c in enumerate(counts):
+            if seen + c >= rank and c:
+                if i == len(self.buckets):
+                    return self.buckets[-1]  # у +Inf — краще сказати «не менше»
+                lo = self.buckets[i - 1] if i else 0.0
+                return lo + (self.buckets[i] - lo) * (rank - seen) / c
+            seen += c
+        return self.buckets[-1]
+
+    def samples(self):
+        for key, (counts, total) in sorted(self.values().items()):
+            acc = 0
+            for le, c in zip((*self.buckets, "+Inf"), counts):
+                acc += c
+                le_label = f'le="{le}"'
+                yield f"{self.name}_bucket{self._fmt_labels(key, le_label)} {acc}"
+            yield f"{self.name}_sum{self._fmt_labels(key)} {total:g}"
+            yield f"{self.name}_count{self._fmt_labels(key)} {acc}"
+
+
+_REGISTRY: List[_Metric] = []
+
+# ─── метрики бота ───────────────────────────────────────────
+HANDLER_SECONDS = Histogram(
+    "tgbot_handler_seconds", "Час обробки апдейту обробником", ("handler",)
+)
+HANDLER_ERRORS = Counter(
+    "tgbot_handler_errors_total", "Винятки в обробниках", ("handler",)
+)
+STORAGE_OPS = Counter(
+    "tgbot_storage_ops_total",
+    "Операції сховища (read, write, journal_*, fsync, sqlite_*, archive_*, reload)",
+    ("op",),
+)
+STORAGE_BYTES = Counter(
+    "tgbot_storage_bytes_total", "Байти, прочитані/записані сховищем", ("op",)
+)
+CALLBACKS_REJECTED = Counter(
+    "tgbot_callbacks_rejected_total", "Відхилені (застарілі/пошкоджені) callback-кнопки"
+)
+NOTIFY_SENDS = Counter(
+    "tgbot_notify_sends_total", "Відправлені повідомлення за результатом", ("result",)
+)
+NOTIFY_RETRIES = Counter(
+    "tgbot_notify_retries_total", "Повтори відправок за причиною", ("reason",)
+)
+STORAGE_LOCK_WAIT = Histogram(
+    "tgbot_storage_lock_wait_seconds",
+    "Очікування міжпроцесного блокування сховища (SHARED_STORAGE)",
+)
+SESSIONS_EXPIRED = Counter(
+    "tgbot_sessions_expired_total", "Незавершені діалоги, скинуті за SESSION_TTL"
+)
+REMINDERS_SENT = Counter(
+    "tgbot_reminders_sent_total", "Доставлені нагадування про заняття"
+)
+PURGED_SLOTS = Counter(
+    "tgbot_purged_slots_total", "Броні на минулі дати, перенесені нічним завданням в архів"
+)
+LOOP_LAG = Histogram(
+    "tgbot_event_loop_lag_seconds",
+    "Наскільки пізніше запланованого прокидається event loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+CounterFunc("tgbot_uptime_seconds", "Час роботи процесу", lambda: time.time() - _START)
+
+
+def render() -> str:
+    """Усі метрики у текстовому форматі Prometheus."""
+    lines = []
+    for metric in _REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def uptime() -> float:
+    return time.time() - _START
+
+
+# ──────────────────────── інструментація ──────────────────────
+def timed(handler, name: str | None = None):
+    """Обгортка обробника: латентність і винятки під іменем `name`."""
+    name = name or handler.__name__
+
+    @functools.wraps(handler)
+    async def wrapper(update, context, *args):
+        start = time.perf_counter()
+        try:
+            return await handler(update, context, *args)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - start, handler=name)
+
+    return wrapper
+
+
+async def _watch_loop_lag(interval: float) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, loop.time() - start - interval))
+
+
+# ───────────────────────── HTTP-експорт ───────────────────────
+async def _serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request = await asyncio.wait_for(reader.readline(), timeout=5)
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass  # заголовки не потрібні
+        parts = request.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] in ("/", "/metrics"):
+            status, body = "200 OK", render().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass  # клієнт пішов або мовчить — нічого відповідати
+    finally:
+        writer.close()
+
+
+_server: asyncio.AbstractServer | None = None
+_lag_task: asyncio.Task | None = None
+
+
+async def start(host: str, port: int, lag_interval: float) -> None:
+    """Запускає HTTP-експорт (якщо `port`) і моніторинг затримки event loop."""
+    global _server, _lag_task
+    if lag_interval > 0:
+        _lag_task = asyncio.create_task(_watch_loop_lag(lag_interval))
+    if port:
+        _server = await asyncio.start_server(_serve, host, port)
+        log.info("Метрики: http://%s:%d/metrics", host, port)
+
+
+async def stop() -> None:
+    global _server, _lag_task
+    if _lag_task is not None:
+        _lag_task.cancel()
+        _lag_task = None
+    if _server is not None:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
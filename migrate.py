@@ -0,0 +1,49 @@
+"""
+Переносить наявні `data.json` (+ журнал), `rules.json` і `users.json` у SQLite.
+
+    python migrate.py [--data data.json] [--rules rules.json] [--users users.json] [--db bot.sqlite3]
+
+Після міграції встановіть `STORAGE_BACKEND=sqlite` (і `SQLITE_PATH`,
+якщо БД лежить не за замовчуванням). Повторний запуск перезаписує
+бронювання в БД і оновлює профілі — дані з JSON не видаляються.
+"""
+import argparse
+
+from config import SQLITE_PATH
+from storage import (
+    JsonBookingStore,
+    JsonRuleStore,
+    JsonUserStore,
+    SqliteBookingStore,
+    SqliteRuleStore,
+    SqliteUserStore,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Міграція JSON → SQLite")
+    parser.add_argument("--data", default="data.json")
+    parser.add_argument("--rules", default="rules.json")
+    parser.add_argument("--users", default="users.json")
+    parser.add_argument("--db", default=SQLITE_PATH)
+    args = parser.parse_args()
+
+    data = JsonBookingStore(args.data).load()  # уже *{дата: {час: [user_id]}}*
+    SqliteBookingStore(args.db).replace(data)
+
+    source = JsonRuleStore(args.rules)
+    rules = source.load()
+    SqliteRuleStore(args.db).save(rules, set(rules), source.last_id())
+
+    users = JsonUserStore(args.users).load()
+    SqliteUserStore(args.db).save(users, set(users))
+
+    total = sum(len(seats) for slots in data.values() for seats in slots.values())
+    print(
+        f"✅ Перенесено {total} бронювань, {len(rules)} регулярних броней "
+        f"і {len(users)} користувачів у {args.db}"
+    )
+
+
+if __name__ == "__main__":
+    main()
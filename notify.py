@@ -0,0 +1,174 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Tuple
+
+from telegram.error import (
+    BadRequest,
+    ChatMigrated,
+    Forbidden,
+    NetworkError,
+    RetryAfter,
+    TelegramError,
+)
+
+from config import (
+    NOTIFY_CONCURRENCY,
+    NOTIFY_MAX_RETRIES,
+    NOTIFY_PER_CHAT_INTERVAL,
+    NOTIFY_RATE,
+)
+from metrics import NOTIFY_RETRIES, NOTIFY_SENDS
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class BroadcastReport:
+    delivered: int = 0
+    failed: List[int] = field(default_factory=list)  # chat_id, куди не дійшло
+
+
+# ────────────────────────── helpers ──────────────────────────
+class _RateLimiter:
+    """Рівномірно розподіляє відправки: не частіше `rate` на секунду."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+
+    async def wait(self) -> None:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next)
+        self._next = slot + self.interval  # резервуємо слот без await — атомарно
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause(self, seconds: float) -> None:
+        """Після flood-wait Telegram блокує весь бот — зсуваємо всі слоти."""
+        loop = asyncio.get_running_loop()
+        self._next = max(self._next, loop.time() + seconds)
+
+
+# ───────────────────────── dispatcher ────────────────────────
+class Notifier:
+    """
+    Відправка повідомлень у межах лімітів Telegram:
+
+    • загальний ліміт `rate` повідомлень/с і не частіше одного
+      повідомлення в чат за `per_chat_interval` секунд;
+    • `RetryAfter` — чекаємо, скільки просить Telegram, і пробуємо знову;
+    • `ChatMigrated` — пробуємо в новий id чату;
+    • тимчасові мережеві помилки — повтор з експоненційною затримкою;
+    • усі повтори разом — не більше `max_retries`, далі повідомлення
+      вважається недоставленим;
+    • `Forbidden` / `BadRequest` (бот заблоковано, чат не існує) — без повторів.
+
+    Потрібен лише об'єкт із `async send_message(chat_id, text, ...)`,
+    тож у тестах підходить будь-який фейковий бот.
+    """
+
+    def __init__(
+        self,
+        bot,
+        *,
+        rate: float = NOTIFY_RATE,
+        per_chat_interval: float = NOTIFY_PER_CHAT_INTERVAL,
+        concurrency: int = NOTIFY_CONCURRENCY,
+        max_retries: int = NOTIFY_MAX_RETRIES,
+        backoff: float = 0.5,
+    ):
+        self.bot = bot
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._limiter = _RateLimiter(rate)
+        self._chat_next: Dict[int, float] = {}
+        self._concurrency = asyncio.Semaphore(concurrency)
+
+    async def _chat_slot(self, chat_id: int) -> None:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if len(self._chat_next) > 10_000:  # не тримаємо давно неактивні чати
+            self._chat_next = {c: t for c, t in self._chat_next.items() if t > now}
+        slot = max(now, self._chat_next.get(chat_id, 0.0))
+        self._chat_next[chat_id] = slot + self.per_chat_interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def send(self, chat_id: int, text: str, **kwargs) -> bool:
+        """Надсилає одне повідомлення. *True* — доставлено."""
+        attempt = 0
+        while True:
+            # черга до свого чату й паузи між повторами — поза семафором:
+            # серія повідомлень в один чат не займає місць іншим чатам
+            await self._chat_slot(chat_id)
+            delay = 0.0
+            async with self._concurrency:
+                await self._limiter.wait()
+                try:
+                    await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                    NOTIFY_SENDS.inc(result="ok")
+                    return True
+                except RetryAfter as e:
+                    reason, error = "retry_after", e
+                    delay = float(e.retry_after)
+                    self._limiter.pause(delay)
+                except ChatMigrated as e:
+                    reason, error = "migrated", e
+                    chat_id = e.new_chat_id
+                except (Forbidden, BadRequest) as e:
+                    log.warning("Не доставлено в %s: %s", chat_id, e)
+                    NOTIFY_SENDS.inc(result="rejected")
+                    return False
+                except NetworkError as e:  # у т.ч. TimedOut
+                    reason, error = "network", e
+                    delay = self.backoff * 2**attempt
+                except TelegramError as e:
+                    log.warning("Не доставлено в %s: %s", chat_id, e)
+                    NOTIFY_SENDS.inc(result="failed")
+                    return False
+            # будь-який повтор (і RetryAfter, і міграція) рахується до ліміту:
+            # один чат, що відповідає так без кінця, не крутиться вічно
+            attempt += 1
+            if attempt > self.max_retries:
+                log.warning("Не доставлено в %s після %d спроб: %s", chat_id, attempt, error)
+                NOTIFY_SENDS.inc(result="failed")
+                return False
+            NOTIFY_RETRIES.inc(reason=reason)
+            if delay:
+                await asyncio.sleep(delay)
+
+    async def broadcast(self, messages: Iterable[Tuple[int, str]]) -> BroadcastReport:
+        """Розсилає *(chat_id, текст)* паралельно; повертає підсумок."""
+        messages = list(messages)
+        results = await asyncio.gather(
+            *(self.send(chat_id, text) for chat_id, text in messages)
+        )
+        report = BroadcastReport()
+        for (chat_id, _), ok in zip(messages, results):
+            if ok:
+                report.delivered += 1
+            else:
+                report.failed.append(chat_id)
+        return report
+
+
+# один диспетчер на бота, щоб усі відправки ділили спільні ліміти
+_notifiers: Dict[int, Notifier] = {}
+
+
+def get_notifier(bot) -> Notifier:
+    notifier = _notifiers.get(id(bot))
+    if notifier is None or notifier.bot is not bot:
+        notifier = _notifiers[id(bot)] = Notifier(bot)
+    return notifier
+
+
+async def send(bot, chat_id: int, text: str, **kwargs) -> bool:
+    return await get_notifier(bot).send(chat_id, text, **kwargs)
+
+
+async def broadcast(bot, messages: Iterable[Tuple[int, str]]) -> BroadcastReport:
+    return await get_notifier(bot).broadcast(messages)
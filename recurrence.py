@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+from datetime import date
+from typing import Dict, Iterator, List, NamedTuple
+
+import schedule
+from schedule import SLOT_BITS
+
+
+# ─────────────────────────── правило ───────────────────────────
+class Rule(NamedTuple):
+    """
+    Щотижнева бронь: `user_id` на `time` кожні 7 днів від `first` до `last`
+    включно (*None* — безстроково), крім днів `skip`. Дні — ordinal дат.
+    """
+
+    id: int
+    user_id: int
+    time: str
+    first: int
+    last: int | None
+    skip: frozenset = frozenset()
+
+    @property
+    def weekday(self) -> int:
+        return (self.first + 6) % 7  # як date.weekday()
+
+    def occurs(self, ordinal: int) -> bool:
+        """Чи припадає бронь на день, і слот того дня відкритий за розкладом — O(1)."""
+        return (
+            self.first <= ordinal
+            and (self.last is None or ordinal <= self.last)
+            and (ordinal - self.first) % 7 == 0
+            and ordinal not in self.skip
+            and self.time in schedule.plan_for_ordinal(ordinal).seats
+        )
+
+    def occurrences(self, lo: int, hi: int) -> Iterator[int]:
+        """Дні броні з `[lo, hi)`, де слот відкритий за розкладом."""
+        start = max(lo, self.first)
+        start += (self.first - start) % 7
+        end = hi if self.last is None else min(hi, self.last + 1)
+        for o in range(start, end, 7):
+            if o not in self.skip and self.time in schedule.plan_for_ordinal(o).seats:
+                yield o
+
+    def overlaps(self, other: "Rule") -> bool:
+        """Чи є в двох правил (той самий день тижня) спільні тижні."""
+        return (self.last is None or other.first <= self.last) and (
+            other.last is None or self.first <= other.last
+        )
+
+    # ---------- запис у сховище ----------
+    def record(self) -> dict:
+        iso = lambda o: date.fromordinal(o).isoformat()
+        return {
+            "u": self.user_id,
+            "t": self.time,
+            "from": iso(self.first),
+            "to": iso(self.last) if self.last is not None else None,
+            "skip": sorted(iso(o) for o in self.skip),
+        }
+
+    @classmethod
+    def from_record(cls, rule_id: int, rec: dict) -> "Rule":
+        ordinal = lambda s: date.fromisoformat(s).toordinal()
+        return cls(
+            rule_id,
+            int(rec["u"]),
+            rec["t"],
+            ordinal(rec["from"]),
+            ordinal(rec["to"]) if rec.get("to") else None,
+            frozenset(ordinal(s) for s in rec.get("skip", ())),
+        )
+
+
+# ──────────────────────────── індекс ────────────────────────────
+class RuleIndex:
+    """
+    Правила в пам'яті з індексами під перевірку зайнятості без розгортання:
+    *(день тижня, час)* → правила, користувач → правила, і для кожного дня
+    тижня маска часів, на які взагалі є правила (решту слотів не перевіряємо).
+    Блокувань не тримає — це робить `BookingRepository`.
+    """
+
+    def __init__(self, rules: List[Rule] = (), last_id: int = 0):
+        self.by_id: Dict[int, Rule] = {}
+        self.last_id = last_id  # id видаляються, але не видаються повторно
+        self.by_slot: Dict[tuple[int, str], List[Rule]] = {}
+        self.by_user: Dict[int, List[Rule]] = {}
+        self.weekday_masks = [0] * 7
+        for rule in rules:
+            self.add(rule)
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def next_id(self) -> int:
+        return self.last_id + 1
+
+    def add(self, rule: Rule) -> None:
+        self.by_id[rule.id] = rule
+        self.last_id = max(self.last_id, rule.id)
+        self.by_slot.setdefault((rule.weekday, rule.time), []).append(rule)
+        self.by_user.setdefault(rule.user_id, []).append(rule)
+        self.weekday_masks[rule.weekday] |= SLOT_BITS.get(rule.time, 0)
+
+    def remove(self, rule_id: int) -> Rule | None:
+        rule = self.by_id.pop(rule_id, None)
+        if rule is None:
+            return None
+        key = (rule.weekday, rule.time)
+        self.by_slot[key] = [r for r in self.by_slot[key] if r.id != rule_id]
+        if not self.by_slot[key]:
+            del self.by_slot[key]
+            self.weekday_masks[rule.weekday] &= ~SLOT_BITS.get(rule.time, 0)
+        self.by_user[rule.user_id] = [r for r in self.by_user[rule.user_id] if r.id != rule_id]
+        if not self.by_user[rule.user_id]:
+            del self.by_user[rule.user_id]
+        return rule
+
+    def replace(self, rule: Rule) -> None:
+        self.remove(rule.id)
+        self.add(rule)
+
+    # ---------- зайнятість ----------
+    def active(self, ordinal: int, time: str) -> List[Rule]:
+        """Правила, що займають слот у цей день — перевіряються лише правила цього слота."""
+        return [r for r in self.by_slot.get(((ordinal + 6) % 7, time), ()) if r.occurs(ordinal)]
+
+    def holders(self, ordinal: int, time: str) -> List[int]:
+        return [r.user_id for r in self.active(ordinal, time)]
+
+    def day(self, ordinal: int) -> Dict[str, List[int]]:
+        """*{час: [user_id]}* броней за правилами на день (відкриті слоти)."""
+        plan = schedule.plan_for_ordinal(ordinal)
+        mask = self.weekday_masks[(ordinal + 6) % 7] & plan.mask
+        out: Dict[str, List[int]] = {}
+        for t in schedule.times_of(mask):
+            uids = self.holders(ordinal, t)
+            if uids:
+                out[t] = uids
+        return out
+
+    def counts(self, lo: int, hi: int) -> Dict[int, int]:
+        """*{день: кількість броней за правилами}* для днів з `[lo, hi)`."""
+        out: Dict[int, int] = {}
+        for rule in self.by_id.values():
+            for o in rule.occurrences(lo, hi):
+                out[o] = out.get(o, 0) + 1
+        return out
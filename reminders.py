@@ -0,0 +1,195 @@
+"""
+Нагадування про заняття за REMINDER_LEADS хвилин до початку.
+
+Майбутні нагадування лежать у min-купі за часом спрацювання, а в JobQueue
+завжди одна задача — на вершину купи. Купа будується на старті зі сховища
+й далі оновлюється подіями бронювання/скасування (`aio`), тож і зміна, і
+спрацювання коштують O(log n) — без перегляду всіх броней.
+
+• Скасування не шукає записи в купі: слот, де більше нікого немає, просто
+  забувається, а його записи відкидаються, коли дійдуть до вершини.
+• Кому нагадувати, вирішується в момент спрацювання — за тим, хто зараз
+  у слоті (разом із правилами та змінами з інших процесів).
+• Події бачать лише зміни цього процесу. З SHARED_STORAGE купу раз на
+  REMINDER_SYNC_INTERVAL звіряє зі сховищем `aio.sync_reminders_job` і,
+  якщо дані змінила інша репліка, перебудовує. Тож нагадування про
+  чужу бронь, що мало спрацювати раніше за цю звірку, не надсилається.
+• Безстрокові правила розгортаються в купу лише на найближчі дні
+  (`horizon()`), наступні — щоночі (`aio.purge_job`).
+"""
+from __future__ import annotations
+
+import heapq
+import itertools
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from config import REMINDER_LEADS
+from utils import date_label
+
+Slot = Tuple[str, str]  # (дата, час)
+
+
+def slot_start(date_str: str, hhmm: str) -> float:
+    """Початок заняття (epoch) за місцевим часом."""
+    return datetime.fromisoformat(f"{date_str}T{hhmm}").timestamp()
+
+
+def lead_label(minutes: int) -> str:
+    if minutes % 60 == 0:
+        return f"{minutes // 60} год"
+    return f"{minutes} хв"
+
+
+def text(date_str: str, hhmm: str, lead: int) -> str:
+    return f"⏰ Нагадування: заняття {date_label(date_str)} о {hhmm} (за {lead_label(lead)})."
+
+
+# ──────────────────────────── купа ────────────────────────────
+class ReminderQueue:
+    """
+    Min-купа *(коли, покоління, дата, час, за скільки хв)* з лінивим
+    видаленням. Усі записи слота мають його покоління: у забутого слота
+    покоління в `_live` немає, тож його записи пропускаються на вершині,
+    а повторно заброньований слот отримує нове.
+    """
+
+    def __init__(self, leads: Iterable[int]):
+        self.leads = tuple(sorted(set(leads), reverse=True))  # від найдальшого
+        self._heap: List[tuple[float, int, str, str, int]] = []
+        self._live: Dict[Slot, int] = {}  # слот → покоління його записів
+        self._gen = itertools.count(1)
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def schedule(self, slot: Slot, now: float) -> None:
+        """Ставить нагадування слота, які ще попереду; наявні не дублюються."""
+        if slot in self._live or not self.leads:
+            return
+        start = slot_start(*slot)
+        gen = next(self._gen)
+        for lead in self.leads:
+            at = start - lead * 60
+            if at > now:
+                heapq.heappush(self._heap, (at, gen, *slot, lead))
+                self._live[slot] = gen
+
+    def forget(self, slot: Slot) -> None:
+        self._live.pop(slot, None)
+        # застарілих записів забагато — прибираємо їх за один прохід
+        if len(self._heap) > 4 * len(self._live) * len(self.leads) + 256:
+            self._heap = [e for e in self._heap if self._live.get((e[2], e[3])) == e[1]]
+            heapq.heapify(self._heap)
+
+    def clear(self) -> None:
+        self._heap.clear()
+        self._live.clear()
+
+    def _prune(self) -> None:
+        heap = self._heap
+        while heap and self._live.get((heap[0][2], heap[0][3])) != heap[0][1]:
+            heapq.heappop(heap)
+
+    def next_at(self) -> float | None:
+        self._prune()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> List[tuple[str, str, int]]:
+        """
+        Знімає з купи нагадування, що настали: *(дата, час, за скільки хв)*.
+        Якщо кілька нагадувань слота запізнились разом, лишається найближче
+        до заняття; заняття, що вже почались, пропускаються.
+        """
+        due: Dict[Slot, int] = {}
+        while True:
+            self._prune()
+            if not self._heap or self._heap[0][0] > now:
+                break
+            _, _, d, t, lead = heapq.heappop(self._heap)
+            due[(d, t)] = lead
+            if lead == self.leads[-1]:  # останнє нагадування слота
+                del self._live[(d, t)]
+        return [(d, t, lead) for (d, t), lead in due.items() if slot_start(d, t) > now]
+
+
+# ───────────────────── планування в JobQueue ─────────────────────
+_queue = ReminderQueue(REMINDER_LEADS)
+_job_queue = None
+_callback = None
+_job = None          # задача JobQueue на вершину купи
+_armed_at = None     # на коли вона стоїть
+
+
+def enabled() -> bool:
+    return bool(_queue.leads)
+
+
+def horizon(today: date | None = None) -> date:
+    """
+    До якого дня (не включно) правила розгортаються в купу: найдальше
+    нагадування плюс запас до наступного нічного поповнення.
+    """
+    today = today or date.today()
+    return today + timedelta(days=max(_queue.leads, default=0) // 1440 + 2)
+
+
+def attach(job_queue, callback) -> None:
+    """Задачі ставляться в `job_queue`; `callback(context)` надсилає нагадування."""
+    global _job_queue, _callback
+    _job_queue, _callback = job_queue, callback
+    _arm()
+
+
+def _arm() -> None:
+    """Перевіряє, що задача JobQueue стоїть саме на вершину купи."""
+    global _job, _armed_at
+    if _job_queue is None:
+        return
+    at = _queue.next_at()
+    if at == _armed_at:
+        return
+    if _job is not None:
+        _job.schedule_removal()
+    _job, _armed_at = None, at
+    if at is not None:
+        when = datetime.fromtimestamp(at).astimezone()
+        _job = _job_queue.run_once(_callback, when=when, name="reminders")
+
+
+def fill(days: Dict[str, Dict[str, List[int]]], reset: bool = False) -> None:
+    """Ставить у купу всі зайняті слоти `days` (*{дата: {час: [user_id]}}*)."""
+    if reset:
+        _queue.clear()
+    now = time.time()
+    for d, slots in days.items():
+        for t, uids in slots.items():
+            if uids:
+                _queue.schedule((d, t), now)
+    _arm()
+
+
+def update(pairs: Iterable[Slot], days: Dict[str, Dict[str, List[int]]]) -> None:
+    """
+    Після бронювання/скасування: зайняті слоти з `pairs` — у купу (якщо їх
+    там ще немає), ті, де нікого не лишилось, — забуваються.
+    """
+    now = time.time()
+    for d, t in pairs:
+        if days.get(d, {}).get(t):
+            _queue.schedule((d, t), now)
+        else:
+            _queue.forget((d, t))
+    _arm()
+
+
+def pop_due() -> List[tuple[str, str, int]]:
+    """Для задачі-спрацювання: нагадування, що настали (задача вже відпрацювала)."""
+    global _job, _armed_at
+    _job, _armed_at = None, None
+    return _queue.pop_due(time.time())
+
+
+def rearm() -> None:
+    _arm()
@@ -0,0 +1,78 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+import aio
+import booking
+import metrics
+from config import RENDER_CACHE_SIZE, SHARED_STORAGE
+
+T = TypeVar("T")
+
+
+class RenderCache:
+    """
+    LRU-кеш готових клавіатур і текстів.
+
+    Ключ — *(view, …параметри)*, значення прив'язане до версії сховища:
+    щойно версія змінилась (хтось забронював/скасував), увесь кеш
+    вважається застарілим і очищується.
+    """
+
+    def __init__(self, maxsize: int = RENDER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._version: int | None = None
+        self._items: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def _sync_version(self, version: int) -> None:
+        if version != self._version:
+            self._items.clear()
+            self._version = version
+
+    def get(self, key: Hashable, version: int, default=None):
+        self._sync_version(version)
+        try:
+            value = self._items[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, version: int, value) -> None:
+        if version != self._version:
+            return  # поки будували, дані вже змінились — не кешуємо
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+
+_cache = RenderCache()
+_MISSING = object()
+
+metrics.CounterFunc("tgbot_render_cache_hits_total", "Влучання в кеш рендерингу", lambda: _cache.hits)
+metrics.CounterFunc("tgbot_render_cache_misses_total", "Промахи кешу рендерингу", lambda: _cache.misses)
+
+
+async def render(view: str, key: tuple, build: Callable[[], Awaitable[T]]) -> T:
+    """
+    Повертає закешований результат `build()` для *(view, key)* або
+    будує його. Значення мають бути незмінними (`InlineKeyboardMarkup`, `str`).
+    """
+    # один процес — версія в пам'яті завжди актуальна, читаємо її без
+    # походу в пул потоків; з іншими процесами — звіряємося зі сховищем
+    version = await aio.version() if SHARED_STORAGE else booking.peek_version()
+    full_key = (view, *key)
+    value = _cache.get(full_key, version, _MISSING)
+    if value is _MISSING:
+        value = await build()
+        _cache.put(full_key, version, value)
+    return value
+
+
+def stats() -> tuple[int, int]:
+    """*(hits, misses)* кешу рендерингу."""
+    return _cache.hits, _cache.misses
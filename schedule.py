@@ -0,0 +1,152 @@
+"""
+Розклад: які слоти відкриті в конкретний день і скільки в кожному місць.
+
+Правила читаються з SCHEDULE_FILE (JSON) один раз і компілюються в таблиці:
+по одному плану дня на кожен день тижня плюс плани для дат-винятків.
+Тож `plan(day)` — це один пошук у словнику, без розбору правил.
+
+    {
+      "capacity": 1,                                  // місць у слоті за замовчуванням
+      "hours": ["09:00", "10:00", "11:00"],           // слоти будь-якого дня
+      "seats": {"18:00": 6},                          // групові слоти: місць за часом
+      "weekdays": {"sat": ["10:00", "11:00"],         // свій набір на день тижня
+                   "sun": []},                        // [] — вихідний
+      "dates": {"2025-12-31": {"10:00": 1, "18:00": 10},  // винятки на дату
+                "2026-01-01": []}
+    }
+
+Набір слотів — список *HH:MM* (місць — із `seats` або `capacity`) або
+словник *{HH:MM: місць}*. Немає файлу — кожен день `AVAILABLE_TIMES`
+по одному місцю, як і раніше.
+"""
+from __future__ import annotations
+
+import json
+from datetime import date, datetime
+from typing import Dict, List, NamedTuple
+
+from config import SCHEDULE_FILE
+from constants import AVAILABLE_TIMES
+
+_WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+class DayPlan(NamedTuple):
+    """Скомпільований план дня."""
+
+    times: tuple[str, ...]      # відкриті слоти за зростанням
+    seats: Dict[str, int]       # час → кількість місць
+    mask: int                   # біти відкритих слотів (по `TIMES`)
+
+
+# ─────────────────────────── компіляція ───────────────────────────
+def _check_time(value: str) -> str:
+    datetime.strptime(value, "%H:%M")
+    if len(value) != 5:
+        raise ValueError(f"очікується HH:MM, отримано {value!r}")
+    return value
+
+
+def _slot_set(spec, capacity: int, seats: Dict[str, int]) -> Dict[str, int]:
+    if isinstance(spec, dict):
+        out = {_check_time(t): int(n) for t, n in spec.items()}
+    else:
+        out = {_check_time(t): seats.get(t, capacity) for t in spec}
+    if any(n < 1 for n in out.values()):
+        raise ValueError("кількість місць має бути додатною")
+    return out
+
+
+class Schedule:
+    def __init__(self, rules: dict):
+        capacity = int(rules.get("capacity", 1))
+        seats = {_check_time(t): int(n) for t, n in rules.get("seats", {}).items()}
+        default = _slot_set(rules.get("hours", AVAILABLE_TIMES), capacity, seats)
+
+        unknown = set(rules.get("weekdays", {})) - set(_WEEKDAYS)
+        if unknown:
+            raise ValueError(f"невідомі дні тижня: {sorted(unknown)}")
+        weekly = [
+            _slot_set(rules["weekdays"][name], capacity, seats)
+            if name in rules.get("weekdays", {}) else default
+            for name in _WEEKDAYS
+        ]
+        dated = {
+            date.fromisoformat(d).toordinal(): _slot_set(spec, capacity, seats)
+            for d, spec in rules.get("dates", {}).items()
+        }
+
+        # усі часи, що трапляються в розкладі, — основа бітових масок
+        self.times: List[str] = sorted(
+            {t for slots in (*weekly, *dated.values()) for t in slots}
+        )
+        self.bits: Dict[str, int] = {t: 1 << i for i, t in enumerate(self.times)}
+        self._weekly = [self._compile(s) for s in weekly]
+        self._dated = {o: self._compile(s) for o, s in dated.items()}
+
+    def _compile(self, slots: Dict[str, int]) -> DayPlan:
+        times = tuple(sorted(slots))
+        mask = 0
+        for t in times:
+            mask |= self.bits[t]
+        return DayPlan(times, {t: slots[t] for t in times}, mask)
+
+    @property
+    def dated_until(self) -> int:
+        """Ordinal останньої дати-винятку (0 — винятків немає)."""
+        return max(self._dated, default=0)
+
+    def for_ordinal(self, ordinal: int) -> DayPlan:
+        plan = self._dated.get(ordinal)
+        if plan is None:
+            # date.weekday() == (ordinal + 6) % 7
+            plan = self._weekly[(ordinal + 6) % 7]
+        return plan
+
+
+def _load(path: str) -> Schedule:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            rules = json.load(f)
+    except FileNotFoundError:
+        rules = {}
+    try:
+        return Schedule(rules)
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError(f"{path}: некоректний розклад: {e}") from None
+
+
+_schedule = _load(SCHEDULE_FILE)
+
+# усі часи розкладу (за зростанням) і біт кожного в масці дня
+TIMES = _schedule.times
+SLOT_BITS = _schedule.bits
+
+
+# ───────────────────────────── API ─────────────────────────────
+def plan(day: date) -> DayPlan:
+    """План дня: відкриті слоти, місця, маска."""
+    return _schedule.for_ordinal(day.toordinal())
+
+
+def plan_for_ordinal(ordinal: int) -> DayPlan:
+    return _schedule.for_ordinal(ordinal)
+
+
+def seats(date_str: str, time: str) -> int:
+    """Скільки місць у слоті (0 — слот закритий або дата некоректна)."""
+    try:
+        ordinal = date.fromisoformat(date_str).toordinal()
+    except ValueError:
+        return 0
+    return _schedule.for_ordinal(ordinal).seats.get(time, 0)
+
+
+def dated_until() -> int:
+    """Останній день із власним планом: далі розклад лише щотижневий."""
+    return _schedule.dated_until
+
+
+def times_of(mask: int) -> List[str]:
+    """Бітова маска → слоти *HH:MM* за зростанням."""
+    return [t for i, t in enumerate(TIMES) if mask >> i & 1]
@@ -0,0 +1,189 @@
+"""
+Стан незавершених діалогів (`context.user_data`: обрана дата, слоти для
+бронювання/скасування) між перезапусками бота.
+
+• PTB кличе `update_user_data` лише для тих, від кого були апдейти з
+  минулого разу; зміни ще й збираються в пакет і пишуться одним записом
+  (`sessions_job` і зупинка бота) — лише змінені користувачі, не все підряд.
+• Хто не проявляв активності довше за SESSION_TTL, тому вибір скидається —
+  і з пам'яті процесу, і зі сховища. Тож у пам'яті лише активні користувачі.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from typing import Dict
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+import aio
+import metrics
+from config import SESSION_TTL, USERS_FLUSH_INTERVAL
+from storage import SessionStore, open_session_store
+
+log = logging.getLogger(__name__)
+
+SESSIONS_FILE = "sessions.jsonl"
+
+
+# ─────────────────────────── кодек ───────────────────────────
+def _encode(value):
+    """Множини (обрані слоти) зберігаються як `{"$set": [...]}`."""
+    if isinstance(value, (set, frozenset)):
+        return {"$set": sorted(value)}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict) and value.keys() == {"$set"}:
+        return set(value["$set"])
+    return value
+
+
+def _encode_data(data: dict) -> dict:
+    out = {}
+    for key, value in data.items():
+        value = _encode(value)
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            log.warning("user_data[%r] (%s) не зберігається", key, type(value).__name__)
+            continue
+        out[key] = value
+    return out
+
+
+# ──────────────────────── persistence ────────────────────────
+class SessionPersistence(BasePersistence):
+    """Зберігає лише `user_data`; чати, bot_data та callback_data — ні."""
+
+    def __init__(
+        self,
+        store: SessionStore,
+        ttl: float = SESSION_TTL,
+        update_interval: float = USERS_FLUSH_INTERVAL,
+    ):
+        super().__init__(
+            store_data=PersistenceInput(
+                bot_data=False, chat_data=False, user_data=True, callback_data=False
+            ),
+            update_interval=update_interval,
+        )
+        self._store = store
+        self.ttl = ttl
+        self._active: Dict[int, float] = {}  # user_id → остання активність (epoch)
+        self._stored: set[int] = set()       # у кого стан уже є в сховищі
+        # ще не записані зміни: None — стан видалено
+        self._pending: Dict[int, tuple[float, dict] | None] = {}
+        self._flush_lock = asyncio.Lock()    # пакети пишуться по черзі
+
+    # ---------- user_data ----------
+    async def get_user_data(self) -> Dict[int, dict]:
+        """Стан після перезапуску — без записів, старших за TTL (їх видаляємо)."""
+        now = time.time()
+        out: Dict[int, dict] = {}
+        for uid, (at, data) in (await aio.run_io(self._store.load)).items():
+            if now - at > self.ttl:
+                self._pending[uid] = None
+                metrics.SESSIONS_EXPIRED.inc()
+                continue
+            out[uid] = {k: _decode(v) for k, v in data.items()}
+            self._active[uid] = at
+            self._stored.add(uid)
+        return out
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        # викликається перед кожним апдейтом користувача
+        now = time.time()
+        last = self._active.get(user_id)
+        if user_data and last is not None and now - last > self.ttl:
+            user_data.clear()  # вибір застарів, поки процес ще не прибрав його
+            metrics.SESSIONS_EXPIRED.inc()
+        self._active[user_id] = now
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        encoded = _encode_data(data)
+        if encoded:
+            self._pending[user_id] = (self._active.get(user_id, time.time()), encoded)
+            self._stored.add(user_id)
+        elif user_id in self._stored:
+            self._pending[user_id] = None
+            self._stored.discard(user_id)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._active.pop(user_id, None)
+        if user_id in self._stored:
+            self._pending[user_id] = None
+            self._stored.discard(user_id)
+
+    def expire(self, application) -> int:
+        """
+        Забуває користувачів, неактивних довше за TTL: `drop_user_data`
+        прибирає їх із пам'яті одразу, а зі сховища — на наступному
+        оновленні persistence. Повертає, скільки станів було скинуто.
+        """
+        cutoff = time.time() - self.ttl
+        dropped = 0
+        for uid in [uid for uid, at in self._active.items() if at < cutoff]:
+            if application.user_data.get(uid):
+                dropped += 1
+            application.drop_user_data(uid)
+            self._active.pop(uid, None)
+        metrics.SESSIONS_EXPIRED.inc(dropped)
+        return dropped
+
+    async def flush(self) -> None:
+        """Пише накопичені зміни одним пакетом."""
+        async with self._flush_lock:
+            batch, self._pending = self._pending, {}
+            if batch:
+                await aio.run_io(self._store.save, batch)
+
+    # ---------- решта не зберігається ----------
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+
+def open_persistence() -> SessionPersistence:
+    return SessionPersistence(open_session_store(SESSIONS_FILE))
+
+
+async def sessions_job(context) -> None:
+    """Скидає застарілий вибір і пише накопичені зміни стану діалогів."""
+    persistence = context.application.persistence
+    expired = persistence.expire(context.application)
+    if expired:
+        log.info("Скинуто застарілих незавершених діалогів: %d", expired)
+    await persistence.flush()
@@ -0,0 +1,941 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Callable, ContextManager, Dict, Hashable
+
+try:
+    import fcntl
+except ImportError:  # Windows — міжпроцесного блокування немає
+    fcntl = None
+
+from config import (
+    DATA_JOURNAL,
+    JOURNAL_COMPACT_EVERY,
+    SHARED_STORAGE,
+    SQLITE_PATH,
+    STORAGE_BACKEND,
+)
+from metrics import STORAGE_BYTES, STORAGE_LOCK_WAIT, STORAGE_OPS
+
+
+# ────────────────────────── helpers ──────────────────────────
+def seat_ids(value) -> list[int]:
+    """
+    Місця слота як список user_id. Старі записи зберігали одне число
+    (слот на одного) або навіть `{"id": ...}`.
+    """
+    if isinstance(value, list):
+        return [seat_ids(v)[0] for v in value]
+    return [int(value["id"]) if isinstance(value, dict) else int(value)]
+
+
+def normalize(data: dict) -> dict[str, dict[str, list[int]]]:
+    """*{дата: {час: [user_id, ...]}}* з даних у будь-якому зі старих форматів."""
+    return {
+        d: {t: seat_ids(v) for t, v in slots.items() if v not in (None, [])}
+        for d, slots in data.items()
+    }
+
+
+def _read_json(path: str) -> dict:
+    """
+    Читає JSON-файл. Відсутній файл — це порожні дані, а от
+    пошкоджений — помилка: мовчки повертати `{}` означало б стерти всі броні.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            STORAGE_OPS.inc(op="read")
+            STORAGE_BYTES.inc(os.fstat(f.fileno()).st_size, op="read")
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_json(path: str, data: dict) -> None:
+    """Атомарний запис: тимчасовий файл + fsync + rename."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"  # свій у кожного потоку
+    payload = json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+    with open(tmp, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(path)
+    STORAGE_OPS.inc(op="write")
+    STORAGE_OPS.inc(op="fsync")
+    STORAGE_BYTES.inc(len(payload), op="write")
+
+
+def _fsync_dir(path: str) -> None:
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass  # не всі ФС дозволяють fsync каталогу
+    finally:
+        os.close(fd)
+
+
+def _file_stamp(path: str) -> tuple[int, int] | None:
+    """(mtime_ns, size) файлу або *None*, якщо файлу немає."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _ordered(data: dict) -> dict:
+    """Копія даних, відсортована за датою та часом (для запису у файл)."""
+    ordered: dict[str, dict[str, int]] = OrderedDict()
+    for d in sorted(data.keys()):
+        ordered[d] = OrderedDict(
+            sorted(
+                data[d].items(),
+                key=lambda kv: datetime.strptime(kv[0], "%H:%M"),
+            )
+        )
+    return ordered
+
+
+# ───────────────────── міжпроцесне блокування ─────────────────────
+_NO_LOCK = nullcontext()
+
+
+class ProcessLock:
+    """
+    Ексклюзивне advisory-блокування (`flock`) файлу-супутника *.lock:
+    поки його тримає один процес, решта чекають. `flock` не розрізняє
+    потоки одного процесу, тож вони чергуються на внутрішньому RLock;
+    повторний вхід з того ж потоку дозволений.
+    """
+
+    def __init__(self, path: str):
+        if fcntl is None:
+            raise RuntimeError("SHARED_STORAGE=1 потребує fcntl.flock (Linux/macOS)")
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd: int | None = None
+
+    def __enter__(self) -> "ProcessLock":
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                if self._fd is None:
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                start = time.perf_counter()
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+                STORAGE_LOCK_WAIT.observe(time.perf_counter() - start)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+
+# один об'єкт на файл у межах процесу: два `flock` з різних дескрипторів
+# того ж процесу блокували б один одного
+_process_locks: dict[str, ProcessLock] = {}
+_process_locks_guard = threading.Lock()
+
+
+def _process_lock(data_path: str) -> ProcessLock | None:
+    """Блокування для `data_path` (`<шлях>.lock`), якщо увімкнено SHARED_STORAGE."""
+    if not SHARED_STORAGE:
+        return None
+    key = os.path.abspath(data_path) + ".lock"
+    with _process_locks_guard:
+        if key not in _process_locks:
+            _process_locks[key] = ProcessLock(key)
+        return _process_locks[key]
+
+
+# ───────────────────────── journal ───────────────────────────
+def _apply_record(data: dict, rec: dict) -> None:
+    """Застосовує один запис журналу. Операції ідемпотентні."""
+    op = rec["op"]
+    if op == "book":
+        seats = data.setdefault(rec["d"], {}).setdefault(rec["t"], [])
+        if rec["u"] not in seats:
+            seats.append(rec["u"])
+    elif op == "cancel":
+        day = data.get(rec["d"])
+        if day is not None:
+            seats = day.get(rec["t"], [])
+            if "u" in rec:  # звільняється одне місце
+                if rec["u"] in seats:
+                    seats.remove(rec["u"])
+            else:  # старі записи: слот цілком
+                seats.clear()
+            if not seats:
+                day.pop(rec["t"], None)
+            if not day:
+                del data[rec["d"]]
+    elif op == "purge":
+        for d in [d for d in data if d < rec["before"]]:
+            del data[d]
+
+
+class _Journal:
+    """
+    Append-only журнал змін (один JSON-запис на рядок).
+
+    Кілька потоків можуть дописувати одночасно: кожен пише свої рядки,
+    а один спільний fsync покриває всі записи, що встигли потрапити у файл
+    до нього (group commit) — під навантаженням fsync'ів менше, ніж змін.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._f = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._written = 0
+        self._synced = 0
+
+    def replay(self, data: dict) -> None:
+        """
+        Накатує журнал на знімок. Недописаний останній рядок (аварія під
+        час запису) відрізається, щоб нові записи не йшли після «сміття».
+        """
+        self.count = 0
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        good = 0
+        with f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                _apply_record(data, rec)
+                self.count += 1
+                good += len(line)
+            torn = f.tell() != good
+        STORAGE_OPS.inc(op="journal_replay")
+        STORAGE_BYTES.inc(good, op="journal_replay")
+        if torn:
+            with self._lock:
+                if self._f is not None:
+                    self._f.close()
+                    self._f = None
+                os.truncate(self.path, good)
+
+    def append(self, records: list[dict]) -> None:
+        if not records:
+            return
+        payload = "".join(
+            json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n"
+            for r in records
+        )
+        with self._lock:
+            if self._f is None:
+                self._f = open(self.path, "a", encoding="utf-8")
+            self._f.write(payload)
+            self._f.flush()
+            self._written += 1
+            seq = self._written
+            self.count += len(records)
+        STORAGE_OPS.inc(op="journal_append")
+        STORAGE_BYTES.inc(len(payload), op="journal_append")  # записи — лише ASCII
+        self._sync(seq)
+
+    def _sync(self, seq: int) -> None:
+        with self._sync_lock:
+            if self._synced >= seq:
+                return  # хтось уже зробив fsync після нашого запису
+            with self._lock:
+                target = self._written
+                if self._f is None:  # журнал щойно переписано знімком
+                    self._synced = target
+                    return
+                fd = os.dup(self._f.fileno())
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._synced = target
+            STORAGE_OPS.inc(op="fsync")
+
+    def rewrite(self, snapshot: Callable[[], None]) -> None:
+        """
+        Компактизація: `snapshot()` пише повний знімок, після чого журнал
+        обнуляється. Дописування на цей час заблоковано, тож жоден запис
+        не загубиться між знімком і обрізанням.
+        """
+        with self._lock:
+            snapshot()
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+            with open(self.path, "w", encoding="utf-8") as f:
+                os.fsync(f.fileno())
+            self.count = 0
+            self._synced = self._written
+
+
+# ───────────────────────── interfaces ─────────────────────────
+class BookingStore:
+    """
+    Постійне сховище бронювань *{дата: {час: [user_id, ...]}}*
+    (у слоті стільки місць, скільки дає розклад — див. `schedule.py`).
+
+    Стан у пам'яті, індекси та блокування тримає `BookingRepository`;
+    бекенд лише читає все на старті й фіксує зміни у вигляді записів
+    `{"op": "book" | "cancel" | "purge", ...}`.
+    """
+
+    process_lock: ProcessLock | None = None
+
+    def lock(self) -> ContextManager:
+        """
+        Міжпроцесне блокування на час «перечитати → перевірити → записати»
+        (лише з SHARED_STORAGE; інакше нічого не блокує).
+        """
+        return self.process_lock or _NO_LOCK
+
+    def load(self) -> dict:
+        raise NotImplementedError
+
+    def stamp(self) -> Hashable:
+        """Маркер стану на диску: змінюється, коли дані змінив хтось інший."""
+        raise NotImplementedError
+
+    def apply(self, records: list[dict], current: Callable[[], dict]) -> None:
+        """Фіксує записи. `current()` повертає повний стан, якщо бекенду він потрібен."""
+        raise NotImplementedError
+
+    def replace(self, data: dict) -> None:
+        raise NotImplementedError
+
+    def compaction_due(self) -> bool:
+        return False
+
+    def compact(self, current: Callable[[], dict]) -> None:
+        pass
+
+
+class UserStore:
+    """Постійне сховище профілів *{user_id (str): {first_name, username}}*."""
+
+    process_lock: ProcessLock | None = None
+
+    def lock(self) -> ContextManager:
+        return self.process_lock or _NO_LOCK
+
+    def load(self) -> Dict[str, dict]:
+        raise NotImplementedError
+
+    def stamp(self) -> Hashable:
+        """Маркер стану на диску: змінюється, коли профілі записав хтось інший."""
+        raise NotImplementedError
+
+    def save(self, users: Dict[str, dict], changed: set[str]) -> None:
+        """Зберігає профілі; `changed` — id, що змінились від останнього запису."""
+        raise NotImplementedError
+
+
+class RuleStore:
+    """
+    Постійне сховище правил повторення *{id (str): {u, t, from, to, skip}}*:
+    щотижнева бронь користувача `u` на час `t` з дати `from` по `to`
+    (None — безстроково), крім дат `skip`. Правил мало, тож кожна зміна —
+    це запис лише зачеплених правил, а не розгорнутих дат.
+    """
+
+    def load(self) -> Dict[str, dict]:
+        raise NotImplementedError
+
+    def stamp(self) -> Hashable:
+        raise NotImplementedError
+
+    def last_id(self) -> int:
+        """
+        Найбільший id, який будь-коли видавався (разом із видаленими): нові
+        правила отримують більші, тож стара кнопка не скасує чуже правило.
+        """
+        raise NotImplementedError
+
+    def save(self, rules: Dict[str, dict], changed: set[str], last_id: int = 0) -> None:
+        """Зберігає правила; `changed` — id змінених або видалених."""
+        raise NotImplementedError
+
+
+class SessionStore:
+    """
+    Стан незавершених діалогів (`context.user_data`):
+    *{user_id: (час останньої зміни, {ключ: значення})}*. Значення — лише
+    JSON-сумісні; пишуться тільки змінені користувачі.
+    """
+
+    def load(self) -> Dict[int, tuple[float, dict]]:
+        raise NotImplementedError
+
+    def save(self, changes: Dict[int, tuple[float, dict] | None]) -> None:
+        """Записує зміни; *None* — стан користувача видалено."""
+        raise NotImplementedError
+
+
+# ──────────────────────── JSON backend ────────────────────────
+class JsonBookingStore(BookingStore):
+    """
+    `data.json` як знімок + (опційно) журнал `data.json.journal`.
+
+    • У режимі журналу кожна зміна дописується одним рядком; раз на
+      `compact_every` записів робиться новий знімок (атомарно),
+      а журнал обнуляється. На старті: знімок + накат журналу.
+    • Без журналу — атомарний перезапис усього файлу на кожну зміну.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        journal: bool = DATA_JOURNAL,
+        compact_every: int = JOURNAL_COMPACT_EVERY,
+        process_lock: ProcessLock | None = None,
+    ):
+        self.path = path
+        self.compact_every = compact_every
+        self.process_lock = process_lock
+        self._journal = _Journal(path + ".journal") if journal else None
+        # без журналу: знімок береться й пишеться під блокуванням, тож
+        # пізніший запис ніколи не затре новіший стан старішим. `current()`
+        # бере блокування репозиторію, тому порядок завжди `_write_lock` →
+        # `_guard`: репозиторій не викликає запис, тримаючи `_guard`
+        self._write_lock = threading.Lock()
+
+    def load(self) -> dict:
+        data = normalize(_read_json(self.path))
+        if self._journal is not None:
+            self._journal.replay(data)
+        return data
+
+    def stamp(self) -> Hashable:
+        if self._journal is None:
+            return (_file_stamp(self.path),)
+        return _file_stamp(self.path), _file_stamp(self._journal.path)
+
+    def apply(self, records: list[dict], current: Callable[[], dict]) -> None:
+        if self._journal is None:
+            with self._write_lock:
+                _write_json(self.path, _ordered(current()))
+        else:
+            self._journal.append(records)
+
+    def replace(self, data: dict) -> None:
+        self.compact(lambda: data)
+
+    def compaction_due(self) -> bool:
+        return self._journal is not None and self._journal.count >= self.compact_every
+
+    def compact(self, current: Callable[[], dict]) -> None:
+        """Пише повний знімок (tmp + rename) і обнуляє журнал."""
+        def snapshot() -> None:
+            _write_json(self.path, _ordered(current()))
+
+        if self._journal is None:
+            with self._write_lock:
+                snapshot()
+        else:
+            self._journal.rewrite(snapshot)
+
+
+class JsonUserStore(UserStore):
+    """
+    `users.json`: завжди переписується повністю (атомарно). Зі спільним
+    сховищем — під блокуванням і поверх профілів, які записали інші процеси.
+    """
+
+    def __init__(self, path: str, process_lock: ProcessLock | None = None):
+        self.path = path
+        self.process_lock = process_lock
+
+    def load(self) -> Dict[str, dict]:
+        return _read_json(self.path)
+
+    def stamp(self) -> Hashable:
+        return _file_stamp(self.path)
+
+    def save(self, users: Dict[str, dict], changed: set[str]) -> None:
+        if self.process_lock is None:
+            _write_json(self.path, users)
+            return
+        with self.process_lock:
+            merged = _read_json(self.path)
+            for uid in changed:
+                if uid in users:
+                    merged[uid] = users[uid]
+                else:
+                    merged.pop(uid, None)
+            _write_json(self.path, merged)
+
+
+class JsonRuleStore(RuleStore):
+    """
+    `rules.json`: переписується повністю (атомарно) — правил одиниці на
+    користувача. Ключ `_last_id` — найбільший виданий id (файли без нього
+    читаються як раніше: за найбільшим наявним).
+    """
+
+    _LAST_ID = "_last_id"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Dict[str, dict]:
+        rules = _read_json(self.path)
+        rules.pop(self._LAST_ID, None)
+        return rules
+
+    def last_id(self) -> int:
+        raw = _read_json(self.path)
+        issued = raw.pop(self._LAST_ID, 0)
+        return max(issued, *map(int, raw), 0)
+
+    def stamp(self) -> Hashable:
+        return _file_stamp(self.path)
+
+    def save(self, rules: Dict[str, dict], changed: set[str], last_id: int = 0) -> None:
+        ordered = dict(sorted(rules.items(), key=lambda kv: int(kv[0])))
+        _write_json(self.path, {self._LAST_ID: max(last_id, *map(int, rules), 0), **ordered})
+
+
+class JsonSessionStore(SessionStore):
+    """
+    `sessions.jsonl`: рядок на зміну — `{"u", "at", "d"}` або `{"u"}`
+    (видалення); при читанні перемагає останній. Коли мертвих рядків стає
+    більше, ніж живих, файл атомарно переписується лише живими записами.
+    Без fsync на кожен рядок: стан діалогу не вартий його ціни — обірваний
+    рядок після аварії просто відкидається. З SHARED_STORAGE файл перед
+    перезаписом перечитується під блокуванням — записи інших процесів лишаються.
+    """
+
+    def __init__(self, path: str, process_lock: ProcessLock | None = None):
+        self.path = path
+        self.process_lock = process_lock
+        self._records: Dict[int, tuple[float, dict]] = {}
+        self._lines = 0
+
+    def load(self) -> Dict[int, tuple[float, dict]]:
+        records, lines, torn = self._read()
+        self._records, self._lines = records, lines
+        if torn:  # нові рядки не мають іти після обірваного
+            with self.process_lock or _NO_LOCK:
+                self._rewrite()
+        return dict(records)
+
+    def _read(self) -> tuple[Dict[int, tuple[float, dict]], int, bool]:
+        """*(живі записи, цілих рядків, чи обірваний хвіст)* з файлу."""
+        records: Dict[int, tuple[float, dict]] = {}
+        lines, torn = 0, False
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            f = None
+        if f is not None:
+            with f:
+                for line in f:
+                    try:
+                        rec = json.loads(line) if line.endswith(b"\n") else None
+                    except json.JSONDecodeError:
+                        rec = None
+                    if rec is None:
+                        torn = True
+                        break
+                    lines += 1
+                    if "d" in rec:
+                        records[int(rec["u"])] = (rec["at"], rec["d"])
+                    else:
+                        records.pop(int(rec["u"]), None)
+                STORAGE_BYTES.inc(f.tell(), op="read")
+            STORAGE_OPS.inc(op="read")
+        return records, lines, torn
+
+    def save(self, changes: Dict[int, tuple[float, dict] | None]) -> None:
+        if not changes:
+            return
+        with self.process_lock or _NO_LOCK:
+            self._merge(changes)
+            if self._lines + len(changes) > 2 * len(self._records) + 64:
+                if self.process_lock is not None:
+                    # інші процеси теж дописують файл, і їхніх записів у нас
+                    # немає — перед перезаписом беремо стан із файлу
+                    self._records, self._lines, _ = self._read()
+                    self._merge(changes)
+                self._rewrite()
+                return
+            payload = "".join(
+                json.dumps(
+                    {"u": uid} if rec is None else {"u": uid, "at": rec[0], "d": rec[1]},
+                    ensure_ascii=False,
+                    separators=(",", ":"),
+                ) + "\n"
+                for uid, rec in changes.items()
+            ).encode("utf-8")
+            with open(self.path, "ab") as f:
+                f.write(payload)
+            self._lines += len(changes)
+        STORAGE_OPS.inc(op="write")
+        STORAGE_BYTES.inc(len(payload), op="write")
+
+    def _merge(self, changes: Dict[int, tuple[float, dict] | None]) -> None:
+        for uid, rec in changes.items():
+            if rec is None:
+                self._records.pop(uid, None)
+            else:
+                self._records[uid] = rec
+
+    def _rewrite(self) -> None:
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        payload = "".join(
+            json.dumps({"u": uid, "at": at, "d": d}, ensure_ascii=False, separators=(",", ":")) + "\n"
+            for uid, (at, d) in sorted(self._records.items())
+        ).encode("utf-8")
+        with open(tmp, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._lines = len(self._records)
+        STORAGE_OPS.inc(op="write")
+        STORAGE_BYTES.inc(len(payload), op="write")
+
+
+# ─────────────────────── SQLite backend ───────────────────────
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bookings (
+    date    TEXT    NOT NULL,
+    time    TEXT    NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (date, time, user_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS bookings_user_idx ON bookings (user_id, date, time);
+CREATE TABLE IF NOT EXISTS rules (
+    id         INTEGER PRIMARY KEY,
+    user_id    INTEGER NOT NULL,
+    time       TEXT    NOT NULL,
+    date_from  TEXT    NOT NULL,
+    date_to    TEXT,
+    skip       TEXT    NOT NULL DEFAULT '[]'
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key        TEXT    PRIMARY KEY,
+    value      INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    id         INTEGER PRIMARY KEY,
+    first_name TEXT,
+    username   TEXT
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    user_id    INTEGER PRIMARY KEY,
+    updated    REAL    NOT NULL,
+    data       TEXT    NOT NULL
+);
+"""
+
+# Сталі тексти запитів: sqlite3 кешує скомпільовані (prepared) statements
+_SQL_BOOK = "INSERT OR REPLACE INTO bookings (date, time, user_id) VALUES (?, ?, ?)"
+_SQL_CANCEL = "DELETE FROM bookings WHERE date = ? AND time = ? AND user_id = ?"
+_SQL_CANCEL_SLOT = "DELETE FROM bookings WHERE date = ? AND time = ?"
+_SQL_PURGE = "DELETE FROM bookings WHERE date < ?"
+_SQL_UPSERT_USER = (
+    "INSERT INTO users (id, first_name, username) VALUES (?, ?, ?) "
+    "ON CONFLICT (id) DO UPDATE SET "
+    "first_name = excluded.first_name, username = excluded.username"
+)
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        path,
+        check_same_thread=False,
+        isolation_level=None,  # транзакції керуємо самі (BEGIN / COMMIT)
+        cached_statements=64,
+    )
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA busy_timeout = 5000")
+    _upgrade(conn)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _upgrade(conn: sqlite3.Connection) -> None:
+    """
+    БД до групових слотів мала первинний ключ (date, time) — один user_id
+    на слот. Переносимо рядки в таблицю з ключем (date, time, user_id).
+    """
+    row = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'bookings'"
+    ).fetchone()
+    if row is None or "PRIMARY KEY (date, time)" not in row[0]:
+        return
+    conn.executescript(
+        """
+        BEGIN IMMEDIATE;
+        ALTER TABLE bookings RENAME TO bookings_v1;
+        DROP INDEX IF EXISTS bookings_user_idx;
+        """
+        + _SCHEMA
+        + """
+        INSERT INTO bookings (date, time, user_id)
+            SELECT date, time, user_id FROM bookings_v1;
+        DROP TABLE bookings_v1;
+        COMMIT;
+        """
+    )
+
+
+# одне з'єднання на файл БД у межах процесу: так `PRAGMA data_version`
+# реагує лише на коміти інших процесів, а не на сусіднє сховище
+_connections: dict[str, tuple[sqlite3.Connection, threading.Lock]] = {}
+_connections_lock = threading.Lock()
+
+
+def _shared_connection(path: str) -> tuple[sqlite3.Connection, threading.Lock]:
+    key = os.path.abspath(path)
+    with _connections_lock:
+        if key not in _connections:
+            _connections[key] = (_connect(path), threading.Lock())
+        return _connections[key]
+
+
+class _SqliteBase:
+    def __init__(self, path: str, process_lock: ProcessLock | None = None):
+        self.path = path
+        self.process_lock = process_lock
+        self._conn, self._lock = _shared_connection(path)
+
+    def _transaction(self, fn: Callable[[sqlite3.Connection], None]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        STORAGE_OPS.inc(op="sqlite_commit")
+
+
+class SqliteBookingStore(_SqliteBase, BookingStore):
+    """SQLite у режимі WAL; індекси за датою (первинний ключ) і user_id."""
+
+    def load(self) -> dict:
+        data: dict[str, dict[str, int]] = {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, time, user_id FROM bookings ORDER BY date, time"
+            ).fetchall()
+        STORAGE_OPS.inc(op="sqlite_load")
+        for d, t, uid in rows:
+            data.setdefault(d, {}).setdefault(t, []).append(uid)
+        return data
+
+    def stamp(self) -> Hashable:
+        # data_version змінюється лише після комітів з інших з'єднань
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def apply(self, records: list[dict], current: Callable[[], dict]) -> None:
+        def run(conn: sqlite3.Connection) -> None:
+            for rec in records:
+                op = rec["op"]
+                if op == "book":
+                    conn.execute(_SQL_BOOK, (rec["d"], rec["t"], rec["u"]))
+                elif op == "cancel" and "u" in rec:
+                    conn.execute(_SQL_CANCEL, (rec["d"], rec["t"], rec["u"]))
+                elif op == "cancel":
+                    conn.execute(_SQL_CANCEL_SLOT, (rec["d"], rec["t"]))
+                elif op == "purge":
+                    conn.execute(_SQL_PURGE, (rec["before"],))
+
+        self._transaction(run)
+
+    def replace(self, data: dict) -> None:
+        def run(conn: sqlite3.Connection) -> None:
+            conn.execute("DELETE FROM bookings")
+            conn.executemany(
+                _SQL_BOOK,
+                (
+                    (d, t, uid)
+                    for d, slots in data.items()
+                    for t, seats in slots.items()
+                    for uid in seats
+                ),
+            )
+
+        self._transaction(run)
+
+
+class SqliteUserStore(_SqliteBase, UserStore):
+    """Профілі в тій самій БД; пишуться лише змінені рядки."""
+
+    def load(self) -> Dict[str, dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, first_name, username FROM users"
+            ).fetchall()
+        STORAGE_OPS.inc(op="sqlite_load")
+        return {
+            str(uid): {"first_name": first_name, "username": username}
+            for uid, first_name, username in rows
+        }
+
+    def stamp(self) -> Hashable:
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def save(self, users: Dict[str, dict], changed: set[str]) -> None:
+        def run(conn: sqlite3.Connection) -> None:
+            conn.executemany(
+                _SQL_UPSERT_USER,
+                (
+                    (int(uid), users[uid].get("first_name"), users[uid].get("username"))
+                    for uid in changed
+                    if uid in users
+                ),
+            )
+            gone = [(int(uid),) for uid in changed if uid not in users]
+            if gone:
+                conn.executemany("DELETE FROM users WHERE id = ?", gone)
+
+        self._transaction(run)
+
+
+class SqliteRuleStore(_SqliteBase, RuleStore):
+    """Правила повторення в тій самій БД (дати-винятки — JSON-списком)."""
+
+    def load(self) -> Dict[str, dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, user_id, time, date_from, date_to, skip FROM rules"
+            ).fetchall()
+        STORAGE_OPS.inc(op="sqlite_load")
+        return {
+            str(rid): {"u": uid, "t": t, "from": d1, "to": d2, "skip": json.loads(skip)}
+            for rid, uid, t, d1, d2, skip in rows
+        }
+
+    def last_id(self) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT max(coalesce((SELECT value FROM meta WHERE key = 'rules_last_id'), 0),"
+                " coalesce((SELECT max(id) FROM rules), 0))"
+            ).fetchone()
+        return row[0]
+
+    def stamp(self) -> Hashable:
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def save(self, rules: Dict[str, dict], changed: set[str], last_id: int = 0) -> None:
+        def run(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('rules_last_id', ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = max(value, excluded.value)",
+                (last_id,),
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO rules (id, user_id, time, date_from, date_to, skip) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (int(rid), r["u"], r["t"], r["from"], r["to"], json.dumps(r["skip"]))
+                    for rid, r in ((rid, rules[rid]) for rid in changed if rid in rules)
+                ),
+            )
+            gone = [(int(rid),) for rid in changed if rid not in rules]
+            if gone:
+                conn.executemany("DELETE FROM rules WHERE id = ?", gone)
+
+        self._transaction(run)
+
+
+class SqliteSessionStore(_SqliteBase, SessionStore):
+    """Стан діалогів у тій самій БД: рядок на користувача, JSON у `data`."""
+
+    def load(self) -> Dict[int, tuple[float, dict]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT user_id, updated, data FROM sessions").fetchall()
+        STORAGE_OPS.inc(op="sqlite_load")
+        return {uid: (updated, json.loads(data)) for uid, updated, data in rows}
+
+    def save(self, changes: Dict[int, tuple[float, dict] | None]) -> None:
+        if not changes:
+            return
+
+        def run(conn: sqlite3.Connection) -> None:
+            conn.executemany(
+                "INSERT OR REPLACE INTO sessions (user_id, updated, data) VALUES (?, ?, ?)",
+                (
+                    (uid, rec[0], json.dumps(rec[1], ensure_ascii=False))
+                    for uid, rec in changes.items()
+                    if rec is not None
+                ),
+            )
+            gone = [(uid,) for uid, rec in changes.items() if rec is None]
+            if gone:
+                conn.executemany("DELETE FROM sessions WHERE user_id = ?", gone)
+
+        self._transaction(run)
+
+
+# ───────────────────────── factories ─────────────────────────
+def open_booking_store(json_path: str) -> BookingStore:
+    """Сховище бронювань згідно з `STORAGE_BACKEND` (json | sqlite)."""
+    if STORAGE_BACKEND == "sqlite":
+        return SqliteBookingStore(SQLITE_PATH, _process_lock(SQLITE_PATH))
+    if STORAGE_BACKEND == "json":
+        return JsonBookingStore(json_path, process_lock=_process_lock(json_path))
+    raise ValueError(f"Невідомий STORAGE_BACKEND: {STORAGE_BACKEND!r}")
+
+
+def open_user_store(json_path: str) -> UserStore:
+    """Сховище профілів згідно з `STORAGE_BACKEND` (json | sqlite)."""
+    if STORAGE_BACKEND == "sqlite":
+        return SqliteUserStore(SQLITE_PATH)
+    if STORAGE_BACKEND == "json":
+        return JsonUserStore(json_path, _process_lock(json_path))
+    raise ValueError(f"Невідомий STORAGE_BACKEND: {STORAGE_BACKEND!r}")
+
+
+def open_rule_store(json_path: str) -> RuleStore:
+    """Сховище правил повторення згідно з `STORAGE_BACKEND` (json | sqlite)."""
+    if STORAGE_BACKEND == "sqlite":
+        return SqliteRuleStore(SQLITE_PATH)
+    if STORAGE_BACKEND == "json":
+        return JsonRuleStore(json_path)
+    raise ValueError(f"Невідомий STORAGE_BACKEND: {STORAGE_BACKEND!r}")
+
+
+def open_session_store(json_path: str) -> SessionStore:
+    """Сховище стану діалогів згідно з `STORAGE_BACKEND` (json | sqlite)."""
+    if STORAGE_BACKEND == "sqlite":
+        return SqliteSessionStore(SQLITE_PATH)
+    if STORAGE_BACKEND == "json":
+        return JsonSessionStore(json_path, _process_lock(json_path))
+    raise ValueError(f"Невідомий STORAGE_BACKEND: {STORAGE_BACKEND!r}")
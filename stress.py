@@ -0,0 +1,233 @@
+"""
+Стрес-перевірка спільного сховища: кілька процесів одночасно бронюють
+і скасовують ті самі слоти в одному каталозі з SHARED_STORAGE=1.
+
+    python stress.py [--workers 4] [--ops 300] [--slots 6] [--days 1] [--seats 2]
+                     [--users 3] [--threads 1] [--seed 1] [--workdir DIR]
+
+Бекенд і журнал — зі звичайних змінних (STORAGE_BACKEND, DATA_JOURNAL,
+JOURNAL_COMPACT_EVERY). Кожен процес має своїх користувачів і знає, які
+з його броней мають лишитися. З `--threads N` кожен процес працює з N
+потоків (у кожного свої `--users` користувачів), як обробники бота в пулі
+потоків сховища, — тож під навантаження потрапляє й узгодження кешу
+в пам'яті між потоками одного процесу. `--workers 1` — окремий режим
+за замовчуванням бота: один процес без SHARED_STORAGE, лише потоки.
+Після завершення всіх процесів перевіряється:
+
+  • жоден слот не має більше місць, ніж дає розклад, і повторів у слоті;
+  • у сховищі рівно ті броні, які процеси вважають своїми (нічого не
+    загубилось при паралельних записах і компактизації);
+  • кожен процес наприкінці бачить той самий стан, що й на диску
+    (кеш у пам'яті оновився після чужих змін), а свої броні потоку ні
+    разу не зникали з пам'яті, поки він їх не скасував;
+  • users.json / таблиця users містить профілі всіх процесів.
+
+Код виходу 0 — усе гаразд, 1 — знайдено порушення.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+_GO = "stress.go"  # процеси стартують разом, щойно з'явиться цей файл
+_DONE = "stress.done."  # + номер процесу: він закінчив свої операції
+
+
+def _wait(predicate) -> None:
+    while not predicate():
+        time.sleep(0.005)
+
+
+# ───────────────────────── процес-учасник ─────────────────────────
+def _worker(args) -> None:
+    # сховище відкривається під час імпорту — каталог і змінні вже готові
+    import booking
+    import schedule
+    from handlers import users
+
+    days = [date.today() + timedelta(days=1 + i) for i in range(args.days)]
+    slots = [(day.isoformat(), t) for day in days for t in schedule.plan(day).times[: args.slots]]
+    dates = [day.isoformat() for day in days]
+    mine: set[tuple[int, str, str]] = set()  # (uid, дата, час), що мають лишитися
+    vanished: list[tuple[int, str, str]] = []  # свої броні, яких не стало в пам'яті
+    mine_lock = threading.Lock()
+
+    def run(thread: int) -> None:
+        # у кожного потоку свої користувачі — порядок їхніх броней відомий
+        rnd = random.Random((args.seed * 1000 + args.worker) * 100 + thread)
+        uids = _uids(args, args.worker, thread)
+        own: set[tuple[int, str, str]] = set()
+        for _ in range(args.ops):
+            uid = rnd.choice(uids)
+            roll = rnd.random()
+            if roll < 0.4:
+                d, t = rnd.choice(slots)
+                if booking.book_slot(d, t, uid):
+                    own.add((uid, d, t))
+            elif roll < 0.55:
+                booked, _ = booking.book_many(rnd.sample(slots, 2), uid)
+                own.update((uid, d, t) for d, t in booked)
+            elif roll < 0.8:
+                d, t = rnd.choice(slots)
+                if uid in booking.cancel_slot(d, t, uid):
+                    own.discard((uid, d, t))
+            else:  # читання між записами інших потоків — як показ меню
+                view = booking.get_days(dates)
+                # свої броні може зняти лише цей потік — вони мають бути на місці
+                lost = [b for b in own if b[0] not in view[b[1]].get(b[2], ())]
+                if lost:
+                    with mine_lock:
+                        vanished.extend(lost)
+            if rnd.random() < 0.05:
+                users.flush_users()
+        with mine_lock:
+            mine.update(own)
+
+    for thread in range(args.threads):
+        for uid in _uids(args, args.worker, thread):
+            users.add_user_if_not_exists(uid, f"W{args.worker}", f"w{args.worker}_{uid}")
+
+    _wait(lambda: os.path.exists(_GO))
+
+    # потоки перемикаються якомога частіше — більше різних переплетень
+    sys.setswitchinterval(1e-6)
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(args.threads)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    users.flush_users()
+
+    # фінальний стан читаємо, коли всі закінчили, — він має бути і в нашому кеші
+    open(f"{_DONE}{args.worker}", "w").close()
+    _wait(lambda: sum(n.startswith(_DONE) for n in os.listdir(".")) == args.workers)
+    seen = sorted(
+        (uid, d, t) for d, day_slots in booking.load_data().items()
+        for t, seats in day_slots.items() for uid in seats
+    )
+    json.dump({"mine": sorted(mine), "seen": seen, "vanished": vanished}, sys.stdout)
+
+
+def _uids(args, worker: int, thread: int) -> list[int]:
+    base = worker * 1000 + thread * args.users
+    return list(range(base, base + args.users))
+
+
+# ───────────────────────── координатор ─────────────────────────
+def _check(workdir: str, reports: list[dict], args) -> list[str]:
+    """Читає сховище «з нуля» в окремому процесі й звіряє з очікуваним."""
+    probe = (
+        "import json, booking, schedule\n"
+        "from handlers import users\n"
+        "data = booking.load_data()\n"
+        "over = [(d, t, s) for d, sl in data.items() for t, s in sl.items()\n"
+        "        if len(s) > schedule.seats(d, t) or len(set(s)) != len(s)]\n"
+        "print(json.dumps({'data': data, 'over': over, 'users': sorted(users.load_users())}))\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", probe],
+        cwd=workdir, env=_env(args.workers), capture_output=True, text=True, check=True,
+    ).stdout
+    state = json.loads(out)
+
+    problems = [f"переповнений слот {d} {t}: {s}" for d, t, s in state["over"]]
+    stored = sorted(
+        [uid, d, t] for d, day_slots in state["data"].items()
+        for t, seats in day_slots.items() for uid in seats
+    )
+    expected = sorted(item for r in reports for item in r["mine"])
+    if stored != expected:
+        lost = [x for x in expected if x not in stored]
+        extra = [x for x in stored if x not in expected]
+        problems.append(f"сховище не збігається з очікуваним: втрачено {lost}, зайві {extra}")
+    for i, r in enumerate(reports):
+        if r["seen"] != stored:
+            problems.append(f"процес {i} наприкінці бачить застарілий стан")
+        if r["vanished"]:
+            problems.append(f"процес {i}: броні тимчасово зникали з пам'яті: {r['vanished'][:5]}")
+    want_users = {
+        str(uid)
+        for w in range(args.workers)
+        for th in range(args.threads)
+        for uid in _uids(args, w, th)
+    }
+    missing = want_users - set(state["users"])
+    if missing:
+        problems.append(f"загублені профілі: {sorted(missing)}")
+    return problems
+
+
+def _env(workers: int) -> dict:
+    # один процес — як бот за замовчуванням: без міжпроцесного блокування,
+    # лише потоки, що ділять кеш у пам'яті
+    env = dict(os.environ, SHARED_STORAGE="1" if workers > 1 else "0", PYTHONPATH=ROOT)
+    env.setdefault("ADMIN_CHAT_ID", "1")
+    env.setdefault("JOURNAL_COMPACT_EVERY", "40")  # щоб компактизація теж потрапила під навантаження
+    return env
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Стрес-перевірка спільного сховища")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--ops", type=int, default=300)
+    parser.add_argument("--slots", type=int, default=6, help="слотів на день")
+    parser.add_argument("--days", type=int, default=1, help="днів зі слотами")
+    parser.add_argument("--seats", type=int, default=2, help="місць у кожному слоті")
+    parser.add_argument("--users", type=int, default=3, help="користувачів на потік")
+    parser.add_argument("--threads", type=int, default=1, help="потоків у кожному процесі")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workdir", help="каталог для сховища (за замовчуванням тимчасовий)")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.users * args.threads > 1000:
+        parser.error("--users × --threads: не більше 1000 користувачів на процес")
+
+    if args.worker is not None:
+        _worker(args)
+        return
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="tgbot-stress-")
+    os.makedirs(workdir, exist_ok=True)
+    with open(os.path.join(workdir, "schedule.json"), "w", encoding="utf-8") as f:
+        json.dump({"capacity": args.seats}, f)
+
+    cmd = [sys.executable, os.path.abspath(__file__), *sys.argv[1:]]
+    procs = [
+        subprocess.Popen(
+            [*cmd, "--worker", str(i)],
+            cwd=workdir, env=_env(args.workers), stdout=subprocess.PIPE, text=True,
+        )
+        for i in range(args.workers)
+    ]
+    time.sleep(0.5)  # дати всім імпортувати модулі й відкрити сховище
+    start = time.perf_counter()
+    open(os.path.join(workdir, _GO), "w").close()
+
+    reports = []
+    for p in procs:
+        out, _ = p.communicate()
+        if p.returncode:
+            sys.exit(f"процес-учасник завершився з кодом {p.returncode}")
+        reports.append(json.loads(out))
+    elapsed = time.perf_counter() - start
+
+    problems = _check(workdir, reports, args)
+    total = args.workers * args.threads * args.ops
+    print(f"{args.workers} процеси × {args.threads} потоки × {args.ops} операцій за {elapsed:.2f} с "
+          f"({total / elapsed:.0f} оп/с), каталог: {workdir}")
+    for problem in problems:
+        print(f"❌ {problem}")
+    if problems:
+        sys.exit(1)
+    print("✅ Порушень не знайдено")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+"""
+Спільне для тестів: модулі бота відкривають сховища й розклад під час
+імпорту, тож працюємо в порожньому тимчасовому каталозі.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("ADMIN_CHAT_ID", "1")
+os.environ.setdefault("BOT_TOKEN", "1:test")
+os.chdir(tempfile.mkdtemp(prefix="tgbot-tests-"))
@@ -0,0 +1,28 @@
+from constants import TEXT_LIMIT
+from handlers.admin import _clip, _paginate
+
+
+def test_days_stay_whole_when_they_fit():
+    pages = _paginate([("2025-01-01", 10), ("2025-01-02", 10), ("2025-01-03", 10)], 25)
+    assert pages == [
+        [("2025-01-01", 0, 10), ("2025-01-02", 0, 10)],
+        [("2025-01-03", 0, 10)],
+    ]
+
+
+def test_oversized_day_is_split_by_limit():
+    pages = _paginate([("2025-01-01", 3), ("2025-01-02", 60), ("2025-01-03", 4)], 25)
+    assert pages == [
+        [("2025-01-01", 0, 3)],
+        [("2025-01-02", 0, 25)],
+        [("2025-01-02", 25, 50)],
+        [("2025-01-02", 50, 60), ("2025-01-03", 0, 4)],
+    ]
+    assert all(sum(hi - lo for _, lo, hi in page) <= 25 for page in pages)
+
+
+def test_clip_respects_telegram_limit():
+    text = _clip(["header"] + ["x" * 100] * 100)
+    assert len(text) <= TEXT_LIMIT
+    assert text.startswith("header") and text.endswith("(скорочено)")
+    assert _clip(["a", "b", ""]) == "a\nb"
@@ -0,0 +1,175 @@
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+import schedule
+from booking import BookingRepository
+from storage import JsonBookingStore, JsonRuleStore
+
+
+class _GatedStore(JsonBookingStore):
+    """
+    Зупиняє записи в заданих місцях: бронь користувача 1 — до запису в
+    журнал, бронь користувача 2 — одразу після нього (маркер ще старий).
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path, journal=True)
+        self.a_in, self.a_go = threading.Event(), threading.Event()
+        self.b_in, self.b_go = threading.Event(), threading.Event()
+
+    def apply(self, records, current):
+        uid = records[0].get("u")
+        if uid == 1:
+            self.a_in.set()
+            assert self.a_go.wait(5)
+        super().apply(records, current)
+        if uid == 2:
+            self.b_in.set()
+            assert self.b_go.wait(5)
+
+
+@pytest.fixture
+def day_slot():
+    day = date.today() + timedelta(days=1)
+    return day, schedule.plan(day).times[0]
+
+
+def _repo(tmp_path, store=None):
+    path = str(tmp_path / "data.json")
+    return BookingRepository(store or JsonBookingStore(path), JsonRuleStore(str(tmp_path / "rules.json")))
+
+
+def test_reload_does_not_drop_booking_in_flight(tmp_path, day_slot):
+    day, t = day_slot
+    d1, d2 = day.isoformat(), (day + timedelta(days=1)).isoformat()
+    assert schedule.seats(d1, t) == 1
+    store = _GatedStore(str(tmp_path / "data.json"))
+    repo = _repo(tmp_path, store)
+    repo.data()
+
+    a = threading.Thread(target=repo.book_if_free, args=(d1, t, 1))
+    b = threading.Thread(target=repo.book_if_free, args=(d2, t, 2))
+    a.start()
+    assert store.a_in.wait(5)  # бронь 1 — у пам'яті, але ще не в журналі
+    b.start()
+    assert store.b_in.wait(5)  # бронь 2 — у журналі, маркер ще не оновлено
+    # читач бачить чужий для себе маркер — перечитувати сховище не можна
+    assert repo.get_day(d1) == {t: [1]}
+    store.b_go.set()
+    b.join(5)
+    store.a_go.set()
+    a.join(5)
+
+    assert not repo.book_if_free(d1, t, 3)
+    assert repo.get_day(d1) == {t: [1]}
+    fresh = _repo(tmp_path)
+    assert fresh.get_day(d1) == {t: [1]} and fresh.get_day(d2) == {t: [2]}
+
+
+def test_parallel_writers_keep_memory_and_disk_in_sync(tmp_path, day_slot):
+    day, _ = day_slot
+    times = schedule.plan(day).times[:4]
+    dates = [(day + timedelta(days=i)).isoformat() for i in range(4)]
+    pairs = [(d, t) for d in dates for t in times]
+    repo = _repo(tmp_path)
+    repo.data()
+
+    def worker(uid: int) -> None:
+        for i in range(60):
+            d, t = pairs[(uid * 7 + i * 5) % len(pairs)]
+            if i % 3 == 2:
+                repo.cancel_many([(d, t)], uid)
+            else:
+                repo.book_many([(d, t)], uid)
+            repo.data()  # читачі між записами — як обробники в пулі потоків
+
+    threads = [threading.Thread(target=worker, args=(uid,)) for uid in range(1, 9)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join(30)
+
+    seen = repo.days(dates)
+    on_disk = _repo(tmp_path).days(dates)
+    assert seen == on_disk
+    for d, slots in on_disk.items():
+        for t, seats in slots.items():
+            assert len(seats) <= schedule.seats(d, t), (d, t, seats)
+
+
+class _SlowSnapshotStore(JsonBookingStore):
+    """Без журналу; бронь тримає `_write_lock`, поки їй не дозволять узяти знімок."""
+
+    def __init__(self, path: str):
+        super().__init__(path, journal=False)
+        self.held, self.go = threading.Event(), threading.Event()
+
+    def apply(self, records, current):
+        if records[0]["op"] == "book":
+            def gated():
+                self.held.set()
+                assert self.go.wait(5)
+                return current()
+            return super().apply(records, gated)
+        super().apply(records, current)
+
+
+def test_booking_during_purge_without_journal(tmp_path, day_slot):
+    day, t = day_slot
+    d = day.isoformat()
+    past = (date.today() - timedelta(days=3)).isoformat()
+    store = _SlowSnapshotStore(str(tmp_path / "data.json"))
+    repo = _repo(tmp_path, store)
+    repo.replace({past: {t: [5]}})
+
+    book = threading.Thread(target=repo.book_if_free, args=(d, t, 1), daemon=True)
+    purge = threading.Thread(target=repo.purge_before, args=(date.today(),), daemon=True)
+    book.start()
+    assert store.held.wait(5)  # бронь — у пам'яті, `_write_lock` узято
+    purge.start()
+    purge.join(0.2)  # прибирання встигає дійти до запису
+    store.go.set()
+    book.join(5)
+    purge.join(5)
+    assert not book.is_alive() and not purge.is_alive()
+
+    fresh = _repo(tmp_path)
+    assert fresh.days([past, d]) == {past: {}, d: {t: [1]}}
+
+
+def test_archive_runs_without_locks(tmp_path, monkeypatch):
+    t = "18:00"
+    p = (date.today() - timedelta(days=2)).isoformat()
+    d = (date.today() + timedelta(days=2)).isoformat()
+    monkeypatch.setattr(schedule, "_schedule", schedule.Schedule({"dates": {p: {t: 3}, d: {t: 3}}}))
+    repo = _repo(tmp_path)
+    repo.replace({p: {t: [5]}})
+
+    archiving, go = threading.Event(), threading.Event()
+    archived = []
+
+    def keep(days):
+        archived.append(days)
+        archiving.set()
+        assert go.wait(5)
+
+    result = []
+    purge = threading.Thread(
+        target=lambda: result.append(repo.purge_before(date.today(), keep)), daemon=True
+    )
+    purge.start()
+    assert archiving.wait(5)
+    # архів пишеться, а читання й записи на нього не чекають
+    assert repo.book_if_free(d, t, 1)
+    assert repo.book_if_free(p, t, 6)
+    assert repo.days([d]) == {d: {t: [1]}}
+    go.set()
+    purge.join(5)
+    assert not purge.is_alive()
+
+    # минулий день змінився під час архівації — його заархівовано ще раз
+    assert archived == [{p: {t: [5]}}, {p: {t: [5, 6]}}]
+    assert result == [2]
+    assert _repo(tmp_path).days([p, d]) == {p: {}, d: {t: [1]}}
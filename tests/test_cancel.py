@@ -0,0 +1,48 @@
+from datetime import date, timedelta
+
+import pytest
+
+import schedule
+from booking import BookingRepository
+from storage import JsonBookingStore, JsonRuleStore
+
+T = "18:00"
+ADMIN = 1
+
+
+@pytest.fixture
+def day():
+    return date.today() + timedelta(days=7)
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch, day):
+    rules = {"dates": {day.isoformat(): {T: 3}}}
+    monkeypatch.setattr(schedule, "_schedule", schedule.Schedule(rules))
+    return BookingRepository(
+        JsonBookingStore(str(tmp_path / "data.json")), JsonRuleStore(str(tmp_path / "rules.json"))
+    )
+
+
+def _group(repo, d):
+    # адмін і ще один користувач — разові броні, третій — за правилом
+    [(_, rule, _)] = repo.add_rules(3, d, [T], None)
+    assert repo.book_if_free(d, T, ADMIN) and repo.book_if_free(d, T, 2)
+    return rule
+
+
+def test_all_seats_clears_slot_with_admin_in_it(repo, day):
+    d = day.isoformat()
+    rule = _group(repo, d)
+    out = repo.cancel_many([(d, T)], ADMIN, is_admin=True, all_seats=True)
+    assert sorted(out[(d, T)]) == [ADMIN, 2, 3]
+    assert repo.days([d]) == {d: {}}
+    assert day.toordinal() in repo.user_rules(3)[0].skip
+    assert repo.user_rules(3)[0].id == rule.id
+
+
+def test_admin_in_slot_cancels_only_own_seat(repo, day):
+    d = day.isoformat()
+    _group(repo, d)
+    assert repo.cancel_many([(d, T)], ADMIN, is_admin=True) == {(d, T): [ADMIN]}
+    assert sorted(repo.days([d])[d][T]) == [2, 3]
@@ -0,0 +1,95 @@
+import asyncio
+
+from telegram.error import BadRequest, ChatMigrated, Forbidden, NetworkError, RetryAfter
+
+from notify import Notifier
+
+
+class FakeBot:
+    """Записує відправки; `fail[chat_id]` — винятки на перші спроби в цей чат."""
+
+    def __init__(self, fail=None):
+        self.fail = {chat: list(errors) for chat, errors in (fail or {}).items()}
+        self.sent: list[tuple[int, str, float]] = []
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        errors = self.fail.get(chat_id)
+        if errors:
+            raise errors.pop(0)
+        self.sent.append((chat_id, text, asyncio.get_running_loop().time()))
+
+
+def _notifier(bot, **kwargs) -> Notifier:
+    opts = dict(rate=1000, per_chat_interval=0.0, concurrency=10, max_retries=2, backoff=0.01)
+    opts.update(kwargs)
+    return Notifier(bot, **opts)
+
+
+def test_per_chat_spacing():
+    async def run():
+        bot = FakeBot()
+        report = await _notifier(bot, per_chat_interval=0.05).broadcast(
+            [(1, str(i)) for i in range(4)]
+        )
+        times = [at for _, _, at in bot.sent]
+        return report, times
+
+    report, times = asyncio.run(run())
+    assert report.delivered == 4 and not report.failed
+    assert all(b - a >= 0.045 for a, b in zip(times, times[1:]))
+
+
+def test_busy_chat_does_not_block_others():
+    async def run():
+        bot = FakeBot()
+        notifier = _notifier(bot, per_chat_interval=0.2, concurrency=2)
+        start = asyncio.get_running_loop().time()
+        await notifier.broadcast([(1, "x")] * 6 + [(2, "y")])
+        other = next(at for chat, _, at in bot.sent if chat == 2)
+        return other - start
+
+    assert asyncio.run(run()) < 0.1
+
+
+def test_retry_after_is_waited_and_retried():
+    async def run():
+        bot = FakeBot({5: [RetryAfter(0.1)]})
+        start = asyncio.get_running_loop().time()
+        report = await _notifier(bot).broadcast([(5, "x"), (6, "y")])
+        return report, {chat: at - start for chat, _, at in bot.sent}
+
+    report, times = asyncio.run(run())
+    assert report.delivered == 2 and not report.failed
+    assert times[5] >= 0.09  # чекали, скільки попросив Telegram
+
+
+def test_report_counts_failures():
+    async def run():
+        bot = FakeBot({
+            7: [Forbidden("bot was blocked")],
+            8: [BadRequest("chat not found")],
+            9: [NetworkError("down")] * 3,    # більше, ніж max_retries
+            10: [NetworkError("blip")],       # один збій — повтор вдасться
+        })
+        return await _notifier(bot).broadcast([(c, "x") for c in (7, 8, 9, 10, 11)])
+
+    report = asyncio.run(run())
+    assert report.delivered == 2
+    assert sorted(report.failed) == [7, 8, 9]
+
+
+def test_every_retry_counts_toward_the_limit():
+    async def run():
+        bot = FakeBot({
+            12: [RetryAfter(0)] * 10,
+            13: [ChatMigrated(14)] * 10,  # чат, що «мігрує» по колу
+            14: [ChatMigrated(13)] * 10,
+        })
+        report = await _notifier(bot).broadcast([(12, "x"), (13, "y")])
+        return bot, report
+
+    bot, report = asyncio.run(run())
+    assert sorted(report.failed) == [12, 13] and report.delivered == 0
+    # max_retries=2: перша спроба й два повтори, не більше
+    assert len(bot.fail[12]) == 10 - 3
+    assert len(bot.fail[13]) + len(bot.fail[14]) == 20 - 3
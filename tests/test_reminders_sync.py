@@ -0,0 +1,36 @@
+import asyncio
+from datetime import date, timedelta
+
+import aio
+import booking
+import reminders
+import schedule
+from booking import BookingRepository
+from storage import JsonBookingStore, JsonRuleStore
+
+
+def _repo(tmp_path):
+    return BookingRepository(
+        JsonBookingStore(str(tmp_path / "data.json")), JsonRuleStore(str(tmp_path / "rules.json"))
+    )
+
+
+def test_sync_picks_up_other_process_bookings(tmp_path, monkeypatch):
+    ours, other = _repo(tmp_path), _repo(tmp_path)
+    monkeypatch.setattr(booking, "_repo", ours)
+    monkeypatch.setattr(reminders, "_queue", reminders.ReminderQueue((60,)))
+    day = date.today() + timedelta(days=2)
+    d, t = day.isoformat(), schedule.plan(day).times[0]
+
+    asyncio.run(aio.fill_reminders(reset=True))
+    assert len(reminders._queue) == 0
+    assert other.book_if_free(d, t, 7)  # бронь іншої репліки — подій у нас немає
+    assert len(reminders._queue) == 0
+
+    asyncio.run(aio.sync_reminders_job(None))
+    assert reminders._queue.next_at() == reminders.slot_start(d, t) - 3600
+
+    # без нових змін у сховищі купа не перебудовується
+    reminders._queue.clear()
+    asyncio.run(aio.sync_reminders_job(None))
+    assert len(reminders._queue) == 0
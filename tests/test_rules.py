@@ -0,0 +1,79 @@
+from datetime import date, timedelta
+
+import pytest
+
+import schedule
+from booking import BookingRepository
+from storage import JsonBookingStore, JsonRuleStore, SqliteBookingStore, SqliteRuleStore
+
+T = "18:00"
+
+
+@pytest.fixture
+def week0():
+    return date.today() + timedelta(days=7)
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch, week0):
+    # тиждень 1 — 3 місця, тиждень 2 — вихідний, далі — по одному місцю
+    rules = {
+        "dates": {
+            week0.isoformat(): {T: 3},
+            (week0 + timedelta(days=7)).isoformat(): [],
+        }
+    }
+    monkeypatch.setattr(schedule, "_schedule", schedule.Schedule(rules))
+    return BookingRepository(
+        JsonBookingStore(str(tmp_path / "data.json")), JsonRuleStore(str(tmp_path / "rules.json"))
+    )
+
+
+def _week(week0: date, n: int) -> str:
+    return (week0 + timedelta(days=7 * n)).isoformat()
+
+
+def test_closed_first_day_does_not_reject_rule(repo, week0):
+    [(_, rule, conflicts)] = repo.add_rules(2, _week(week0, 1), [T], None)
+    assert rule is not None and rule.last is None and not conflicts
+    assert repo.days([_week(week0, 1)])[_week(week0, 1)] == {}  # вихідний — заняття немає
+    assert repo.days([_week(week0, 2)])[_week(week0, 2)] == {T: [2]}
+
+
+def test_capacity_is_checked_per_occurrence(repo, week0):
+    repo.add_rules(2, _week(week0, 1), [T], None)  # з тижня 3 займає єдине місце
+    [(_, rule, _)] = repo.add_rules(3, _week(week0, 0), [T], None)
+    # місце є лише в тиждень 1 (3 місця); далі вихідний, потім усе зайнято
+    assert rule is not None and rule.last == week0.toordinal()
+    assert repo.days([_week(week0, 2)])[_week(week0, 2)] == {T: [2]}
+
+    [(_, rule, conflicts)] = repo.add_rules(4, _week(week0, -1), [T], 2)
+    assert rule is not None and conflicts == []
+    [(_, rule, conflicts)] = repo.add_rules(5, _week(week0, -1), [T], 2)
+    assert rule is not None and conflicts == [_week(week0, -1)]
+    assert repo.days([_week(week0, 0)])[_week(week0, 0)] == {T: [3, 4, 5]}
+    [(_, rule, _)] = repo.add_rules(6, _week(week0, 0), [T], 2)
+    assert rule is None  # тиждень 1 повний, тиждень 2 — вихідний
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_rule_ids_are_never_reused(tmp_path, week0, backend):
+    def open_repo():
+        if backend == "sqlite":
+            db = str(tmp_path / "bot.sqlite3")
+            return BookingRepository(SqliteBookingStore(db), SqliteRuleStore(db))
+        return BookingRepository(
+            JsonBookingStore(str(tmp_path / "data.json")), JsonRuleStore(str(tmp_path / "rules.json"))
+        )
+
+    repo = open_repo()
+    [(_, old, _)] = repo.add_rules(2, _week(week0, 2), [T], None)
+    assert repo.cancel_rules(2, rule_id=old.id) == [old]
+    [(_, new, _)] = repo.add_rules(3, _week(week0, 2), [T], None)
+    assert new.id > old.id
+    # стара кнопка «скасувати» з id видаленого правила нічого не зачепить
+    assert repo.cancel_rules(1, rule_id=old.id, is_admin=True) == []
+
+    repo.cancel_rules(3, rule_id=new.id)
+    [(_, after_restart, _)] = open_repo().add_rules(4, _week(week0, 2), [T], None)
+    assert after_restart.id > new.id
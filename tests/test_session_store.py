@@ -0,0 +1,28 @@
+from storage import JsonSessionStore, ProcessLock
+
+
+def test_rewrite_keeps_other_processes_sessions(tmp_path):
+    path = str(tmp_path / "sessions.jsonl")
+    lock = ProcessLock(path + ".lock")
+    # два «процеси» з тим самим файлом: кожен бачить лише свої записи
+    a, b = JsonSessionStore(path, lock), JsonSessionStore(path, lock)
+    a.load()
+    b.load()
+    a.save({1: (100.0, {"date": "2025-01-01"})})
+    for i in range(200):  # досить мертвих рядків, щоб b переписав файл
+        b.save({2: (100.0 + i, {"n": i})})
+
+    records = JsonSessionStore(path).load()
+    assert records[1] == (100.0, {"date": "2025-01-01"})
+    assert records[2] == (299.0, {"n": 199})
+
+
+def test_deletes_survive_rewrite(tmp_path):
+    path = str(tmp_path / "sessions.jsonl")
+    store = JsonSessionStore(path)
+    store.load()
+    store.save({1: (1.0, {"x": 1}), 2: (1.0, {"y": 2})})
+    store.save({1: None})
+    for i in range(100):
+        store.save({3: (float(i), {})})
+    assert set(JsonSessionStore(path).load()) == {2, 3}
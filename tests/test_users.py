@@ -0,0 +1,53 @@
+import threading
+
+from handlers.users import UserRegistry
+from storage import JsonUserStore, ProcessLock
+
+
+class _SlowStore(JsonUserStore):
+    """Запис зупиняється, поки тест не дозволить продовжити."""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.saving, self.go = threading.Event(), threading.Event()
+
+    def save(self, users, changed):
+        self.saving.set()
+        assert self.go.wait(5)
+        super().save(users, changed)
+
+
+def test_flush_does_not_block_readers(tmp_path):
+    path = str(tmp_path / "users.json")
+    store = _SlowStore(path)
+    reg = UserRegistry(store)
+    reg.upsert(1, "Ann", None)
+
+    flush = threading.Thread(target=reg.flush)
+    flush.start()
+    assert store.saving.wait(5)
+    # поки файл пишеться, event loop читає й оновлює профілі без очікування
+    assert reg.display(1) == "Ann"
+    reg.refresh_if_known(1, "Anna", "anna")
+    store.go.set()
+    flush.join(5)
+    assert not flush.is_alive()
+
+    assert reg.display(1) == "Anna (@anna)"
+    assert JsonUserStore(path).load() == {"1": {"first_name": "Ann", "username": None}}
+    assert reg.flush()  # зміна під час запису не загубилась
+    assert JsonUserStore(path).load()["1"] == {"first_name": "Anna", "username": "anna"}
+
+
+def test_flush_merges_other_process_profiles(tmp_path):
+    path = str(tmp_path / "users.json")
+    lock = ProcessLock(path + ".lock")  # як зі SHARED_STORAGE
+    ours = UserRegistry(JsonUserStore(path, lock))
+    other = UserRegistry(JsonUserStore(path, lock))
+    ours.upsert(1, "Ann", None)
+    ours.flush()
+    other.upsert(2, "Bob", None)
+    other.flush()
+    ours.upsert(3, "Cid", None)
+    assert ours.flush()
+    assert set(ours.all()) == {"1", "2", "3"}
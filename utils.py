@@ -1,4 +1,7 @@
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+from config import RULE_HORIZON_DAYS
 
 UA_WEEKDAYS = {
     'Mon': 'Пн',
@@ -30,3 +33,55 @@ def format_date_label(date_obj: datetime) -> str:
     day = date_obj.strftime('%d')               # 01–31
     month = UA_MONTHS[date_obj.strftime('%m')]  # січ, лют, ...
     return f"{dow}, {day} {month}"
+
+
+@lru_cache(maxsize=1024)
+def date_label(date_str: str) -> str:
+    """`format_date_label` для рядка *YYYY-MM-DD*; мітки тих самих днів кешуються."""
+    return format_date_label(datetime.strptime(date_str, "%Y-%m-%d"))
+
+
+def parse_date_arg(text: str, today: date | None = None) -> str:
+    """
+    Дата з аргументу команди: *YYYY-MM-DD*, *DD.MM.YYYY* або *DD.MM*
+    (рік — поточний). Повертає *YYYY-MM-DD*; невірний формат — `ValueError`.
+    """
+    today = today or date.today()
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            pass
+    day = datetime.strptime(text, "%d.%m")
+    return date(today.year, day.month, day.day).isoformat()
+
+
+def parse_month_arg(text: str) -> str:
+    """Місяць з аргументу команди: *YYYY-MM* або *MM.YYYY*. Повертає *YYYY-MM*."""
+    for fmt in ("%Y-%m", "%m.%Y"):
+        try:
+            return datetime.strptime(text, fmt).strftime("%Y-%m")
+        except ValueError:
+            pass
+    raise ValueError(f"bad month: {text!r}")
+
+
+def month_label(month: str) -> str:
+    """*YYYY-MM* → «бер 2025»."""
+    return f"{UA_MONTHS[month[5:7]]} {month[:4]}"
+
+
+def rule_horizon(today: date | None = None) -> date:
+    """До якої дати показувати заняття за правилами повторення у списках дат."""
+    return (today or date.today()) + timedelta(days=RULE_HORIZON_DAYS)
+
+
+def rule_label(rule) -> str:
+    """Правило повторення → «Пн о 18:00, з 20 жовт по 10 лист» (або «…, безстроково»)."""
+    def day(ordinal: int) -> str:
+        d = date.fromordinal(ordinal)
+        return f"{d.day:02d} {UA_MONTHS[f'{d.month:02d}']}"
+
+    dow = list(UA_WEEKDAYS.values())[rule.weekday]
+    until = f" по {day(rule.last)}" if rule.last is not None else ", безстроково"
+    return f"{dow} о {rule.time}, з {day(rule.first)}{until}"
@@ -0,0 +1,187 @@
+"""
+Надсилає записані апдейти Telegram на локальний webhook-сервер бота —
+так webhook-режим можна перевірити, не чекаючи, поки Telegram щось пришле.
+
+    python webhook_replay.py updates.jsonl [--url http://127.0.0.1:8443/telegram]
+                             [--secret …] [--concurrency 8] [--repeat 1]
+
+Файл — JSON-масив об'єктів Update або JSONL (один Update на рядок).
+Бот має працювати з UPDATE_MODE=webhook; за замовчуванням адреса й секрет
+беруться з тих самих WEBHOOK_* змінних, що й у бота. При повторі
+`update_id` зсувається, щоб апдейти не виглядали дублікатами.
+
+    python webhook_replay.py updates.jsonl --offline [--concurrency 8]
+
+З `--offline` ні сервер, ні Telegram не потрібні: застосунок бота
+збирається в цьому ж процесі зі сховищами поточного каталогу, а виклики
+Bot API (getMe, sendMessage, …) перехоплює `OfflineRequest` — нічого не
+надсилається, в кінці друкується, які методи й скільки разів викликались.
+Ендпоінт метрик стартує як завжди — на час перевірки його можна вимкнути
+METRICS_PORT=0.
+"""
+import argparse
+import asyncio
+import json
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from telegram import Update
+from telegram.request import BaseRequest, RequestData
+
+from config import BOT_TOKEN, WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET
+
+
+def _load(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def _post(url: str, secret: str, update: dict) -> tuple:
+    req = urllib.request.Request(
+        url,
+        data=json.dumps(update).encode(),
+        headers={
+            "Content-Type": "application/json",
+            "X-Telegram-Bot-Api-Secret-Token": secret,
+        },
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except urllib.error.URLError as e:
+        status = str(e.reason)
+    return status, time.perf_counter() - start
+
+
+# ─────────────────────── без Telegram ───────────────────────
+class OfflineRequest(BaseRequest):
+    """
+    Транспорт Bot API, що відповідає замість Telegram: getMe — вигаданий
+    бот, методи, які повертають повідомлення, — повідомлення з тим самим
+    текстом, решта — True. Кожен виклик рахується в `calls`.
+    """
+
+    _MESSAGE_METHODS = {"sendMessage", "editMessageText", "editMessageReplyMarkup"}
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+        self._message_id = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: RequestData | None = None,
+        read_timeout=None,
+        write_timeout=None,
+        connect_timeout=None,
+        pool_timeout=None,
+    ) -> tuple[int, bytes]:
+        api_method = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data is not None else {}
+        self.calls[api_method] += 1
+        if api_method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Offline", "username": "offline_bot"}
+        elif api_method in self._MESSAGE_METHODS:
+            self._message_id += 1
+            result = {
+                "message_id": params.get("message_id", self._message_id),
+                "date": int(time.time()),
+                "chat": {"id": params.get("chat_id", 0), "type": "private"},
+                "text": params.get("text", ""),
+            }
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+async def _replay_offline(batch: list, concurrency: int) -> tuple[list, Counter]:
+    import bot  # сховища відкриваються під час імпорту — вже в робочому каталозі
+
+    request = OfflineRequest()
+    app = bot.build_app(BOT_TOKEN or "0:offline", request)
+    await app.initialize()
+    await bot.post_init(app)
+    await app.start()
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(data: dict) -> tuple:
+        async with limit:
+            start = time.perf_counter()
+            try:
+                await app.process_update(Update.de_json(data, app.bot))
+                status = 200
+            except Exception as e:  # обробники самі логують свої помилки
+                status = type(e).__name__
+            return status, time.perf_counter() - start
+
+    try:
+        results = await asyncio.gather(*(one(u) for u in batch))
+    finally:
+        await app.stop()
+        await bot.post_shutdown(app)
+        await app.shutdown()
+    return list(results), request.calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Відтворення апдейтів на webhook")
+    parser.add_argument("file")
+    parser.add_argument(
+        "--url", default=f"http://127.0.0.1:{WEBHOOK_PORT}/{WEBHOOK_PATH.strip('/')}"
+    )
+    parser.add_argument("--secret", default=WEBHOOK_SECRET)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument(
+        "--offline", action="store_true", help="обробити апдейти в цьому процесі, без Telegram"
+    )
+    args = parser.parse_args()
+
+    updates = _load(args.file)
+    step = max((u.get("update_id", 0) for u in updates), default=0) + 1
+    batch = [
+        {**u, "update_id": u.get("update_id", 0) + i * step}
+        for i in range(args.repeat)
+        for u in updates
+    ]
+
+    start = time.perf_counter()
+    calls = None
+    if args.offline:
+        results, calls = asyncio.run(_replay_offline(batch, args.concurrency))
+    else:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(lambda u: _post(args.url, args.secret, u), batch))
+    elapsed = time.perf_counter() - start
+
+    ok = sum(1 for status, _ in results if status == 200)
+    latencies = sorted(lat for _, lat in results)
+    print(f"Надіслано {len(batch)} апдейтів за {elapsed:.2f} с, 200 OK: {ok}")
+    if latencies:
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"Затримка: p50 {p50 * 1000:.1f} мс, p99 {p99 * 1000:.1f} мс")
+    for status in sorted({s for s, _ in results if s != 200}, key=str):
+        print(f"⚠️ {status}: {sum(1 for s, _ in results if s == status)}")
+    if calls:
+        print("Виклики Bot API: " + ", ".join(f"{m} {n}" for m, n in calls.most_common()))
+
+
+if __name__ == "__main__":
+    main()